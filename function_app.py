@@ -4,6 +4,7 @@ from modules.services.connection_service import handle_test_connections
 from modules.services.bulk_service import handle_bulk_generation
 from modules.handlers.create_by_view_handler import handle_create_by_view
 from modules.handlers.personalized_handler import handle_create_personalized
+from modules.handlers.personalized_batch_handler import handle_create_personalized_batch
 from modules.handlers.rag_personalized_handler import handle_create_by_view_rag_personalized
 
 app = func.FunctionApp(http_auth_level=func.AuthLevel.ANONYMOUS)
@@ -34,6 +35,11 @@ def create_personalized(req: func.HttpRequest) -> func.HttpResponse:
     return handle_create_personalized(req)
 
 
+@app.route(route="create_personalized_batch", methods=["GET", "POST"])
+def create_personalized_batch(req: func.HttpRequest) -> func.HttpResponse:
+    return handle_create_personalized_batch(req)
+
+
 @app.route(route="create_by_view_rag_personalized", methods=["GET", "POST", "OPTIONS"])
 def create_by_view_rag_personalized(req: func.HttpRequest) -> func.HttpResponse:
     # CORS preflight 요청 처리
@@ -6,11 +6,22 @@ questions_dim의 concept_by_ai 컬럼에 매핑 결과 저장
 import os
 import sys
 import json
+import queue
 import logging
-from modules.database import get_cached_concept_names, load_concept_names, get_sql_connection
-from mapping.data_loader import get_unique_topic_names, debug_topic_info
-from mapping.ai_mapper import generate_concept_mapping_with_ai, get_fallback_concept
-from mapping.database_updater import update_concept_by_ai, update_concept_by_ai_batch, verify_update, get_concepts_for_knowledge_mapping, get_knowledge_tag_for_concept, update_knowledge_tag, update_knowledge_tag_batch, get_questions_with_knowledge_tag, assign_assessment_item_id, assign_assessment_item_id_fast, load_all_assessment_mappings, check_concept_completion, check_knowledge_tag_completion
+import argparse
+import threading
+from array import array
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from modules.core.database import get_cached_concept_names, load_concept_names, get_sql_connection
+from modules.core.concurrency import RateLimiter, ProgressTracker, get_max_workers
+from modules.core.utils import env_int
+from mapping.data_loader import iter_unique_topic_names, get_max_question_id, debug_topic_info
+from mapping.mapping_memo import get_mapping_memo
+from mapping.checkpoint import load_watermark, save_watermark, load_checkpoint, start_checkpoint, mark_batch_committed, clear_checkpoint
+from mapping.ai_mapper import generate_concept_mapping_with_ai, generate_concept_mapping_batch_with_ai, get_fallback_concept
+from mapping.database_updater import update_concept_by_ai, update_concept_by_ai_batch, verify_update, apply_knowledge_tag_mapping, update_knowledge_tag, load_all_assessment_mappings, ensure_assessment_map_table, get_questions_needing_assessment, load_assigned_items_by_tag, save_assessment_assignments, check_concept_completion
+from mapping.assessment_assigner import AssessmentAssigner, ASSIGNMENT_STRATEGIES, normalize_tag
 
 
 def load_local_settings():
@@ -32,7 +43,8 @@ def load_local_settings():
 
 def validate_environment():
     """필수 환경변수 확인"""
-    required_vars = ["AOAI_ENDPOINT", "AOAI_KEY", "SQL_CONNECTION"]
+    # AOAI_BACKENDS(백엔드 풀)가 있으면 단일 endpoint/key 불필요
+    required_vars = ["SQL_CONNECTION"] if os.environ.get("AOAI_BACKENDS") else ["AOAI_ENDPOINT", "AOAI_KEY", "SQL_CONNECTION"]
     missing_vars = [var for var in required_vars if not os.environ.get(var)]
 
     if missing_vars:
@@ -42,18 +54,25 @@ def validate_environment():
     return True
 
 
-def process_batch_mapping(topic_data_batch, concept_names, batch_num, total_batches):
-    """배치 매핑 처리 (50개씩)"""
+def map_topic_batch(topic_data_batch, concept_names, limiter=None):
+    """배치 매핑 (AI 호출만, DB 저장 제외) → (topic_concept_pairs, 출력 로그 목록)"""
     batch_size = len(topic_data_batch)
     topic_concept_pairs = []
-    success_count = 0
+    log_lines = []
 
-    print(f"🔄 배치 {batch_num}/{total_batches} 처리 중... ({batch_size}개)")
+    # 배치 전체를 AI 1회 호출로 매핑 (호출 실패 시 빈 결과 → topic별 개별 매핑)
+    if limiter:
+        limiter.acquire()
+    batch_mappings = generate_concept_mapping_batch_with_ai(topic_data_batch, concept_names) or {}
 
-    # 배치 내 각 topic에 대해 AI 매핑
     for i, (topic_name, question_text) in enumerate(topic_data_batch, 1):
-        # AI 매핑 시도
-        selected_concept = generate_concept_mapping_with_ai(topic_name, question_text, concept_names)
+        selected_concept = batch_mappings.get(topic_name)
+
+        # 배치 응답에 없거나 목록에 없는 개념이면 topic 단위 AI 매핑 재시도
+        if not selected_concept:
+            if limiter:
+                limiter.acquire()
+            selected_concept = generate_concept_mapping_with_ai(topic_name, question_text, concept_names)
 
         # AI 매핑 실패 시 폴백
         if not selected_concept:
@@ -61,144 +80,239 @@ def process_batch_mapping(topic_data_batch, concept_names, batch_num, total_batc
 
         if selected_concept:
             topic_concept_pairs.append((topic_name, selected_concept))
-            print(f"   [{i:2d}/{batch_size}] {topic_name} → {selected_concept}")
-            success_count += 1
+            log_lines.append(f"   [{i:2d}/{batch_size}] {topic_name} → {selected_concept}")
         else:
-            print(f"   [{i:2d}/{batch_size}] {topic_name} → 매핑실패 ❌")
+            log_lines.append(f"   [{i:2d}/{batch_size}] {topic_name} → 매핑실패 ❌")
+
+    return topic_concept_pairs, log_lines
+
+
+def process_batch_mapping(topic_data_batch, concept_names, batch_num, total_batches, on_committed=None):
+    """배치 매핑 처리 (50개씩, 배치당 AI 1회 호출, 저장이 커밋된 경우에만 on_committed(batch_num) 호출)"""
+    print(f"🔄 배치 {batch_num}/{total_batches} 처리 중... ({len(topic_data_batch)}개)")
+
+    topic_concept_pairs, log_lines = map_topic_batch(topic_data_batch, concept_names)
+    for line in log_lines:
+        print(line)
 
     # 배치 DB 업데이트
     if topic_concept_pairs:
         affected_rows = update_concept_by_ai_batch(topic_concept_pairs)
+        if affected_rows is None:
+            # 체크포인트에 기록하지 않아 다음 실행 시 다시 처리
+            print(f"❌ 배치 {batch_num} DB 저장 실패 - 다음 실행 시 다시 처리")
+            return 0
         print(f"✅ 배치 {batch_num} DB 저장 완료: {affected_rows}행 업데이트")
     else:
         print(f"❌ 배치 {batch_num} 저장할 데이터 없음")
 
+    if on_committed:
+        on_committed(batch_num)
+
+    return len(topic_concept_pairs)
+
+
+def get_write_batch_size():
+    """DB 저장 1회당 최대 주제 수 (MAPPING_WRITE_BATCH_SIZE, 기본 2000)"""
+    return max(1, env_int("MAPPING_WRITE_BATCH_SIZE", 2000))
+
+
+def run_mapping_writer(write_queue, writer_stats, on_committed=None):
+    """
+    DB 저장 단계: 큐에 들어온 배치 결과를 update_concept_by_ai_batch로 저장 (None 수신 시 종료)
+    대기 중인 배치가 여러 개면 MAPPING_WRITE_BATCH_SIZE까지 모아서 한 번에 저장
+    """
+    write_batch_size = get_write_batch_size()
+    finished = False
+    while not finished:
+        pending = [write_queue.get()]
+        # 이미 쌓여 있는 배치를 저장 한도까지 추가로 모음
+        while pending[-1] is not None and sum(len(item[1]) for item in pending) < write_batch_size:
+            try:
+                pending.append(write_queue.get_nowait())
+            except queue.Empty:
+                break
+
+        if pending[-1] is None:
+            finished = True
+            pending.pop()
+
+        try:
+            batch_nums = [batch_num for batch_num, _ in pending]
+            topic_concept_pairs = [pair for _, pairs in pending for pair in pairs]
+            if topic_concept_pairs:
+                affected_rows = update_concept_by_ai_batch(topic_concept_pairs)
+                if affected_rows is None:
+                    raise RuntimeError("DB 연결 또는 SQL 실패 (로그 참고)")
+                writer_stats['batches'] += len(batch_nums)
+                writer_stats['rows'] += affected_rows
+                print(f"💾 배치 {', '.join(map(str, batch_nums))} DB 저장 완료: {affected_rows}행 업데이트")
+            if on_committed:
+                for batch_num in batch_nums:
+                    on_committed(batch_num)
+        except Exception as e:
+            # 체크포인트에 기록하지 않아 워터마크가 유지되고 다음 실행 시 다시 처리
+            writer_stats['failed'] += len(pending)
+            print(f"❌ 배치 {', '.join(str(batch_num) for batch_num, _ in pending)} DB 저장 실패: {str(e)}")
+        finally:
+            for _ in range(len(pending) + (1 if finished else 0)):
+                write_queue.task_done()
+
+
+def process_batches_concurrently(batches, concept_names, workers, requests_per_minute, total_batches=None, on_committed=None):
+    """
+    배치 매핑 병렬 + 파이프라인 처리
+
+    Args:
+        batches: [(batch_num, [(topic_name, question_text)])] 배치 목록
+        concept_names: 개념명 목록
+        workers: 동시 매핑 작업 수
+        requests_per_minute: 분당 AI 호출 제한 (0이면 제한 없음)
+        total_batches: 진행 표시용 전체 배치 수 (재개 시 완료분 포함)
+        on_committed: 배치 DB 저장 완료 시 호출 (batch_num)
+
+    Returns:
+        int: 매핑 성공 주제 수
+    """
+    total_batches = total_batches or len(batches)
+    total_topics = sum(len(batch) for _, batch in batches)
+    limiter = RateLimiter(requests_per_minute)
+    progress = ProgressTracker(total_topics)
+
+    # 매핑 작업보다 DB 저장이 밀리면 매핑도 잠시 대기하도록 큐 크기 제한
+    write_queue = queue.Queue(maxsize=workers * 2)
+    writer_stats = {'batches': 0, 'rows': 0, 'failed': 0}
+    writer = threading.Thread(target=run_mapping_writer, args=(write_queue, writer_stats, on_committed), daemon=True)
+    writer.start()
+
+    success_count = 0
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(map_topic_batch, batch_data, concept_names, limiter): (batch_num, batch_data)
+                for batch_num, batch_data in batches
+            }
+
+            for future in as_completed(futures):
+                batch_num, batch_data = futures[future]
+                try:
+                    topic_concept_pairs, log_lines = future.result()
+                except Exception as e:
+                    topic_concept_pairs, log_lines = [], [f"   ❌ 매핑 작업 실패: {str(e)}"]
+
+                print(f"🔄 배치 {batch_num}/{total_batches} 매핑 완료 ({len(topic_concept_pairs)}/{len(batch_data)}개)")
+                for line in log_lines:
+                    print(line)
+
+                write_queue.put((batch_num, topic_concept_pairs))
+                success_count += len(topic_concept_pairs)
+
+                print(f"📈 전체 진행률: {progress.update(len(batch_data))}")
+                print()
+    finally:
+        write_queue.put(None)
+        writer.join()
+
+    print(f"💾 DB 저장: {writer_stats['batches']}개 배치, {writer_stats['rows']}행 업데이트"
+          + (f", {writer_stats['failed']}개 배치 실패" if writer_stats['failed'] else ""))
     return success_count
 
 
 def process_knowledge_tag_mapping():
-    """concept_by_ai → knowledgeTag 매핑 처리 (배치)"""
-    print("\n4. [concept_by_ai] → [knowledgeTag] 매핑 시작 (배치 처리)...")
+    """concept_by_ai → knowledgeTag 매핑 처리 (gold 조인 UPDATE 1회) → (태그된 행 수, 대상 행 수)"""
+    print("\n4. [concept_by_ai] → [knowledgeTag] 매핑 시작 (조인 UPDATE)...")
     print("-" * 60)
 
-    # concept_by_ai가 있는 concept들 조회
-    concept_data = get_concepts_for_knowledge_mapping()
-    if not concept_data:
-        print("❌ 매핑할 concept_by_ai 데이터가 없습니다.")
-        return 0
+    result = apply_knowledge_tag_mapping()
+    if result is None:
+        print("❌ knowledgeTag 매핑 실패")
+        return 0, 0
 
-    # concept → knowledgeTag 매핑 생성
-    concept_tag_pairs = []
-    success_count = 0
-    total_count = len(concept_data)
-
-    print(f"📊 총 {total_count}개 concept에 대한 knowledgeTag 조회 중...")
-
-    for i, (concept_name, row_count) in enumerate(concept_data, 1):
-        # gold에서 knowledgeTag 조회
-        knowledge_tag = get_knowledge_tag_for_concept(concept_name)
+    print(f"✅ knowledgeTag 저장 완료: {result['updated_rows']}행 업데이트")
 
-        if knowledge_tag:
-            concept_tag_pairs.append((concept_name, knowledge_tag))
-            print(f"   [{i:3d}/{total_count}] {concept_name} → {knowledge_tag}")
-            success_count += 1
-        else:
-            print(f"   [{i:3d}/{total_count}] {concept_name} → ❌ (tag없음)")
-
-    # 배치 DB 업데이트
-    if concept_tag_pairs:
-        print(f"\n🔄 배치 업데이트 실행 중... ({len(concept_tag_pairs)}개 매핑)")
-        affected_rows = update_knowledge_tag_batch(concept_tag_pairs)
-        print(f"✅ knowledgeTag 배치 저장 완료: {affected_rows}행 업데이트")
-    else:
-        print("\n❌ 저장할 knowledgeTag 매핑이 없습니다.")
+    unmatched = result['unmatched']
+    if unmatched:
+        print(f"⚠️ [gold.gold_knowledgeTag]에 없는 concept {len(unmatched)}개:")
+        for concept_name, row_count in unmatched:
+            print(f"   {concept_name} ({row_count}행) → ❌ (tag없음)")
 
-    print(f"\n🎯 knowledgeTag 매핑 완료: {success_count}/{total_count}개 성공")
-    return success_count
+    print(f"\n🎯 knowledgeTag 매핑 완료: {result['tagged_rows']}/{result['total_rows']}행")
+    return result['tagged_rows'], result['total_rows']
 
 
-def process_assessment_mapping_test():
-    """knowledgeTag → assessmentItemID 매핑 (최적화된 테스트)"""
-    print("\n5. [knowledgeTag] → [assessmentItemID] 매핑 테스트 (최적화)...")
+def process_assessment_mapping(strategy="unique", reassign=False):
+    """knowledgeTag → assessmentItemID 할당 후 할당 테이블에 일괄 저장 → (할당 성공 수, 대상 문제 수)"""
+    print(f"\n5. [knowledgeTag] → [assessmentItemID] 할당 (방식: {strategy}{', 전체 재할당' if reassign else ', 증분'})...")
     print("-" * 60)
 
+    if not ensure_assessment_map_table():
+        print("❌ 할당 테이블을 준비할 수 없습니다.")
+        return 0, 0
+
     # 1. 전체 매핑 데이터 사전 로드 (1회만)
-    print("📥 assessmentItemID 매핑 데이터 로딩 중...")
+    all_mappings = load_all_assessment_mappings()
+    if not all_mappings:
+        print("❌ assessmentItemID 매핑 데이터를 로드할 수 없습니다.")
+        return 0, 0
+    print(f"✅ {len(all_mappings)}개 knowledgeTag 매핑 데이터 로드 완료")
+
+    # 2. 할당이 필요한 문제만 스트리밍 조회 (새 문제, knowledgeTag가 바뀐 문제)
+    #    읽기 연결을 연 채로 같은 테이블에 쓰지 않도록 id/knowledgeTag만 정수 배열로 먼저 모음
+    question_ids, question_tags = array('q'), array('q')
+    invalid_tag_count = 0
     try:
-        all_mappings = load_all_assessment_mappings()
-        print(f"🔍 load_all_assessment_mappings() 반환 결과: {type(all_mappings)}, 길이: {len(all_mappings) if all_mappings else 0}")
-
-        if not all_mappings:
-            print("❌ assessmentItemID 매핑 데이터를 로드할 수 없습니다.")
-            print("🔍 빈 딕셔너리 반환됨 - 함수 내부 확인 필요")
-            return 0
-
-        # 샘플 데이터 출력
-        sample_keys = list(all_mappings.keys())[:5]
-        print(f"🔍 샘플 knowledgeTag들: {sample_keys}")
-        for key in sample_keys:
-            print(f"    {key}: {len(all_mappings[key])}개 assessmentItemID")
-
-        print(f"✅ {len(all_mappings)}개 knowledgeTag 매핑 데이터 로드 완료")
-
+        for chunk in get_questions_needing_assessment(reassign):
+            for question_id, knowledge_tag in chunk:
+                tag = normalize_tag(knowledge_tag)
+                if tag is None:
+                    invalid_tag_count += 1
+                    continue
+                question_ids.append(question_id)
+                question_tags.append(tag)
     except Exception as e:
-        print(f"❌ load_all_assessment_mappings() 에러: {str(e)}")
-        return 0
-
-    # 2. knowledgeTag가 있는 모든 문제 조회
-    questions_data = get_questions_with_knowledge_tag()
-    if not questions_data:
-        print("❌ knowledgeTag가 있는 문제를 찾을 수 없습니다.")
-        return 0
-
-    # 3. 배치 단위로 처리
-    used_items_by_tag = {}
-    success_count = 0
-    total_count = len(questions_data)
-    batch_size = 1000
-
-    print(f"📊 총 {total_count}개 문제를 {batch_size}개씩 배치 처리")
-    print()
-
-    for batch_start in range(0, total_count, batch_size):
-        batch_end = min(batch_start + batch_size, total_count)
-        batch_num = (batch_start // batch_size) + 1
-        total_batches = (total_count + batch_size - 1) // batch_size
-
-        print(f"🔄 배치 {batch_num}/{total_batches} 처리 중... ({batch_start + 1}~{batch_end})")
-
-        batch_success = 0
-        for i in range(batch_start, batch_end):
-            question_id, topic_name, knowledge_tag = questions_data[i]
-
-            # 최적화된 assessmentItemID 할당 (DB 조회 없음)
-            assessment_id, reason = assign_assessment_item_id_fast(knowledge_tag, used_items_by_tag, all_mappings)
-
-            if assessment_id:
-                if (i - batch_start) < 5:  # 배치당 처음 5개만 상세 출력
-                    print(f"   [{i + 1:5d}] [knowledgeTag] {knowledge_tag} → [assessmentItemID] {assessment_id} ✅")
-                batch_success += 1
-                success_count += 1
-            else:
-                if (i - batch_start) < 5:  # 실패한 경우는 항상 출력
-                    print(f"   [{i + 1:5d}] [knowledgeTag] {knowledge_tag} → ❌ ({reason})")
-
-        # 배치 결과 요약
-        current_percent = (batch_end / total_count) * 100
-        print(f"✅ 배치 {batch_num} 완료: {batch_success}/{batch_end - batch_start}개 성공")
-        print(f"📈 전체 진행률: {current_percent:.1f}% ({batch_end}/{total_count})")
-        print()
-
-    # 최종 결과 요약
-    print(f"🎯 assessmentItemID 매핑 완료: {success_count}/{total_count}개 성공 ({success_count/total_count*100:.1f}%)")
-
-    # knowledgeTag별 사용 통계 (상위 10개만)
-    print("\n📊 knowledgeTag별 사용 통계 (상위 10개):")
-    sorted_tags = sorted(used_items_by_tag.items(), key=lambda x: len(x[1]), reverse=True)[:10]
-    for tag, used_items in sorted_tags:
-        print(f"   knowledgeTag {tag}: {len(used_items)}개 assessmentItemID 사용")
-
-    return success_count
+        # 중간에 끊긴 목록으로 할당하지 않고 단계 중단
+        print(f"❌ 할당 대상 문제를 끝까지 조회하지 못했습니다: {str(e)}")
+        return 0, 0
+
+    total_count = len(question_ids) + invalid_tag_count
+    if not total_count:
+        print("✅ 새로 할당할 문제가 없습니다.")
+        return 0, 0
+
+    # 3. knowledgeTag별 그룹 단위 할당 후 청크별로 할당 테이블에 저장 (이미 할당된 항목은 이어서 사용)
+    assigned_items_by_tag = {} if reassign else load_assigned_items_by_tag()
+    if assigned_items_by_tag is None:
+        # 기존 할당을 모르는 채로 진행하면 분산 기준이 틀어지므로 단계 중단
+        print("❌ 기존 assessmentItemID 할당을 조회할 수 없습니다.")
+        return 0, 0
+    assigner = AssessmentAssigner(all_mappings, strategy, assigned_items_by_tag)
+    if invalid_tag_count:
+        assigner.failed_count += invalid_tag_count
+        assigner.failures_by_reason['knowledgeTag 타입 변환 실패'] += invalid_tag_count
+
+    write_batch_size = get_write_batch_size()
+    progress = ProgressTracker(len(question_ids))
+    tag_counts = Counter()
+    saved_rows = 0
+    for batch_start in range(0, len(question_ids), write_batch_size):
+        batch_end = batch_start + write_batch_size
+        assignments = assigner.assign_rows(zip(question_ids[batch_start:batch_end], question_tags[batch_start:batch_end]))
+        saved_rows += save_assessment_assignments(assignments, strategy)
+        tag_counts.update(tag for _, tag, _ in assignments)
+        print(f"📈 할당 진행률: {progress.update(min(batch_end, len(question_ids)) - batch_start)}")
+
+    print(f"📊 {total_count}개 문제 중 {assigner.assigned_count}개 할당")
+    for reason, count in assigner.failures_by_reason.items():
+        print(f"   ❌ {reason}: {count}개")
+    print(f"💾 할당 결과 저장 완료: {saved_rows}행 추가/변경")
+
+    # knowledgeTag별 할당 통계 (상위 10개만)
+    print("\n📊 knowledgeTag별 할당 통계 (상위 10개):")
+    for tag, count in tag_counts.most_common(10):
+        print(f"   knowledgeTag {tag}: {count}개 assessmentItemID 할당")
+
+    print(f"\n🎯 assessmentItemID 할당 완료: {assigner.assigned_count}/{total_count}개 성공 ({assigner.assigned_count/total_count*100:.1f}%)")
+    return assigner.assigned_count, total_count
 
 
 def print_summary_report(concept_success, concept_total, tag_success=0, tag_total=0, assessment_success=0, assessment_total=0):
@@ -239,8 +353,30 @@ def print_summary_report(concept_success, concept_total, tag_success=0, tag_tota
         print(f"❌ 결과 확인 중 오류: {str(e)}")
 
 
-def main():
+def parse_args(argv=None):
+    """명령행 인자 파싱"""
+    parser = argparse.ArgumentParser(description="topic_name → concept_name 매핑 생성")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="동시 AI 매핑 작업 수 (기본: LLM_MAX_WORKERS 또는 LLM_AIMD_MAX, 2 이상이면 병렬 매핑 + 별도 DB 저장 단계, 실제 동시 호출 수는 적응형 제한기가 조절)")
+    parser.add_argument("--rpm", type=int, default=int(os.environ.get("MAPPING_RPM", "0") or 0),
+                        help="분당 AI 호출 제한 (기본: MAPPING_RPM 환경변수, 0이면 제한 없음)")
+    parser.add_argument("--batch-size", type=int, default=50, help="AI 1회 호출당 주제 수")
+    parser.add_argument("--mode", choices=["pending", "new"], default="pending",
+                        help="pending: 미매핑 주제 + 지난 실행 이후 추가된 주제, new: 지난 실행 이후 추가된 주제만 (스케줄 실행용)")
+    parser.add_argument("--full", action="store_true", help="매핑 여부와 관계없이 전체 주제 재매핑")
+    parser.add_argument("--restart", action="store_true", help="중단된 실행 체크포인트를 무시하고 새로 시작")
+    parser.add_argument("--assessment-strategy", choices=ASSIGNMENT_STRATEGIES, default="unique",
+                        help="assessmentItemID 할당 방식 (unique: 태그 내 중복 없음, round_robin: 순환, hash: question_id 해시)")
+    parser.add_argument("--reassign-assessment", action="store_true", help="기존 할당을 무시하고 전체 문제 재할당")
+    parser.add_argument("--memo-import", metavar="PATH", help="매핑 메모 JSONL 가져오기 후 매핑 진행")
+    parser.add_argument("--memo-export", metavar="PATH", help="현재 개념 목록의 매핑 메모를 JSONL로 내보내고 종료")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
     """메인 실행 함수"""
+    args = parse_args(argv)
+
     print("💾 [questions_dim.topic_name] → [gold.gold_knowledgeTag.concept_name] 매핑")
     print("📌 매핑 결과를 questions_dim.concept_by_ai 컬럼에 저장")
     print("=" * 60)
@@ -261,63 +397,117 @@ def main():
 
     print(f"   ✅ [gold.gold_knowledgeTag]에서 {len(concept_names)}개 개념 로드 완료")
 
-    # 2. topic_name 목록 가져오기
-    print("\n2. [questions_dim] topic_name 목록 가져오기...")
-    topic_data = get_unique_topic_names()
-    if not topic_data:
-        print("❌ [questions_dim] topic_name 목록을 가져올 수 없습니다.")
+    # 매핑 메모 가져오기/내보내기 (개념 목록 해시 기준)
+    memo = get_mapping_memo(concept_names)
+    if memo and args.memo_import:
+        print(f"   📥 매핑 메모 가져오기: {memo.import_jsonl(args.memo_import)}건 ({args.memo_import})")
+    if args.memo_export:
+        if not memo:
+            print("❌ 매핑 메모가 비활성화되어 있습니다.")
+            return
+        print(f"   📤 매핑 메모 내보내기: {memo.export_jsonl(args.memo_export)}건 ({args.memo_export})")
         return
 
-    # 3. concept 매핑 처리 (완료 체크)
+    # 2. 매핑 대상 topic_name 목록 가져오기 (중단된 실행이 있으면 이어서 처리)
+    print("\n2. [questions_dim] 매핑 대상 topic_name 목록 가져오기...")
+    batch_size = max(1, args.batch_size)
+    checkpoint = None if args.restart else load_checkpoint()
+
+    if checkpoint:
+        topic_data = checkpoint['topics']
+        batch_size = checkpoint['batch_size']
+        since_id, max_id = checkpoint['since_id'], checkpoint['max_id']
+        committed = checkpoint['committed']
+        print(f"   ♻️ 중단된 실행 재개: {len(topic_data)}개 주제 중 {len(committed)}개 배치 저장 완료")
+    else:
+        since_id = None if args.full else load_watermark()
+        max_id = get_max_question_id()
+        if max_id is None:
+            print("❌ [questions_dim] 최대 id를 조회할 수 없습니다.")
+            return
+
+        if args.mode == "new" and since_id is not None and max_id <= since_id:
+            topic_data = []
+        else:
+            # 청크 단위로 읽어 question_text는 앞부분만 보관 (조회가 끝까지 완료된 경우에만 워터마크 갱신 단계로 진행)
+            topic_data = []
+            try:
+                for chunk in iter_unique_topic_names(
+                    since_id=since_id,
+                    until_id=max_id,
+                    only_new=(args.mode == "new"),
+                    include_mapped=args.full
+                ):
+                    topic_data.extend(chunk)
+            except Exception as e:
+                # 워터마크/체크포인트는 건드리지 않고 중단 → 다음 실행에서 같은 범위를 다시 조회
+                print(f"❌ [questions_dim] 주제 목록을 가져올 수 없습니다: {str(e)}")
+                return
+        committed = set()
+
+        scope = "전체" if args.full else ("신규" if args.mode == "new" else "미매핑/신규")
+        print(f"   ✅ {scope} 주제 {len(topic_data)}개 (id {since_id or 0} 이후, {max_id}까지)")
+
+    # 3. concept 매핑 처리 (대상 주제만)
     concept_completed, concept_done, concept_total = check_concept_completion()
+    concept_success = concept_done  # 기존 완료분 포함
 
-    if concept_completed:
-        print(f"\n3. ✅ concept 매핑 이미 완료됨 ({concept_done}/{concept_total}, {concept_done/concept_total*100:.1f}%)")
-        concept_success = concept_done
+    if not topic_data:
+        print(f"\n3. ✅ 새로 매핑할 주제 없음 ({concept_done}/{concept_total} 기존 완료)")
+        save_watermark(max_id)
+        clear_checkpoint()
     else:
         print(f"\n3. AI concept 매핑 생성 시작 (배치 처리)... ({concept_done}/{concept_total} 기존 완료)")
         print("-" * 60)
 
-        concept_success = concept_done  # 기존 완료분 포함
-        batch_size = 50
+        # 데이터를 배치로 나누고, 이미 저장된 배치는 제외
+        all_batches = [topic_data[i:i + batch_size] for i in range(0, len(topic_data), batch_size)]
+        total_batches = len(all_batches)
+        batches = [(batch_num, batch_data) for batch_num, batch_data in enumerate(all_batches, 1) if batch_num not in committed]
 
-        # 아직 매핑되지 않은 topic만 필터링
-        remaining_topics = []
-        for topic_name, question_text in topic_data:
-            # 이미 매핑된 topic인지 확인하는 로직은 복잡하므로,
-            # 전체를 다시 처리하되 빠르게 스킵하도록 함
-            remaining_topics.append((topic_name, question_text))
+        if not checkpoint:
+            start_checkpoint(topic_data, batch_size, since_id, max_id)
 
-        if remaining_topics:
-            # 데이터를 배치로 나누기
-            batches = [remaining_topics[i:i + batch_size] for i in range(0, len(remaining_topics), batch_size)]
-            total_batches = len(batches)
+        def on_committed(batch_num):
+            mark_batch_committed(committed, batch_num)
 
-            print(f"📊 총 {len(remaining_topics)}개 주제를 {total_batches}개 배치로 처리")
-            print()
+        print(f"📊 총 {len(topic_data)}개 주제를 {total_batches}개 배치로 처리 (남은 배치 {len(batches)}개)")
+        print()
 
-            for batch_num, batch_data in enumerate(batches, 1):
-                batch_success = process_batch_mapping(batch_data, concept_names, batch_num, total_batches)
+        workers = args.workers or get_max_workers()
+        if workers > 1:
+            print(f"⚡ 병렬 매핑: 작업 {workers}개, 분당 호출 제한 {args.rpm or '없음'}")
+            print()
+            concept_success += process_batches_concurrently(
+                batches, concept_names, workers, args.rpm,
+                total_batches=total_batches, on_committed=on_committed
+            )
+        else:
+            progress = ProgressTracker(sum(len(batch_data) for _, batch_data in batches))
+            for batch_num, batch_data in batches:
+                batch_success = process_batch_mapping(batch_data, concept_names, batch_num, total_batches, on_committed)
                 concept_success += batch_success
 
                 # 진행률 표시
-                processed = (batch_num - 1) * batch_size + len(batch_data)
-                progress = (processed / len(remaining_topics)) * 100
-                print(f"📈 전체 진행률: {progress:.1f}% ({processed}/{len(remaining_topics)})")
+                print(f"📈 전체 진행률: {progress.update(len(batch_data))}")
                 print()
 
-    # 4. knowledgeTag 매핑 처리 (완료 체크)
-    tag_completed, tag_done, tag_total = check_knowledge_tag_completion()
+        if memo:
+            print(f"🧠 {memo.format_stats()}")
 
-    if tag_completed:
-        print(f"\n4. ✅ knowledgeTag 매핑 이미 완료됨 ({tag_done}/{tag_total}, {tag_done/tag_total*100:.1f}%)")
-        tag_success = tag_done
-    else:
-        tag_success = process_knowledge_tag_mapping()
+        # 모든 배치가 저장되었으면 워터마크 갱신 후 체크포인트 삭제
+        if len(committed) >= total_batches:
+            save_watermark(max_id)
+            clear_checkpoint()
+            print(f"✅ 매핑 워터마크 갱신: id {max_id}")
+        else:
+            print(f"⚠️ {total_batches - len(committed)}개 배치 미저장 - 다음 실행 시 이어서 처리")
+
+    # 4. knowledgeTag 매핑 처리 (값이 바뀐 행만 갱신하므로 매 실행마다 수행)
+    tag_success, tag_total = process_knowledge_tag_mapping()
 
-    # 5. assessmentItemID 매핑 테스트
-    assessment_success = process_assessment_mapping_test()
-    assessment_total = len(get_questions_with_knowledge_tag())
+    # 5. assessmentItemID 할당 (새 문제만)
+    assessment_success, assessment_total = process_assessment_mapping(args.assessment_strategy, args.reassign_assessment)
 
     # 6. 결과 요약
     print_summary_report(concept_success, concept_total, tag_success, tag_total, assessment_success, assessment_total)
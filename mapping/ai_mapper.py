@@ -2,84 +2,212 @@
 """
 AI 기반 매핑 생성
 """
-import os
 import logging
 import json
-from modules.ai_service import get_openai_client
-from modules.database import get_cached_concept_names
+from modules.core.ai_service import get_openai_client
+from modules.core.llm_gateway import chat_completion
+from modules.core.llm_routes import resolve_route, record_route_validation
+from modules.core.database import get_cached_concept_names
+from mapping.candidate_scorer import get_candidate_scorer
+from mapping.mapping_memo import get_mapping_memo
+
+# 프롬프트에 넣는 예시 문제 길이 (주제명만으로 구분이 어려운 경우 참고용)
+PROMPT_QUESTION_TEXT_LENGTH = 100
+
+
+def format_question_excerpt(question_text):
+    """예시 문제를 한 줄로 줄여 앞부분만 반환 (없으면 빈 문자열)"""
+    if not isinstance(question_text, str):
+        return ""
+    return ' '.join(question_text.split())[:PROMPT_QUESTION_TEXT_LENGTH]
 
 
 def create_mapping_prompt(topic_name, question_text, concept_names):
-    """매핑용 AI 프롬프트 생성 (간소화)"""
+    """매핑용 AI 프롬프트 생성 (어휘 유사도 상위 후보만 포함)"""
+    candidates = [concept for concept, _ in get_candidate_scorer(concept_names).top_candidates(topic_name, question_text)]
+    excerpt = format_question_excerpt(question_text)
     return f"""
 주제: {topic_name}
-
+{f"예시 문제: {excerpt}{chr(10)}" if excerpt else ""}
 다음 개념 중 가장 적합한 것을 선택하세요:
-{chr(10).join([f"- {concept}" for concept in concept_names])}
+{chr(10).join([f"- {concept}" for concept in (candidates or concept_names)])}
 
 응답: 선택한 개념명만 정확히 입력
 """
 
 
 def generate_concept_mapping_with_ai(topic_name, question_text, concept_names):
-    """AI를 사용해서 topic_name에 적절한 concept_name 매핑"""
+    """AI를 사용해서 topic_name에 적절한 concept_name 매핑 (메모된 결정, 확신도 높은 어휘 매칭은 AI 호출 생략)"""
+    memo = get_mapping_memo(concept_names)
+    remembered = memo.get(topic_name) if memo else None
+    if remembered:
+        return remembered
+
+    confident = get_candidate_scorer(concept_names).confident_match(topic_name, question_text)
+    if confident:
+        return confident
+
     try:
         client = get_openai_client()
         prompt = create_mapping_prompt(topic_name, question_text, concept_names)
+        route = resolve_route("mapping")
 
-        response = client.chat.completions.create(
-            model=os.environ["AOAI_DEPLOYMENT"],
-            messages=[
+        response = chat_completion(
+            client,
+            [
                 {"role": "system", "content": "수학 교육과정 전문가입니다. 주제를 적절한 개념에 매핑하세요."},
                 {"role": "user", "content": prompt}
             ],
-            temperature=0.3,
-            max_tokens=100
+            task="mapping",
+            route=route
         )
 
         content = response.choices[0].message.content.strip()
+        selected_concept = match_concept_name(content, concept_names)
+        record_route_validation(route, selected_concept is not None)
+        if selected_concept and memo:
+            memo.put(topic_name, selected_concept)
+        return selected_concept
+
+    except Exception as e:
+        logging.error(f"AI 매핑 생성 실패: {str(e)}")
+        return None
+
+
+def match_concept_name(content, concept_names):
+    """AI 응답 문자열을 concept_names 목록의 개념명으로 검증 (매칭 실패 시 None)"""
+    if not content or not isinstance(content, str):
+        return None
+
+    # 응답 정리 (간단한 텍스트 응답)
+    content = content.strip()
+    if content.startswith('-'):
+        content = content[1:].strip()
+    if content.startswith('•'):
+        content = content[1:].strip()
+
+    # 선택된 개념이 목록에 있는지 확인
+    if content in concept_names:
+        return content
+
+    # 부분 매칭 시도
+    for concept in concept_names:
+        if concept in content or content in concept:
+            return concept
+    return None
+
+
+def create_batch_mapping_prompt(topic_data_batch, concept_names):
+    """여러 topic을 한 번에 매핑하는 프롬프트 생성 (topic별 상위 후보의 합집합을 1회만 포함)"""
+    scorer = get_candidate_scorer(concept_names)
+    candidate_set = set()
+    for topic_name, question_text in topic_data_batch:
+        candidate_set.update(concept for concept, _ in scorer.top_candidates(topic_name, question_text))
+    # 개념 목록 원래 순서 유지
+    candidates = [concept for concept in concept_names if concept in candidate_set] or concept_names
+
+    # 주제별 예시 문제 앞부분을 같은 줄에 포함 (주제명이 모호한 경우 판단 근거)
+    topic_lines = []
+    for i, (topic_name, question_text) in enumerate(topic_data_batch, 1):
+        excerpt = format_question_excerpt(question_text)
+        topic_lines.append(f"{i}. {topic_name} (예시 문제: {excerpt})" if excerpt else f"{i}. {topic_name}")
+    return f"""
+개념 목록:
+{chr(10).join([f"- {concept}" for concept in candidates])}
 
-        # 응답 정리 (간단한 텍스트 응답)
-        if content.startswith('-'):
-            content = content[1:].strip()
-        if content.startswith('•'):
-            content = content[1:].strip()
+주제 목록:
+{chr(10).join(topic_lines)}
 
-        # 선택된 개념이 목록에 있는지 확인
-        if content in concept_names:
-            return content
+각 주제에 대해 개념 목록에서 가장 적합한 개념 하나를 선택하세요.
+응답: 주제 번호를 키, 선택한 개념명(목록과 정확히 동일)을 값으로 하는 JSON 객체만 출력
+예: {{"1": "개념명", "2": "개념명"}}
+"""
+
+
+def generate_concept_mapping_batch_with_ai(topic_data_batch, concept_names):
+    """
+    AI 1회 호출로 여러 topic_name을 concept_name에 매핑
+
+    Returns:
+        dict: {topic_name: concept_name 또는 None} (AI 호출이 실패하면 어휘 매칭으로 확정된 topic만 포함)
+    """
+    if not topic_data_batch:
+        return {}
+
+    # 메모된 결정과 확신도 높은 어휘 매칭은 AI 없이 확정하고 나머지만 AI에 요청
+    memo = get_mapping_memo(concept_names)
+    mappings = memo.get_many([topic_name for topic_name, _ in topic_data_batch]) if memo else {}
+    remembered_count = len(mappings)
+
+    scorer = get_candidate_scorer(concept_names)
+    ai_batch = []
+    for topic_name, question_text in topic_data_batch:
+        if topic_name in mappings:
+            continue
+        confident = scorer.confident_match(topic_name, question_text)
+        if confident:
+            mappings[topic_name] = confident
         else:
-            # 부분 매칭 시도
-            for concept in concept_names:
-                if concept in content or content in concept:
-                    return concept
-            return None
+            ai_batch.append((topic_name, question_text))
+
+    logging.info(f"메모 {remembered_count}개, 어휘 매칭 확정 {len(mappings) - remembered_count}개, AI 요청 {len(ai_batch)}개")
+    if not ai_batch:
+        return mappings
+
+    try:
+        client = get_openai_client()
+        prompt = create_batch_mapping_prompt(ai_batch, concept_names)
+        route = resolve_route("mapping")
+
+        response = chat_completion(
+            client,
+            [
+                {"role": "system", "content": "수학 교육과정 전문가입니다. 각 주제를 적절한 개념에 매핑하여 JSON으로만 응답하세요."},
+                {"role": "user", "content": prompt}
+            ],
+            # 주제당 개념명 1개 분량 + JSON 구조 여유분
+            max_tokens=min(4000, 40 * len(ai_batch) + 100),
+            task="mapping",
+            route=route
+        )
+
+        content = response.choices[0].message.content.strip()
+
+        # JSON 객체 부분 추출
+        start_idx = content.find("{")
+        end_idx = content.rfind("}") + 1
+        if start_idx == -1 or end_idx == 0:
+            logging.error("배치 매핑 응답에서 JSON을 찾을 수 없음")
+            record_route_validation(route, False)
+            return mappings
+
+        answers = json.loads(content[start_idx:end_idx])
+        if not isinstance(answers, dict):
+            return mappings
+
+        # 번호별 응답을 개념 목록으로 검증
+        ai_pairs = []
+        for i, (topic_name, _) in enumerate(ai_batch, 1):
+            answer = answers.get(str(i), answers.get(topic_name))
+            mappings[topic_name] = match_concept_name(answer, concept_names)
+            record_route_validation(route, mappings[topic_name] is not None)
+            if mappings[topic_name]:
+                ai_pairs.append((topic_name, mappings[topic_name]))
+
+        if memo:
+            memo.put_many(ai_pairs)
+        return mappings
 
     except Exception as e:
-        logging.error(f"AI 매핑 생성 실패: {str(e)}")
-        return None
+        logging.error(f"AI 배치 매핑 생성 실패: {str(e)}")
+        return mappings
 
 
 def get_fallback_concept(topic_name, concept_names):
-    """폴백 매핑 (단순 문자열 유사도)"""
-    topic_lower = topic_name.lower()
-
-    # 키워드 기반 매핑
-    keyword_mapping = {
-        "확률": ["확률", "경우의 수", "구슬"],
-        "일차함수": ["일차함수", "그래프", "기울기"],
-        "이차함수": ["이차함수", "포물선"],
-        "인수분해": ["인수분해", "완전제곱"],
-        "근호": ["루트", "근호", "제곱근"],
-        "방정식": ["방정식", "해"],
-        "부등식": ["부등식", "대소관계"]
-    }
-
-    for concept, keywords in keyword_mapping.items():
-        if concept in concept_names:
-            for keyword in keywords:
-                if keyword in topic_lower:
-                    return concept
+    """폴백 매핑 (문자 n-gram 어휘 유사도 1위 개념)"""
+    candidates = get_candidate_scorer(concept_names).top_candidates(topic_name, k=1)
+    if candidates and candidates[0][1] > 0:
+        return candidates[0][0]
 
     # 기본값 (가장 일반적인 개념)
     defaults = ["기본 도형", "수와 연산", "식의 계산"]
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+knowledgeTag → assessmentItemID 할당 엔진
+문제를 knowledgeTag별로 묶어 그룹 단위로 한 번에 할당 (행당 O(1))
+
+할당 방식:
+- unique: 태그 내에서 아직 사용되지 않은 assessmentItemID를 순서대로 1개씩 (부족하면 할당 실패)
+- round_robin: 태그의 assessmentItemID를 순환하며 할당 (항상 할당)
+- hash: question_id 해시로 결정 (재실행해도 같은 결과)
+"""
+from hashlib import sha1
+from collections import defaultdict
+
+ASSIGNMENT_STRATEGIES = ('unique', 'round_robin', 'hash')
+
+
+def normalize_tag(knowledge_tag):
+    """knowledgeTag를 정수로 변환 (변환 실패 시 None)"""
+    try:
+        return int(knowledge_tag)
+    except (ValueError, TypeError):
+        return None
+
+
+def stable_hash(value):
+    """프로세스와 무관하게 같은 값을 주는 해시 (Python hash()는 실행마다 달라 사용하지 않음)"""
+    return int(sha1(str(value).encode('utf-8')).hexdigest()[:12], 16)
+
+
+class AssessmentAssigner:
+    """
+    assessmentItemID 할당기
+
+    Args:
+        all_mappings: {knowledgeTag(int): assessmentItemID 시퀀스}
+        strategy: 할당 방식 (ASSIGNMENT_STRATEGIES)
+        assigned_items_by_tag: 이전 실행에서 이미 할당된 {knowledgeTag: [assessmentItemID]} (증분 실행용)
+    """
+
+    def __init__(self, all_mappings, strategy='unique', assigned_items_by_tag=None):
+        if strategy not in ASSIGNMENT_STRATEGIES:
+            raise ValueError(f"지원하지 않는 할당 방식: {strategy}")
+
+        self.all_mappings = all_mappings
+        self.strategy = strategy
+        self.assigned_items_by_tag = assigned_items_by_tag or {}
+
+        # unique: 태그별 미사용 항목 목록과 다음 위치, round_robin: 태그별 다음 순번
+        self._available = {}
+        self._positions = defaultdict(int)
+        self.assigned_count = 0
+        self.failed_count = 0
+        self.failures_by_reason = defaultdict(int)
+
+    def _get_available(self, tag):
+        """unique 방식의 태그별 미사용 assessmentItemID 목록 (태그당 1회 계산)"""
+        available = self._available.get(tag)
+        if available is None:
+            # 할당 테이블은 assessmentItemID를 문자열로 저장하므로 문자열로 비교
+            used = {str(item_id) for item_id in self.assigned_items_by_tag.get(tag, ())}
+            available = [item_id for item_id in self.all_mappings.get(tag, ()) if str(item_id) not in used]
+            self._available[tag] = available
+        return available
+
+    def assign_group(self, tag, question_ids):
+        """같은 knowledgeTag 문제들에 한 번에 할당 → 문제 순서대로 assessmentItemID 또는 None"""
+        items = self.all_mappings.get(tag)
+        if not items:
+            self.failures_by_reason['assessmentItemID 없음'] += len(question_ids)
+            return [None] * len(question_ids)
+
+        count = len(question_ids)
+        if self.strategy == 'unique':
+            available = self._get_available(tag)
+            start = self._positions[tag]
+            assigned = list(available[start:start + count])
+            self._positions[tag] = start + len(assigned)
+            if len(assigned) < count:
+                self.failures_by_reason['모든 assessmentItemID 사용됨'] += count - len(assigned)
+                assigned.extend([None] * (count - len(assigned)))
+            return assigned
+
+        if self.strategy == 'round_robin':
+            # 이전 실행에서 할당된 수만큼 이어서 순환
+            start = self._positions.get(tag, len(self.assigned_items_by_tag.get(tag, ())))
+            self._positions[tag] = start + count
+            size = len(items)
+            return [items[(start + i) % size] for i in range(count)]
+
+        size = len(items)
+        return [items[stable_hash(question_id) % size] for question_id in question_ids]
+
+    def assign_rows(self, rows):
+        """
+        (question_id, knowledgeTag) 목록 할당
+
+        Returns:
+            list: [(question_id, knowledgeTag, assessmentItemID)] 할당 성공 행만
+        """
+        groups = defaultdict(list)
+        for question_id, knowledge_tag in rows:
+            tag = normalize_tag(knowledge_tag)
+            if tag is None:
+                self.failures_by_reason['knowledgeTag 타입 변환 실패'] += 1
+                self.failed_count += 1
+                continue
+            groups[tag].append(question_id)
+
+        assignments = []
+        for tag, question_ids in groups.items():
+            for question_id, item_id in zip(question_ids, self.assign_group(tag, question_ids)):
+                if item_id is None:
+                    self.failed_count += 1
+                else:
+                    assignments.append((question_id, tag, item_id))
+
+        self.assigned_count += len(assignments)
+        return assignments
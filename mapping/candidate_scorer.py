@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+로컬 어휘 유사도 기반 개념 후보 생성
+topic_name/question_text와 concept_name의 문자 n-gram TF-IDF 코사인 유사도로
+AI 호출 전에 후보를 좁히고, 확신도가 높은 매칭은 AI 없이 바로 확정
+"""
+import os
+import re
+import math
+import threading
+from collections import defaultdict
+
+# 문자 n-gram 길이
+NGRAM_SIZES = (2, 3)
+
+# question_text 유사도 반영 비율 (topic_name 대비)
+QUESTION_TEXT_WEIGHT = 0.3
+
+_SCORER_CACHE = {}
+_SCORER_LOCK = threading.Lock()
+
+
+def _normalize(text):
+    """비교용 정규화 (소문자, 공백/기호 제거)"""
+    return re.sub(r'[\s\W_]+', '', str(text or '').lower())
+
+
+def _char_ngrams(text):
+    """정규화된 문자열의 문자 n-gram 빈도"""
+    normalized = _normalize(text)
+    counts = defaultdict(int)
+    for n in NGRAM_SIZES:
+        if len(normalized) < n:
+            if n == NGRAM_SIZES[0] and normalized:
+                counts[normalized] += 1
+            continue
+        for i in range(len(normalized) - n + 1):
+            counts[normalized[i:i + n]] += 1
+    return counts
+
+
+def get_candidate_top_k():
+    """프롬프트에 포함할 후보 수 (MAPPING_CANDIDATE_TOP_K)"""
+    try:
+        return max(1, int(os.environ.get("MAPPING_CANDIDATE_TOP_K", "20")))
+    except ValueError:
+        return 20
+
+
+class ConceptCandidateScorer:
+    """concept_name 목록에 대한 문자 n-gram TF-IDF 희소 행렬과 역색인"""
+
+    def __init__(self, concept_names, accept_score=None, accept_margin=None):
+        self.concept_names = list(concept_names)
+        self.accept_score = accept_score if accept_score is not None else float(os.environ.get("MAPPING_ACCEPT_SCORE", "0.85"))
+        self.accept_margin = accept_margin if accept_margin is not None else float(os.environ.get("MAPPING_ACCEPT_MARGIN", "0.15"))
+        self._normalized_lookup = {_normalize(name): idx for idx, name in enumerate(self.concept_names)}
+        self._build_index()
+
+    def _build_index(self):
+        """IDF 계산 후 개념별 정규화 벡터를 n-gram 역색인(희소 행렬의 열 방향)으로 저장"""
+        concept_ngrams = [_char_ngrams(name) for name in self.concept_names]
+
+        document_frequency = defaultdict(int)
+        for ngrams in concept_ngrams:
+            for ngram in ngrams:
+                document_frequency[ngram] += 1
+
+        total = len(self.concept_names)
+        self.idf = {ngram: math.log((1 + total) / (1 + df)) + 1.0 for ngram, df in document_frequency.items()}
+
+        self.index = defaultdict(list)
+        for concept_idx, ngrams in enumerate(concept_ngrams):
+            weights = {ngram: count * self.idf[ngram] for ngram, count in ngrams.items()}
+            norm = math.sqrt(sum(weight * weight for weight in weights.values())) or 1.0
+            for ngram, weight in weights.items():
+                self.index[ngram].append((concept_idx, weight / norm))
+
+    def _vectorize(self, text):
+        """질의 문자열을 정규화된 TF-IDF 벡터로 변환 (개념 목록에 없는 n-gram은 제외)"""
+        weights = {
+            ngram: count * self.idf[ngram]
+            for ngram, count in _char_ngrams(text).items()
+            if ngram in self.idf
+        }
+        norm = math.sqrt(sum(weight * weight for weight in weights.values())) or 1.0
+        return {ngram: weight / norm for ngram, weight in weights.items()}
+
+    def score(self, topic_name, question_text=None):
+        """개념별 유사도 점수 ({concept_idx: score})"""
+        scores = defaultdict(float)
+        queries = [(topic_name, 1.0)]
+        if question_text:
+            queries.append((str(question_text)[:200], QUESTION_TEXT_WEIGHT))
+
+        for text, query_weight in queries:
+            for ngram, weight in self._vectorize(text).items():
+                for concept_idx, concept_weight in self.index.get(ngram, ()):
+                    scores[concept_idx] += query_weight * weight * concept_weight
+
+        # 정확히 같은 이름은 최고점
+        exact_idx = self._normalized_lookup.get(_normalize(topic_name))
+        if exact_idx is not None:
+            scores[exact_idx] = 1.0 + QUESTION_TEXT_WEIGHT
+        return scores
+
+    def top_candidates(self, topic_name, question_text=None, k=None):
+        """유사도 상위 k개 개념 [(concept_name, score)]"""
+        k = k or get_candidate_top_k()
+        scores = self.score(topic_name, question_text)
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]
+        return [(self.concept_names[concept_idx], score) for concept_idx, score in ranked]
+
+    def confident_match(self, topic_name, question_text=None):
+        """AI 없이 확정할 수 있는 개념 (1위 점수와 2위와의 차이가 기준 이상일 때, 아니면 None)"""
+        candidates = self.top_candidates(topic_name, question_text, k=2)
+        if not candidates:
+            return None
+        best_name, best_score = candidates[0]
+        second_score = candidates[1][1] if len(candidates) > 1 else 0.0
+        if best_score >= self.accept_score and best_score - second_score >= self.accept_margin:
+            return best_name
+        return None
+
+
+def get_candidate_scorer(concept_names):
+    """concept_names 목록별로 1회만 생성한 scorer 반환"""
+    key = tuple(concept_names)
+    with _SCORER_LOCK:
+        scorer = _SCORER_CACHE.get(key)
+        if scorer is None:
+            _SCORER_CACHE.clear()
+            scorer = ConceptCandidateScorer(key)
+            _SCORER_CACHE[key] = scorer
+    return scorer
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+concept 매핑 체크포인트
+중단된 실행을 마지막으로 저장된 배치 다음부터 재개하고,
+실행 완료 시 처리한 최대 id(워터마크)를 기록해 다음 실행은 새 데이터만 처리
+"""
+import threading
+from modules.core.state_store import load_state, save_state, delete_state
+
+CHECKPOINT_NAMESPACE = "concept_mapping"
+PLAN_KEY = "checkpoint_plan"
+PROGRESS_KEY = "checkpoint_progress"
+WATERMARK_KEY = "watermark"
+
+_PROGRESS_LOCK = threading.Lock()
+
+
+def load_watermark():
+    """지난 실행에서 처리 완료한 questions_dim 최대 id (기록 없으면 None)"""
+    state = load_state(CHECKPOINT_NAMESPACE, WATERMARK_KEY)
+    return state.get('max_id') if isinstance(state, dict) else None
+
+
+def save_watermark(max_id):
+    """실행 완료 시점의 최대 id 기록"""
+    return save_state(CHECKPOINT_NAMESPACE, WATERMARK_KEY, {'max_id': max_id})
+
+
+def load_checkpoint():
+    """중단된 실행 계획과 저장 완료 배치 번호 (없으면 None)"""
+    plan = load_state(CHECKPOINT_NAMESPACE, PLAN_KEY)
+    if not isinstance(plan, dict) or not plan.get('topics'):
+        return None
+
+    progress = load_state(CHECKPOINT_NAMESPACE, PROGRESS_KEY) or {}
+    plan['topics'] = [tuple(topic) for topic in plan['topics']]
+    plan['committed'] = set(progress.get('committed', []))
+    return plan
+
+
+def start_checkpoint(topics, batch_size, since_id, max_id):
+    """새 실행 계획 기록 (topic 목록과 배치 크기가 같아야 배치 번호가 유지됨)"""
+    delete_state(CHECKPOINT_NAMESPACE, PROGRESS_KEY)
+    return save_state(CHECKPOINT_NAMESPACE, PLAN_KEY, {
+        'topics': [list(topic) for topic in topics],
+        'batch_size': batch_size,
+        'since_id': since_id,
+        'max_id': max_id
+    })
+
+
+def mark_batch_committed(committed, batch_num):
+    """DB 저장이 끝난 배치 번호 기록 (committed: 현재 실행의 완료 배치 집합)"""
+    with _PROGRESS_LOCK:
+        committed.add(batch_num)
+        return save_state(CHECKPOINT_NAMESPACE, PROGRESS_KEY, {'committed': sorted(committed)})
+
+
+def clear_checkpoint():
+    """실행 완료 후 체크포인트 삭제"""
+    delete_state(CHECKPOINT_NAMESPACE, PROGRESS_KEY)
+    delete_state(CHECKPOINT_NAMESPACE, PLAN_KEY)
@@ -3,40 +3,88 @@
 데이터 로딩 관련 함수들
 """
 import logging
-from modules.database import get_sql_connection
+from modules.core.database import get_sql_connection, iter_query_chunks
 
 
-def get_unique_topic_names():
-    """DB에서 고유한 topic_name과 샘플 question_text 가져오기"""
+def get_max_question_id():
+    """questions_dim의 현재 최대 id (증분 매핑 기준점, 실패 시 None)"""
     try:
         conn = get_sql_connection()
         if not conn:
             logging.error("DB 연결 실패")
-            return []
+            return None
 
         cursor = conn.cursor()
-        cursor.execute("""
-            SELECT DISTINCT t1.question_topic_name, t2.question_text
-            FROM (
-                SELECT question_topic_name, MIN(id) as min_id
-                FROM questions_dim
-                WHERE question_topic_name IS NOT NULL
-                GROUP BY question_topic_name
-            ) t1
-            INNER JOIN questions_dim t2 ON t1.min_id = t2.id
-            ORDER BY t1.question_topic_name
-        """)
-
-        results = cursor.fetchall()
+        cursor.execute("SELECT MAX(id) FROM questions_dim")
+        row = cursor.fetchone()
         conn.close()
+        return row[0] if row and row[0] is not None else 0
 
-        topic_data = [(row[0], row[1]) for row in results if row[0]]
-        logging.info(f"✅ questions_dim에서 {len(topic_data)}개 주제 발견")
-        return topic_data
-
+    except Exception as e:
+        logging.error(f"최대 id 조회 실패: {str(e)}")
+        return None
+
+
+# 매핑에 사용하는 question_text 최대 길이 (어휘 유사도 계산에 앞부분만 사용)
+QUESTION_TEXT_MAX_LENGTH = 200
+
+
+def iter_unique_topic_names(since_id=None, until_id=None, only_new=False, include_mapped=False, arraysize=None):
+    """
+    고유한 topic_name과 샘플 question_text를 청크 단위로 반환하는 제너레이터 → [(topic_name, question_text)]
+
+    기본: concept_by_ai가 NULL인 행이 있거나 since_id 이후 추가된 행이 있는 topic만 반환
+    only_new: since_id 이후 추가된 행의 topic만 반환 (스케줄 실행용)
+    include_mapped: 매핑 여부와 관계없이 전체 topic 반환 (전체 재매핑)
+    until_id: 실행 시작 시점의 최대 id (실행 중 추가된 행은 다음 실행에서 처리)
+    """
+    conditions = ["question_topic_name IS NOT NULL"]
+    params = []
+
+    if until_id is not None:
+        conditions.append("id <= ?")
+        params.append(until_id)
+
+    if not include_mapped:
+        if only_new:
+            conditions.append("id > ?")
+            params.append(since_id or 0)
+        elif since_id is not None:
+            conditions.append("(concept_by_ai IS NULL OR id > ?)")
+            params.append(since_id)
+        else:
+            conditions.append("concept_by_ai IS NULL")
+
+    for rows in iter_query_chunks(f"""
+        SELECT t1.question_topic_name, t2.question_text
+        FROM (
+            SELECT question_topic_name, MIN(id) as min_id
+            FROM questions_dim
+            WHERE {' AND '.join(conditions)}
+            GROUP BY question_topic_name
+        ) t1
+        INNER JOIN questions_dim t2 ON t1.min_id = t2.id
+        ORDER BY t1.question_topic_name
+    """, params, arraysize):
+        yield [
+            (row[0], row[1][:QUESTION_TEXT_MAX_LENGTH] if isinstance(row[1], str) else row[1])
+            for row in rows if row[0]
+        ]
+
+
+def get_unique_topic_names(since_id=None, until_id=None, only_new=False, include_mapped=False):
+    """iter_unique_topic_names 결과를 목록으로 반환 (하위 호환성, 조회 실패 시 None)"""
+    try:
+        topic_data = [
+            topic
+            for chunk in iter_unique_topic_names(since_id, until_id, only_new, include_mapped)
+            for topic in chunk
+        ]
     except Exception as e:
         logging.error(f"topic_name 로딩 실패: {str(e)}")
-        return []
+        return None
+    logging.info(f"✅ questions_dim에서 {len(topic_data)}개 주제 발견")
+    return topic_data
 
 
 def count_topic_rows(topic_name):
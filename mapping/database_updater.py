@@ -3,39 +3,41 @@
 DB 업데이트 관련 함수들
 """
 import logging
-from modules.database import get_sql_connection
+from array import array
+from modules.core.database import get_sql_connection, iter_query_chunks
 
+# 문제별 assessmentItemID 할당 결과 테이블
+ASSESSMENT_MAP_TABLE = "dbo.question_assessment_map"
+
+
+def _bulk_update_pairs(pairs, create_staging_sql, insert_sql, update_sql, label):
+    """
+    (키, 값) 쌍을 임시 스테이징 테이블에 fast_executemany로 적재한 뒤 조인 UPDATE 1회로 반영
+
+    스테이징 테이블은 questions_dim 컬럼에서 SELECT TOP 0 INTO로 만들어 타입/콜레이션이 원본과 같으므로
+    조인 시 COLLATE 변환 없이 인덱스를 사용하고, 배치 크기와 무관하게 같은 쿼리 계획을 재사용
+
+    Returns:
+        int: 업데이트된 행 수 (저장할 쌍이 없으면 0), DB 연결/SQL 실패 시 None (커밋되지 않음)
+    """
+    # 같은 키가 여러 번 있으면 마지막 값 사용
+    rows = list({key: value for key, value in pairs if key is not None and value is not None}.items())
+    if not rows:
+        return 0
 
-def update_concept_by_ai_batch(topic_concept_pairs):
-    """배치로 concept_by_ai 업데이트 (50개씩)"""
     try:
         conn = get_sql_connection()
         if not conn:
             logging.error("DB 연결 실패")
-            return 0
+            return None
 
         cursor = conn.cursor()
+        cursor.execute(create_staging_sql)
 
-        # CASE WHEN 구문 생성
-        case_statements = []
-        topic_list = []
-
-        for topic_name, concept_name in topic_concept_pairs:
-            escaped_topic = topic_name.replace("'", "''")
-            escaped_concept = concept_name.replace("'", "''")
+        cursor.fast_executemany = True
+        cursor.executemany(insert_sql, rows)
 
-            case_statements.append(f"WHEN N'{escaped_topic}' THEN N'{escaped_concept}'")
-            topic_list.append(f"N'{escaped_topic}'")
-
-        update_query = f"""
-            UPDATE questions_dim
-            SET concept_by_ai = CASE question_topic_name COLLATE Korean_Wansung_CI_AS
-                {chr(10).join(case_statements)}
-            END
-            WHERE question_topic_name COLLATE Korean_Wansung_CI_AS IN ({', '.join(topic_list)})
-        """
-
-        cursor.execute(update_query)
+        cursor.execute(update_sql)
         affected_rows = cursor.rowcount
 
         conn.commit()
@@ -44,16 +46,37 @@ def update_concept_by_ai_batch(topic_concept_pairs):
         return affected_rows
 
     except Exception as e:
-        logging.error(f"배치 DB 업데이트 실패: {str(e)}")
-        if 'conn' in locals():
+        logging.error(f"{label} 일괄 업데이트 실패: {str(e)}")
+        if 'conn' in locals() and conn:
             conn.rollback()
             conn.close()
-        return 0
+        return None
+
+
+def update_concept_by_ai_batch(topic_concept_pairs):
+    """concept_by_ai 일괄 업데이트 (스테이징 테이블 + 조인 UPDATE, 수천 건 단위 가능)"""
+    return _bulk_update_pairs(
+        topic_concept_pairs,
+        """
+            SELECT TOP 0 question_topic_name AS topic_name, concept_by_ai AS concept_name
+            INTO #concept_updates
+            FROM questions_dim
+        """,
+        "INSERT INTO #concept_updates (topic_name, concept_name) VALUES (?, ?)",
+        """
+            UPDATE q
+            SET q.concept_by_ai = s.concept_name
+            FROM questions_dim q
+            INNER JOIN #concept_updates s ON q.question_topic_name = s.topic_name
+            WHERE q.concept_by_ai IS NULL OR q.concept_by_ai <> s.concept_name
+        """,
+        "concept_by_ai"
+    )
 
 
 def update_concept_by_ai(topic_name, concept_name):
     """단일 concept_by_ai 업데이트 (하위 호환성)"""
-    return update_concept_by_ai_batch([(topic_name, concept_name)]) > 0
+    return (update_concept_by_ai_batch([(topic_name, concept_name)]) or 0) > 0
 
 
 def get_concepts_for_knowledge_mapping():
@@ -82,126 +105,136 @@ def get_concepts_for_knowledge_mapping():
         return []
 
 
-def get_knowledge_tag_for_concept(concept_name):
-    """concept_name으로 knowledgeTag 조회"""
-    try:
-        conn = get_sql_connection()
-        if not conn:
-            return None
-
-        cursor = conn.cursor()
-        escaped_concept = concept_name.replace("'", "''")
-
-        cursor.execute(f"""
-            SELECT TOP 1 knowledgeTag
-            FROM gold.gold_knowledgeTag
-            WHERE concept_name = N'{escaped_concept}' COLLATE Korean_Wansung_CI_AS
-        """)
-
-        result = cursor.fetchone()
-        conn.close()
+def apply_knowledge_tag_mapping():
+    """
+    concept_by_ai → knowledgeTag 일괄 매핑 (DB 왕복 1회)
 
-        return result[0] if result else None
+    gold.gold_knowledgeTag와 조인한 UPDATE 1회로 값이 다른 행만 갱신하고,
+    같은 배치에서 매칭되지 않은 concept 목록과 완료 현황을 함께 조회
 
-    except Exception as e:
-        logging.error(f"knowledgeTag 조회 실패: {str(e)}")
-        return None
-
-
-def update_knowledge_tag(concept_name, knowledge_tag):
-    """concept_by_ai로 knowledgeTag 업데이트"""
+    Returns:
+        dict: {'updated_rows', 'total_rows', 'tagged_rows', 'unmatched': [(concept_name, row_count)]}
+        실패 시 None
+    """
     try:
         conn = get_sql_connection()
         if not conn:
-            return False
+            logging.error("DB 연결 실패")
+            return None
 
         cursor = conn.cursor()
 
-        escaped_concept = concept_name.replace("'", "''")
-        # knowledgeTag는 int이므로 직접 사용
+        # 조인 키의 COLLATE는 gold 쪽에만 적용 (questions_dim.concept_by_ai 인덱스 유지)
+        # concept_name이 중복된 경우 가장 작은 knowledgeTag로 고정
+        cursor.execute("""
+            SET NOCOUNT ON;
+            DECLARE @updated_rows INT;
+
+            UPDATE q
+            SET q.knowledgeTag = g.knowledgeTag
+            FROM questions_dim q
+            CROSS APPLY (
+                SELECT TOP 1 k.knowledgeTag
+                FROM gold.gold_knowledgeTag k
+                WHERE k.concept_name COLLATE Korean_Wansung_CI_AS = q.concept_by_ai
+                ORDER BY k.knowledgeTag
+            ) g
+            WHERE q.concept_by_ai IS NOT NULL
+              AND (q.knowledgeTag IS NULL OR q.knowledgeTag <> g.knowledgeTag);
+            SET @updated_rows = @@ROWCOUNT;
 
-        update_query = f"""
-            UPDATE questions_dim
-            SET knowledgeTag = {knowledge_tag}
-            WHERE concept_by_ai = N'{escaped_concept}' COLLATE Korean_Wansung_CI_AS
-        """
+            SELECT
+                @updated_rows AS updated_rows,
+                COUNT(*) AS total_rows,
+                SUM(CASE WHEN knowledgeTag IS NOT NULL THEN 1 ELSE 0 END) AS tagged_rows
+            FROM questions_dim
+            WHERE concept_by_ai IS NOT NULL;
+
+            SELECT q.concept_by_ai, COUNT(*) AS row_count
+            FROM questions_dim q
+            WHERE q.concept_by_ai IS NOT NULL
+              AND NOT EXISTS (
+                  SELECT 1
+                  FROM gold.gold_knowledgeTag k
+                  WHERE k.concept_name COLLATE Korean_Wansung_CI_AS = q.concept_by_ai
+              )
+            GROUP BY q.concept_by_ai
+            ORDER BY q.concept_by_ai;
+        """)
 
-        cursor.execute(update_query)
-        affected_rows = cursor.rowcount
+        updated_rows, total_rows, tagged_rows = cursor.fetchone()
+        cursor.nextset()
+        unmatched = [(row[0], row[1]) for row in cursor.fetchall()]
 
         conn.commit()
         conn.close()
 
-        return affected_rows > 0
+        return {
+            'updated_rows': updated_rows or 0,
+            'total_rows': total_rows or 0,
+            'tagged_rows': tagged_rows or 0,
+            'unmatched': unmatched
+        }
 
     except Exception as e:
-        logging.error(f"knowledgeTag 업데이트 실패: {str(e)}")
-        if 'conn' in locals():
+        logging.error(f"knowledgeTag 일괄 매핑 실패: {str(e)}")
+        if 'conn' in locals() and conn:
             conn.rollback()
             conn.close()
-        return False
-
-
-def get_questions_with_knowledge_tag():
-    """knowledgeTag가 있는 모든 문제 조회"""
-    try:
-        conn = get_sql_connection()
-        if not conn:
-            return []
-
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT id, question_topic_name, knowledgeTag
-            FROM questions_dim
-            WHERE knowledgeTag IS NOT NULL
-            ORDER BY id
-        """)
-
-        results = cursor.fetchall()
-        conn.close()
-
-        return [(row[0], row[1], row[2]) for row in results]
-
-    except Exception as e:
-        logging.error(f"knowledgeTag 문제 조회 실패: {str(e)}")
-        return []
+        return None
 
 
-def load_all_assessment_mappings():
-    """모든 knowledgeTag → assessmentItemID 매핑을 한 번에 로드"""
+def update_knowledge_tag(concept_name, knowledge_tag):
+    """concept_by_ai로 knowledgeTag 업데이트 (하위 호환성)"""
+    return (update_knowledge_tag_batch([(concept_name, knowledge_tag)]) or 0) > 0
+
+
+def get_questions_with_knowledge_tag(arraysize=None):
+    """knowledgeTag가 있는 모든 문제를 청크 단위로 반환하는 제너레이터 → [(id, question_topic_name, knowledgeTag)] (조회 실패 시 예외)"""
+    for rows in iter_query_chunks("""
+        SELECT id, question_topic_name, knowledgeTag
+        FROM questions_dim
+        WHERE knowledgeTag IS NOT NULL
+        ORDER BY id
+    """, arraysize=arraysize):
+        yield [(row[0], row[1], row[2]) for row in rows]
+
+
+def compact_ids(values):
+    """ID 목록을 작은 메모리 형태로 변환 (모두 정수면 array('q'), 아니면 tuple)"""
+    if all(isinstance(value, int) for value in values):
+        return array('q', values)
+    return tuple(values)
+
+
+def load_tag_item_groups(query, arraysize=None):
+    """(knowledgeTag, assessmentItemID) 순으로 정렬된 쿼리 결과를 스트리밍하여 {knowledgeTag: 압축 ID 목록} 생성"""
+    mappings = {}
+    current_tag, current_items = None, []
+    for rows in iter_query_chunks(query, arraysize=arraysize):
+        for knowledge_tag, assessment_id in rows:
+            if knowledge_tag != current_tag:
+                if current_items:
+                    mappings[current_tag] = compact_ids(current_items)
+                current_tag, current_items = knowledge_tag, []
+            current_items.append(assessment_id)
+
+    if current_items:
+        mappings[current_tag] = compact_ids(current_items)
+    return mappings
+
+
+def load_all_assessment_mappings(arraysize=None):
+    """모든 knowledgeTag → assessmentItemID 매핑을 한 번에 로드 ({knowledgeTag: array('q') 또는 tuple})"""
     try:
-        conn = get_sql_connection()
-        if not conn:
-            return {}
-
-        cursor = conn.cursor()
-        cursor.execute("""
+        mappings = load_tag_item_groups("""
             SELECT knowledgeTag, assessmentItemID
             FROM gold.gold_knowledgeTag_dim
             WHERE knowledgeTag IS NOT NULL AND assessmentItemID IS NOT NULL
             ORDER BY knowledgeTag, assessmentItemID
-        """)
-
-        results = cursor.fetchall()
-        conn.close()
+        """, arraysize)
 
-        # knowledgeTag별로 assessmentItemID 리스트 생성
-        mappings = {}
-        for knowledge_tag, assessment_id in results:
-            if knowledge_tag not in mappings:
-                mappings[knowledge_tag] = []
-            mappings[knowledge_tag].append(assessment_id)
-
-        # 디버깅: 특정 knowledgeTag 확인
-        test_tags = [4959, 1180, 1181]
-        for tag in test_tags:
-            if tag in mappings:
-                print(f"🔍 디버깅: knowledgeTag {tag} → {len(mappings[tag])}개 assessmentItemID 로드됨")
-                print(f"    첫 5개: {mappings[tag][:5]}")
-            else:
-                print(f"❌ 디버깅: knowledgeTag {tag} 매핑에서 누락됨")
-
-        logging.info(f"전체 매핑 로드 완료: {len(mappings)}개 knowledgeTag, {len(results)}개 assessmentItemID")
+        logging.info(f"전체 매핑 로드 완료: {len(mappings)}개 knowledgeTag, {sum(len(items) for items in mappings.values())}개 assessmentItemID")
         return mappings
 
     except Exception as e:
@@ -217,12 +250,12 @@ def get_assessment_items_for_knowledge_tag(knowledge_tag):
             return []
 
         cursor = conn.cursor()
-        cursor.execute(f"""
+        cursor.execute("""
             SELECT DISTINCT assessmentItemID
             FROM gold.gold_knowledgeTag_dim
-            WHERE knowledgeTag = {knowledge_tag}
+            WHERE knowledgeTag = ?
             ORDER BY assessmentItemID
-        """)
+        """, knowledge_tag)
 
         results = cursor.fetchall()
         conn.close()
@@ -293,6 +326,129 @@ def assign_assessment_item_id(knowledge_tag, used_items_by_tag):
     return None, f"knowledgeTag {knowledge_tag}의 모든 assessmentItemID 사용됨 ({len(available_items)}개)"
 
 
+def ensure_assessment_map_table():
+    """문제별 assessmentItemID 할당 결과 테이블 생성 (없을 때만)"""
+    try:
+        conn = get_sql_connection()
+        if not conn:
+            return False
+
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            IF OBJECT_ID(N'{ASSESSMENT_MAP_TABLE}', N'U') IS NULL
+            CREATE TABLE {ASSESSMENT_MAP_TABLE} (
+                question_id BIGINT NOT NULL PRIMARY KEY,
+                knowledgeTag INT NOT NULL,
+                assessmentItemID NVARCHAR(100) NOT NULL,
+                strategy NVARCHAR(20) NOT NULL,
+                assigned_at DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME()
+            )
+        """)
+        conn.commit()
+        conn.close()
+        return True
+
+    except Exception as e:
+        logging.error(f"할당 테이블 생성 실패: {str(e)}")
+        return False
+
+
+def get_questions_needing_assessment(reassign=False, arraysize=None):
+    """할당이 없거나 knowledgeTag가 바뀐 문제(reassign이면 knowledgeTag가 있는 전체 문제)를 청크 단위로 반환 → [(id, knowledgeTag)] (조회 실패 시 예외)"""
+    if reassign:
+        query = """
+            SELECT id, knowledgeTag
+            FROM questions_dim
+            WHERE knowledgeTag IS NOT NULL
+            ORDER BY id
+        """
+    else:
+        query = f"""
+            SELECT q.id, q.knowledgeTag
+            FROM questions_dim q
+            LEFT JOIN {ASSESSMENT_MAP_TABLE} m ON m.question_id = q.id
+            WHERE q.knowledgeTag IS NOT NULL
+              AND (m.question_id IS NULL OR m.knowledgeTag <> q.knowledgeTag)
+            ORDER BY q.id
+        """
+
+    for rows in iter_query_chunks(query, arraysize=arraysize):
+        yield [(row[0], row[1]) for row in rows]
+
+
+def load_assigned_items_by_tag(arraysize=None):
+    """현재 knowledgeTag와 일치하는 기존 할당의 {knowledgeTag: 압축 ID 목록} (증분 할당용, {}는 기존 할당 없음, 조회 실패 시 None)"""
+    try:
+        return load_tag_item_groups(f"""
+            SELECT m.knowledgeTag, m.assessmentItemID
+            FROM {ASSESSMENT_MAP_TABLE} m
+            INNER JOIN questions_dim q ON q.id = m.question_id AND q.knowledgeTag = m.knowledgeTag
+            ORDER BY m.knowledgeTag, m.question_id
+        """, arraysize)
+
+    except Exception as e:
+        logging.error(f"기존 할당 조회 실패: {str(e)}")
+        return None
+
+
+def save_assessment_assignments(assignments, strategy):
+    """
+    할당 결과 일괄 저장 (스테이징 테이블 + MERGE)
+
+    Args:
+        assignments: [(question_id, knowledgeTag, assessmentItemID)]
+        strategy: 할당 방식
+
+    Returns:
+        int: 추가/변경된 행 수 (실패 시 0)
+    """
+    if not assignments:
+        return 0
+
+    try:
+        conn = get_sql_connection()
+        if not conn:
+            logging.error("DB 연결 실패")
+            return 0
+
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT TOP 0 question_id, knowledgeTag, assessmentItemID, strategy
+            INTO #assessment_updates
+            FROM {ASSESSMENT_MAP_TABLE}
+        """)
+
+        cursor.fast_executemany = True
+        cursor.executemany(
+            "INSERT INTO #assessment_updates (question_id, knowledgeTag, assessmentItemID, strategy) VALUES (?, ?, ?, ?)",
+            [(question_id, knowledge_tag, str(item_id), strategy) for question_id, knowledge_tag, item_id in assignments]
+        )
+
+        cursor.execute(f"""
+            MERGE {ASSESSMENT_MAP_TABLE} AS t
+            USING #assessment_updates AS s ON t.question_id = s.question_id
+            WHEN MATCHED AND (t.knowledgeTag <> s.knowledgeTag OR t.assessmentItemID <> s.assessmentItemID OR t.strategy <> s.strategy) THEN
+                UPDATE SET knowledgeTag = s.knowledgeTag, assessmentItemID = s.assessmentItemID,
+                           strategy = s.strategy, assigned_at = SYSUTCDATETIME()
+            WHEN NOT MATCHED THEN
+                INSERT (question_id, knowledgeTag, assessmentItemID, strategy)
+                VALUES (s.question_id, s.knowledgeTag, s.assessmentItemID, s.strategy);
+        """)
+        affected_rows = cursor.rowcount
+
+        conn.commit()
+        conn.close()
+
+        return affected_rows
+
+    except Exception as e:
+        logging.error(f"할당 결과 저장 실패: {str(e)}")
+        if 'conn' in locals() and conn:
+            conn.rollback()
+            conn.close()
+        return 0
+
+
 def check_concept_completion():
     """concept_by_ai 매핑 완료 상태 체크"""
     try:
@@ -359,46 +515,24 @@ def check_knowledge_tag_completion():
 
 
 def update_knowledge_tag_batch(concept_tag_pairs):
-    """배치로 knowledgeTag 업데이트"""
-    try:
-        conn = get_sql_connection()
-        if not conn:
-            logging.error("DB 연결 실패")
-            return 0
-
-        cursor = conn.cursor()
-
-        # CASE WHEN 구문 생성
-        case_statements = []
-        concept_list = []
-
-        for concept_name, knowledge_tag in concept_tag_pairs:
-            escaped_concept = concept_name.replace("'", "''")
-            case_statements.append(f"WHEN N'{escaped_concept}' THEN {knowledge_tag}")
-            concept_list.append(f"N'{escaped_concept}'")
-
-        update_query = f"""
-            UPDATE questions_dim
-            SET knowledgeTag = CASE concept_by_ai COLLATE Korean_Wansung_CI_AS
-                {chr(10).join(case_statements)}
-            END
-            WHERE concept_by_ai COLLATE Korean_Wansung_CI_AS IN ({', '.join(concept_list)})
+    """knowledgeTag 일괄 업데이트 (스테이징 테이블 + 조인 UPDATE)"""
+    return _bulk_update_pairs(
+        concept_tag_pairs,
         """
-
-        cursor.execute(update_query)
-        affected_rows = cursor.rowcount
-
-        conn.commit()
-        conn.close()
-
-        return affected_rows
-
-    except Exception as e:
-        logging.error(f"배치 knowledgeTag 업데이트 실패: {str(e)}")
-        if 'conn' in locals():
-            conn.rollback()
-            conn.close()
-        return 0
+            SELECT TOP 0 concept_by_ai AS concept_name, knowledgeTag AS knowledge_tag
+            INTO #knowledge_tag_updates
+            FROM questions_dim
+        """,
+        "INSERT INTO #knowledge_tag_updates (concept_name, knowledge_tag) VALUES (?, ?)",
+        """
+            UPDATE q
+            SET q.knowledgeTag = s.knowledge_tag
+            FROM questions_dim q
+            INNER JOIN #knowledge_tag_updates s ON q.concept_by_ai = s.concept_name
+            WHERE q.knowledgeTag IS NULL OR q.knowledgeTag <> s.knowledge_tag
+        """,
+        "knowledgeTag"
+    )
 
 
 def verify_update(topic_name):
@@ -409,14 +543,12 @@ def verify_update(topic_name):
             return None
 
         cursor = conn.cursor()
-        escaped_topic = topic_name.replace("'", "''")
-
-        cursor.execute(f"""
+        cursor.execute("""
             SELECT concept_by_ai, COUNT(*) as cnt
             FROM questions_dim
-            WHERE question_topic_name = N'{escaped_topic}' COLLATE Korean_Wansung_CI_AS
+            WHERE question_topic_name = ?
             GROUP BY concept_by_ai
-        """)
+        """, topic_name)
 
         results = cursor.fetchall()
         conn.close()
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+topic_name → concept_name 매핑 결정 메모 (로컬 SQLite)
+키에 concept_names 목록 해시를 포함해 개념 목록이 바뀌면 기존 결정은 자동으로 사용되지 않음
+"""
+import os
+import json
+import sqlite3
+import logging
+import threading
+from hashlib import sha256
+from datetime import datetime
+from modules.core.state_store import get_state_store_dir
+
+_MEMO_CACHE = {}
+_MEMO_CACHE_LOCK = threading.Lock()
+
+
+def get_memo_path():
+    """메모 DB 파일 경로 (MAPPING_MEMO_PATH 환경변수, 기본값: 상태 저장 디렉터리)"""
+    return os.environ.get("MAPPING_MEMO_PATH") or os.path.join(get_state_store_dir(), "mapping_memo.sqlite3")
+
+
+def compute_catalog_hash(concept_names):
+    """concept_names 목록 해시 (순서 무관)"""
+    return sha256("\n".join(sorted(set(concept_names))).encode('utf-8')).hexdigest()[:16]
+
+
+class MappingMemo:
+    """개념 목록 해시별 topic_name → concept_name 결정 저장소 (스레드 안전)"""
+
+    def __init__(self, concept_names, path=None):
+        self.catalog_hash = compute_catalog_hash(concept_names)
+        self.path = path or get_memo_path()
+        self._hit_topics = set()
+        self._looked_up_topics = set()
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS mapping_memo (
+                catalog_hash TEXT NOT NULL,
+                topic_name TEXT NOT NULL,
+                concept_name TEXT NOT NULL,
+                source TEXT,
+                updated_at TEXT,
+                PRIMARY KEY (catalog_hash, topic_name)
+            )
+        """)
+        self._conn.commit()
+
+    def get_many(self, topic_names):
+        """저장된 결정 조회 ({topic_name: concept_name}, 없는 topic은 제외)"""
+        topic_names = list(dict.fromkeys(topic_names))
+        found = {}
+        with self._lock:
+            # SQLite 파라미터 개수 제한을 피하기 위해 나눠서 조회
+            for i in range(0, len(topic_names), 500):
+                chunk = topic_names[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT topic_name, concept_name FROM mapping_memo "
+                    f"WHERE catalog_hash = ? AND topic_name IN ({', '.join('?' * len(chunk))})",
+                    [self.catalog_hash] + chunk
+                ).fetchall()
+                found.update(rows)
+            # 같은 topic을 여러 번 조회해도 적중률은 topic 단위로 집계
+            self._looked_up_topics.update(topic_names)
+            self._hit_topics.update(found)
+        return found
+
+    def get(self, topic_name):
+        """단일 topic 결정 조회 (없으면 None)"""
+        return self.get_many([topic_name]).get(topic_name)
+
+    def put_many(self, topic_concept_pairs, source="ai"):
+        """결정 저장 (같은 topic은 덮어쓰기)"""
+        now = datetime.now().isoformat(timespec='seconds')
+        rows = [(self.catalog_hash, topic, concept, source, now) for topic, concept in topic_concept_pairs if topic and concept]
+        if not rows:
+            return 0
+        try:
+            with self._lock:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO mapping_memo (catalog_hash, topic_name, concept_name, source, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    rows
+                )
+                self._conn.commit()
+            return len(rows)
+        except Exception as e:
+            logging.error(f"매핑 메모 저장 실패: {str(e)}")
+            return 0
+
+    def put(self, topic_name, concept_name, source="ai"):
+        """단일 결정 저장"""
+        return self.put_many([(topic_name, concept_name)], source) > 0
+
+    @property
+    def hits(self):
+        """메모로 결정된 topic 수"""
+        return len(self._hit_topics)
+
+    @property
+    def lookups(self):
+        """조회한 topic 수"""
+        return len(self._looked_up_topics)
+
+    def hit_rate(self):
+        """topic 단위 적중률 (조회가 없으면 0.0)"""
+        return self.hits / self.lookups if self.lookups else 0.0
+
+    def format_stats(self):
+        """적중률 요약 문자열"""
+        return f"메모 적중 {self.hits}/{self.lookups}개 주제 ({self.hit_rate() * 100:.1f}%)"
+
+    def export_jsonl(self, path, all_catalogs=False):
+        """결정을 JSONL로 내보내기 (기본: 현재 개념 목록 해시만), 내보낸 건수 반환"""
+        query = "SELECT catalog_hash, topic_name, concept_name, source, updated_at FROM mapping_memo"
+        params = []
+        if not all_catalogs:
+            query += " WHERE catalog_hash = ?"
+            params.append(self.catalog_hash)
+
+        count = 0
+        with self._lock, open(path, 'w', encoding='utf-8') as f:
+            for catalog_hash, topic, concept, source, updated_at in self._conn.execute(query, params):
+                f.write(json.dumps({
+                    'catalog_hash': catalog_hash,
+                    'topic_name': topic,
+                    'concept_name': concept,
+                    'source': source,
+                    'updated_at': updated_at
+                }, ensure_ascii=False) + "\n")
+                count += 1
+        return count
+
+    def import_jsonl(self, path):
+        """JSONL 결정 가져오기 (각 레코드의 catalog_hash 그대로 저장), 가져온 건수 반환"""
+        rows = []
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                    rows.append((
+                        record.get('catalog_hash') or self.catalog_hash,
+                        record['topic_name'],
+                        record['concept_name'],
+                        record.get('source') or 'import',
+                        record.get('updated_at') or datetime.now().isoformat(timespec='seconds')
+                    ))
+                except (ValueError, KeyError) as e:
+                    logging.warning(f"매핑 메모 레코드 무시: {str(e)}")
+
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO mapping_memo (catalog_hash, topic_name, concept_name, source, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+        return len(rows)
+
+
+def get_mapping_memo(concept_names):
+    """개념 목록별로 1회만 생성한 메모 반환 (MAPPING_MEMO_ENABLED=false면 None)"""
+    if os.environ.get("MAPPING_MEMO_ENABLED", "true").lower() in ("false", "0", "no"):
+        return None
+
+    catalog_hash = compute_catalog_hash(concept_names)
+    with _MEMO_CACHE_LOCK:
+        memo = _MEMO_CACHE.get(catalog_hash)
+        if memo is None:
+            try:
+                memo = MappingMemo(concept_names)
+            except Exception as e:
+                logging.error(f"매핑 메모 초기화 실패: {str(e)}")
+                return None
+            _MEMO_CACHE.clear()
+            _MEMO_CACHE[catalog_hash] = memo
+    return memo
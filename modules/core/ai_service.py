@@ -1,178 +1,152 @@
 import os
+import re
 import json
 import logging
-from openai import AzureOpenAI
+from .llm_backends import get_backend_pool
+from .llm_gateway import chat_completion, hedged_chat_completion
+from .llm_routes import resolve_route, record_route_validation
+from .validation import validate_question_format
+from .tokenizer import count_tokens
+from .metrics import increment
+from .structured_output import (
+    QUESTION_SCHEMA, build_response_format, load_structured_json, restore_latex_escapes, record_parse_path
+)
+from .utils import env_int
 
 
 def get_openai_client():
-    """Azure OpenAI 클라이언트 초기화"""
-    return AzureOpenAI(
-        api_key=os.environ["AOAI_KEY"],
-        api_version="2024-02-01",
-        azure_endpoint=os.environ["AOAI_ENDPOINT"]
-    )
+    """Azure OpenAI 클라이언트 (하위 호환용: 실제 호출은 LLM 게이트웨이가 백엔드 풀에서 선택)"""
+    return get_backend_pool().backends[0].client
 
 
 def test_ai_connection():
     """AI 연결 테스트"""
     try:
         client = get_openai_client()
-        response = client.chat.completions.create(
-            model=os.environ["AOAI_DEPLOYMENT"],
-            messages=[
-                {"role": "user", "content": "Hello, this is a connection test."}
-            ],
-            max_tokens=10
+        response = chat_completion(
+            client,
+            [{"role": "user", "content": "Hello, this is a connection test."}],
+            task="connection_test",
+            route=resolve_route("connection_test")
         )
         return True, "Connection successful"
     except Exception as e:
         return False, str(e)
 
 
-def create_question_prompt(grade, term, topic_name, question_type, difficulty, existing_questions, generated_problems=[], include_svg=False):
-    """문제 생성용 프롬프트 작성"""
-    from .utils import get_grade_description
-
-    # 도형/그래프 관련 주제 확인
-    requires_svg = any(keyword in topic_name.lower() for keyword in [
+def topic_requires_svg(topic_name):
+    """도형/그래프 관련 주제 여부 (SVG 필요)"""
+    return any(keyword in topic_name.lower() for keyword in [
         '도형', '삼각형', '사각형', '원', '다각형', '기하',
         '그래프', '좌표', '직선', '곡선',
         '통계', '차트', '막대', '원그래프', '히스토그램',
         '각', '넓이', '부피', '길이', '거리'
     ])
 
-    if requires_svg:
-        svg_instructions = """
-
-        🔴 **SVG 필수 생성**: 이 주제는 도형/그래프 관련이므로 SVG가 반드시 필요합니다!
-
-        **문제-그림 완벽 일치 원칙**:
-        1. 문제에서 언급하는 모든 점, 변, 각을 SVG에 정확히 표시
-        2. 문제에서 사용하는 기호/이름을 SVG에 동일하게 라벨링
-        3. 문제에서 주어진 수치나 각도를 SVG에 반드시 표시
-        4. 문제 상황과 100% 일치하는 도형/그래프 그리기
-
-        **구체적 지침**:
-        - 점: 문제에서 "점 A, B, C"라고 하면 SVG에서 정확히 A, B, C로 라벨링
-        - 각: 문제에서 "∠A, ∠B"라고 하면 SVG에서 해당 각에 각도 표시선과 라벨
-        - 변: 문제에서 "변 AB"라고 하면 SVG에서 AB 변을 명확히 표시
-        - 수치: 문제에서 "5cm, 60°"라고 하면 SVG에서 해당 위치에 수치 표시
-        - 비례: 문제의 수치 비율을 SVG에서 시각적으로 맞추기
-
-        다음 유형에 맞는 SVG를 생성하세요:
-        - 도형: 삼각형, 사각형, 원 등의 정확한 도형 그리기
-        - 그래프: 좌표평면, 함수 그래프, 직선/곡선
-        - 통계: 막대그래프, 원그래프, 히스토그램
-        - 기하: 각도, 길이, 넓이 표시
-
-        SVG 사양 (태블릿 화면 최적화):
-        - 뷰박스 사용: viewBox='0 0 400 300' width='100%' height='auto'
-        - 반응형 디자인: 태블릿 화면에 맞게 자동 크기 조절
-        - 스타일: 검은색 선(stroke='#000' stroke-width='2'), 회색 채우기(fill='#f0f0f0')
-        - 텍스트: font-family='Arial' font-size='16' (태블릿용 크기)
-        - 격자, 축, 수치, 라벨 명확히 표시
-        - 터치 친화적 요소 크기 (최소 44px 터치 영역)
-
-        🔴 **중요**: SVG 속성값에는 반드시 단일 인용부호(')를 사용하세요. 이중 인용부호(")는 JSON 파싱 오류를 일으킵니다!
-
-        **각도 표현 중요 규칙**:
-        - 각도를 시각적으로 그리지 마세요 (호나 부채꼴 금지)
-        - 대신 각의 꼭짓점과 두 변만 그리고 알파벳으로 표시
-        - 예: ∠ABC는 점 A, B, C만 표시하고 "∠ABC" 텍스트 라벨 사용
-        - 각도의 크기나 모양을 추측해서 그리지 말고 기하학적 관계만 표현
-        - 정확도를 위해 각도 표시는 텍스트 라벨로만 처리
-
-        **절대 금지**: svg_code를 null로 설정하지 마세요!
-        **필수**: 문제 내용과 완벽히 일치하는 그림만 생성하세요!
-        """
-    else:
-        svg_instructions = """
-
-        SVG 생성 판단:
-        - 순수 계산/대수 문제: svg_code를 null로 설정
-        - 시각적 요소가 조금이라도 있으면: SVG 생성
-
-        SVG 사양 (필요한 경우, 태블릿 최적화):
-        - 뷰박스 사용: viewBox='0 0 300 200' width='100%' height='auto'
-        - 스타일: 검은색 선(stroke='#000' stroke-width='2'), 회색 채우기(fill='#f0f0f0')
-        - 텍스트: font-family='Arial' font-size='14' (태블릿용)
-
-        🔴 **중요**: SVG 속성값에는 반드시 단일 인용부호(')를 사용하세요!
-
-        **각도 표현**: 시각적 각도 그리기 금지, 알파벳 라벨만 사용
-        """
-
-    # 항상 SVG 포함 가능한 응답 형식 사용
-    response_format = f"""
-    응답 형식 (JSON):
-    {{
-        "question_text": "문제 내용 (LaTeX 수식 포함)",
-        "question_type": "{question_type}",
-        "choices": ["① 선택지1", "② 선택지2", "③ 선택지3", "④ 선택지4", "⑤ 선택지5"] (선택형인 경우만),
-        "correct_answer": "정답 (①~⑤ 또는 숫자/식)",
-        "answer_explanation": "상세한 풀이 과정 (LaTeX 수식 포함)",
-        "svg_code": "<svg>...</svg> 또는 null (문제 풀이에 시각 자료가 필요한 경우만)"
-    }}
-
-    **중요한 JSON 형식 주의사항:**
-    - LaTeX 수식에서 백슬래시(\\)는 JSON에서 이중 백슬래시(\\\\)로 작성하세요
-    - 예: "\\\\(" 대신 "\\\\\\\\(" 사용, "\\\\frac" 대신 "\\\\\\\\frac" 사용
-    - JSON 문자열 내의 모든 백슬래시는 두 번씩 작성하세요
-    - SVG 코드도 마찬가지로 백슬래시를 이중으로 이스케이프하세요
-    """
 
-    # 난이도별 문장 수 요구사항
-    sentence_requirements = {
-        '하': "1~2문장의 간단한 문제",
-        '중': "3문장 정도의 적당한 문제",
-        '상': "4문장 정도의 복합적인 문제"
-    }
+# SVG 지침 (도형/그래프 주제)
+SVG_REQUIRED_RULES = """SVG 필수: 도형/그래프 주제이므로 svg_code를 반드시 생성 (null 금지)
+- 문제에 나온 점·변·각·수치를 같은 이름/값으로 모두 표시하고 문제 상황과 정확히 일치하게 그리기
+- 유형: 도형(삼각형·사각형·원), 그래프(좌표평면·함수·직선/곡선), 통계(막대·원그래프·히스토그램), 기하(각도·길이·넓이)
+- 사양: viewBox='0 0 400 300' width='100%' height='auto', stroke='#000' stroke-width='2', fill='#f0f0f0', font-family='Arial' font-size='16', 격자·축·라벨 명확히
+- 각도는 호/부채꼴로 그리지 말고 꼭짓점과 두 변, 텍스트 라벨(예: ∠ABC)로만 표시"""
+
+# SVG 지침 (그 외 주제)
+SVG_OPTIONAL_RULES = """SVG 판단: 순수 계산/대수 문제는 svg_code를 null, 시각 요소가 있으면 생성
+- 사양: viewBox='0 0 300 200' width='100%' height='auto', stroke='#000' stroke-width='2', fill='#f0f0f0', font-family='Arial' font-size='14'
+- 각도는 그리지 말고 알파벳 라벨로만 표시"""
+
+# 응답 JSON 형식과 이스케이프 규칙
+QUESTION_JSON_FORMAT = """응답 형식 (JSON만):
+{"question_text": "문제 (LaTeX 포함)", "question_type": "요청한 문제 유형", "choices": ["① ...", "② ...", "③ ...", "④ ...", "⑤ ..."] (선택형만), "correct_answer": "정답 (①~⑤ 또는 숫자/식)", "answer_explanation": "풀이 (LaTeX 포함)", "svg_code": "<svg>...</svg> 또는 null"}
+JSON 주의: 문자열 안의 백슬래시는 모두 두 번 작성 (예: "\\\\frac", "\\\\("), SVG 속성값은 단일 인용부호(')만 사용 (이중 인용부호는 JSON 오류)"""
+
+# 난이도별 문장 수 요구사항
+SENTENCE_REQUIREMENTS = {
+    '하': "1~2문장의 간단한 문제",
+    '중': "3문장 정도의 적당한 문제",
+    '상': "4문장 정도의 복합적인 문제"
+}
+
+
+# 문제 생성 사용자 프롬프트(요청별 부분) 최대 토큰 수, 중복 방지 목록 최대 개수
+PROMPT_TOKEN_BUDGET = env_int("LLM_PROMPT_TOKEN_BUDGET", 800)
+PROMPT_MAX_DEDUP = env_int("LLM_PROMPT_MAX_DEDUP", 20)
+
 
-    sentence_req = sentence_requirements.get(difficulty, "적당한 길이의 문제")
+def _build_question_system_prompt(requires_svg):
+    """문제 생성 고정 지침 (요청마다 바뀌는 값 없음 → 프롬프트 캐시 대상 접두부)"""
+    return f"""당신은 한국 중학교 수학 문제 출제 전문가입니다. 교육부 교육과정에 맞는 고품질 문제를 JSON 형식으로 생성해주세요.
 
-    return f"""
-    다음 조건에 맞는 중학교 수학 문제를 생성해주세요:
-    - 학년: {grade} ({get_grade_description(grade)})
-    - 학기: {term}학기
-    - 주제: {topic_name}
-    - 문제 유형: {question_type}
-    - 난이도: {difficulty} → {sentence_req}
+제약조건: 명확한 정답이 있는 문제만, 선택형은 5개 선택지(①~⑤), 단답형은 숫자나 간단한 식으로 답하는 문제, LaTeX 수식 권장
+문제 길이: 하 → {SENTENCE_REQUIREMENTS['하']}, 중 → {SENTENCE_REQUIREMENTS['중']}, 상 → {SENTENCE_REQUIREMENTS['상']}
+기존 문제 예시는 스타일만 참고하고, 이미 생성된 문제와는 계수나 상수를 바꾸어 다른 문제로 생성
 
-    제약조건:
-    - 명확한 정답이 있는 문제만 생성
-    - 선택형의 경우 5개 선택지 (①, ②, ③, ④, ⑤)
-    - 단답형의 경우 숫자나 간단한 식으로 답할 수 있는 문제
-    - LaTeX 수식 사용 권장
-    - **문제 길이**: {sentence_req} (난이도에 맞게 조절){svg_instructions}
+{SVG_REQUIRED_RULES if requires_svg else SVG_OPTIONAL_RULES}
 
-    기존 문제 스타일 참고:
-    {existing_questions}
+{QUESTION_JSON_FORMAT}"""
 
-    이미 생성된 문제들 (중복 피하기):
-    {chr(10).join([f"- {p}" for p in generated_problems]) if generated_problems else "없음"}
 
-    **중요**: 위에 나열된 문제들과 다른 새로운 문제를 생성하세요. 계수나 상수를 바꾸어 다양한 문제를 만드세요.
+# SVG 필요 여부별 시스템 프롬프트 (import 시 1회 생성, 호출 간 바이트 단위로 동일)
+QUESTION_SYSTEM_PROMPTS = {requires_svg: _build_question_system_prompt(requires_svg) for requires_svg in (False, True)}
 
-    {response_format}
+
+def get_question_system_prompt(topic_name):
+    """주제에 맞는 문제 생성 시스템 프롬프트"""
+    return QUESTION_SYSTEM_PROMPTS[topic_requires_svg(topic_name)]
+
+
+def _render_question_prompt(grade, term, topic_name, question_type, difficulty, exemplar_lines, dedup_lines):
+    from .utils import get_grade_description
+
+    sentence_req = SENTENCE_REQUIREMENTS.get(difficulty, "적당한 길이의 문제")
+    return f"""중학교 수학 문제 1개 생성
+- 학년: {grade} ({get_grade_description(grade)}), {term}학기
+- 주제: {topic_name}
+- 문제 유형: {question_type}
+- 난이도: {difficulty} → {sentence_req}
+
+기존 문제 스타일 참고:
+{chr(10).join(exemplar_lines) if exemplar_lines else "없음"}
+
+이미 생성된 문제들 (중복 피하기):
+{chr(10).join(f"- {p}" for p in dedup_lines) if dedup_lines else "없음"}
+"""
+
+
+def create_question_prompt(grade, term, topic_name, question_type, difficulty, existing_questions, generated_problems=[], include_svg=False):
     """
+    문제 생성용 사용자 프롬프트 작성 (고정 지침은 get_question_system_prompt, 이 함수는 요청별 값만)
 
+    LLM_PROMPT_TOKEN_BUDGET을 넘으면 기존 문제 예시(뒤에서부터), 중복 방지 목록(오래된 것부터) 순으로 줄임
+    """
+    exemplar_lines = [line for line in str(existing_questions or '').splitlines() if line.strip()]
+    dedup_lines = list(generated_problems[-PROMPT_MAX_DEDUP:]) if PROMPT_MAX_DEDUP > 0 else []
+    trimmed = len(generated_problems) - len(dedup_lines)
+
+    while True:
+        prompt = _render_question_prompt(grade, term, topic_name, question_type, difficulty, exemplar_lines, dedup_lines)
+        if count_tokens(prompt) <= PROMPT_TOKEN_BUDGET:
+            break
+        if len(exemplar_lines) > 1:
+            exemplar_lines.pop()
+        elif dedup_lines:
+            dedup_lines.pop(0)
+        elif exemplar_lines:
+            exemplar_lines.pop()
+        else:
+            break
+        trimmed += 1
 
-def generate_question_with_ai(client, grade, term, topic_name, question_type, difficulty, existing_questions, generated_problems=[], include_svg=False):
-    """OpenAI를 사용하여 문제 생성"""
-    try:
-        prompt = create_question_prompt(grade, term, topic_name, question_type, difficulty, existing_questions, generated_problems, include_svg)
+    if trimmed:
+        increment("llm.question.prompt_trimmed_items", trimmed)
+    return prompt
 
-        response = client.chat.completions.create(
-            model=os.environ["AOAI_DEPLOYMENT"],
-            messages=[
-                {"role": "system", "content": "당신은 한국 중학교 수학 문제 출제 전문가입니다. 교육부 교육과정에 맞는 고품질 문제를 JSON 형식으로 생성해주세요."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=1500
-        )
 
-        content = response.choices[0].message.content.strip()
+def parse_question_response(content):
+    """AI 응답에서 문제 JSON 추출 및 파싱 (LaTeX/SVG 보정 포함, 실패 시 None)"""
+    try:
+        content = (content or "").strip()
 
         # JSON 추출
         if "```json" in content:
@@ -304,6 +278,102 @@ def generate_question_with_ai(client, grade, term, topic_name, question_type, di
                     logging.error("All JSON parsing attempts failed")
                     return None
 
+    except Exception as e:
+        logging.error(f"AI response parsing error: {str(e)}")
+        return None
+
+
+# 보정 파서가 LaTeX 명령/괄호 앞에 두 번 넣은 백슬래시 (\\frac → \frac)
+LATEX_DOUBLED_BACKSLASH_PATTERN = re.compile(
+    r'\\\\(?=(?:frac|sqrt|text|mathrm|times|cdot|pi|alpha|beta|gamma|theta|phi|lambda|delta|omega|sigma'
+    r'|mu|nu|tau|left|right|big|Big|bigg|Bigg)\b|[()\[\]{}])'
+)
+
+# SVG의 큰따옴표 속성 (width="100" → width='100')
+SVG_DOUBLE_QUOTED_ATTR_PATTERN = re.compile(r'([a-zA-Z-]+)="([^"]*)"')
+
+
+def normalize_question_data(question_data):
+    """
+    파싱 경로와 관계없이 같은 형태로 정리
+
+    svg_code → svg_content, LaTeX 명령은 백슬래시 1개, SVG 속성은 작은따옴표, 선택지가 없으면 choices 키 제거
+    """
+    question_data = restore_latex_escapes(question_data)
+    if 'svg_code' in question_data:
+        question_data['svg_content'] = question_data.pop('svg_code')
+    if question_data.get('choices') is None:
+        question_data.pop('choices', None)
+
+    for key, value in question_data.items():
+        if isinstance(value, str):
+            question_data[key] = LATEX_DOUBLED_BACKSLASH_PATTERN.sub(r'\\', value)
+        elif isinstance(value, list):
+            question_data[key] = [
+                LATEX_DOUBLED_BACKSLASH_PATTERN.sub(r'\\', item) if isinstance(item, str) else item
+                for item in value
+            ]
+
+    if isinstance(question_data.get('svg_content'), str):
+        question_data['svg_content'] = SVG_DOUBLE_QUOTED_ATTR_PATTERN.sub(r"\1='\2'", question_data['svg_content'])
+    return question_data
+
+
+def parse_question_output(content):
+    """문제 응답 파싱 (구조화 출력이면 그대로 JSON으로 읽고, 아니면 기존 보정 파서 사용, 두 경로 모두 같은 형태로 정리, 실패 시 None)"""
+    question_data = load_structured_json(content)
+    if isinstance(question_data, dict):
+        record_parse_path("question", "direct")
+        return normalize_question_data(question_data)
+
+    question_data = parse_question_response(content)
+    record_parse_path("question", "repaired" if question_data else "failed")
+    return normalize_question_data(question_data) if isinstance(question_data, dict) else None
+
+
+def generate_question_with_ai(client, grade, term, topic_name, question_type, difficulty, existing_questions, generated_problems=[], include_svg=False, hedge=False):
+    """OpenAI를 사용하여 문제 생성 (hedge=True면 응답이 늦을 때 중복 요청을 보내 먼저 검증을 통과한 결과 사용)"""
+    try:
+        prompt = create_question_prompt(grade, term, topic_name, question_type, difficulty, existing_questions, generated_problems, include_svg)
+        # 고정 지침(캐시 가능한 접두부)을 먼저, 요청별 값은 마지막에
+        messages = [
+            {"role": "system", "content": get_question_system_prompt(topic_name)},
+            {"role": "user", "content": prompt}
+        ]
+
+        # 난이도/SVG 필요 여부에 따라 배포와 생성 파라미터 선택
+        route = resolve_route("question", difficulty, include_svg or topic_requires_svg(topic_name))
+
+        # 문제 JSON 스키마로 구조화 출력 요청 (미지원 배포는 게이트웨이가 낮춰 요청, 파싱은 parse_question_output이 판단)
+        response_format = build_response_format("math_question", QUESTION_SCHEMA)
+        format_kwargs = {"response_format": response_format} if response_format else {}
+
+        def parse_and_validate(response):
+            question_data = parse_question_output(response.choices[0].message.content)
+            return question_data if question_data and validate_question_format(question_data, question_type) else None
+
+        if hedge:
+            return hedged_chat_completion(
+                client,
+                messages,
+                max_tokens=None,
+                validator=parse_and_validate,
+                task="question",
+                route=route,
+                **format_kwargs
+            )
+
+        response = chat_completion(
+            client,
+            messages,
+            task="question",
+            route=route,
+            **format_kwargs
+        )
+        question_data = parse_question_output(response.choices[0].message.content)
+        record_route_validation(route, bool(question_data and validate_question_format(question_data, question_type)))
+        return question_data
+
     except Exception as e:
         logging.error(f"AI question generation error: {str(e)}")
         return None
\ No newline at end of file
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+동시 실행 유틸리티
+LLM 호출처럼 대기 시간이 긴 작업을 스레드 풀에서 병렬 처리
+"""
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .utils import env_int
+
+
+def get_adaptive_max_concurrency(default=16):
+    """LLM 동시 호출 수 상한 (LLM_AIMD_MAX 환경변수, 적응형 제한기가 이 범위 안에서 조절)"""
+    return max(1, env_int("LLM_AIMD_MAX", default))
+
+
+def get_max_workers(default=None):
+    """LLM 병렬 작업 수 (LLM_MAX_WORKERS 환경변수, 없으면 적응형 제한기 상한까지 스레드를 띄우고 실제 동시 호출은 제한기가 결정)"""
+    default = default or get_adaptive_max_concurrency()
+    return max(1, env_int("LLM_MAX_WORKERS", default))
+
+
+def run_concurrently(func, items, max_workers=None):
+    """items 각각에 func를 병렬 적용하고 입력 순서대로 결과 반환 (예외 발생 항목은 None)"""
+    items = list(items)
+    if not items:
+        return []
+
+    max_workers = min(max_workers or get_max_workers(), len(items))
+
+    def safe_call(item):
+        try:
+            return func(item)
+        except Exception as e:
+            logging.error(f"병렬 작업 실패: {str(e)}")
+            return None
+
+    if max_workers <= 1:
+        return [safe_call(item) for item in items]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(safe_call, items))
+
+
+class RateLimiter:
+    """분당 요청 수 제한 (요청 시작 간격을 균등하게 유지, 스레드 안전)"""
+
+    def __init__(self, requests_per_minute):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute and requests_per_minute > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_time = 0.0
+
+    def acquire(self):
+        """다음 요청 가능 시점까지 대기"""
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_time)
+            self._next_time = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+class ProgressTracker:
+    """진행률, 처리량, 남은 시간(ETA) 계산 (스레드 안전)"""
+
+    def __init__(self, total):
+        self.total = total
+        self.done = 0
+        self.started_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def update(self, count=1):
+        """처리 건수 반영 후 진행 상황 문자열 반환"""
+        with self._lock:
+            self.done += count
+            return self.format()
+
+    def format(self):
+        """현재 진행 상황 문자열"""
+        elapsed = max(time.monotonic() - self.started_at, 1e-6)
+        throughput = self.done / elapsed
+        remaining = max(self.total - self.done, 0)
+        eta_seconds = int(remaining / throughput) if throughput > 0 else 0
+        percent = (self.done / self.total * 100) if self.total else 100.0
+        return (f"{percent:.1f}% ({self.done}/{self.total}) | "
+                f"처리량 {throughput:.2f}건/초 | ETA {eta_seconds // 60:d}분 {eta_seconds % 60:02d}초")
@@ -24,6 +24,42 @@ def get_sql_connection():
         return None
 
 
+def get_fetch_arraysize(default=5000):
+    """fetchmany 1회당 행 수 (DB_FETCH_ARRAYSIZE 환경변수)"""
+    try:
+        return max(1, int(os.environ.get("DB_FETCH_ARRAYSIZE", default)))
+    except ValueError:
+        return default
+
+
+def iter_query_chunks(query, params=None, arraysize=None):
+    """
+    쿼리 결과를 fetchmany 청크(행 목록) 단위로 반환하는 제너레이터 (소진/중단 시 연결 종료)
+
+    연결 실패나 조회 도중 오류는 예외로 전달 (중간에 끊긴 결과를 전체 결과로 오인하지 않도록)
+    """
+    arraysize = arraysize or get_fetch_arraysize()
+    conn = get_sql_connection()
+    if not conn:
+        raise ConnectionError("DB 연결 실패")
+
+    try:
+        cursor = conn.cursor()
+        cursor.arraysize = arraysize
+        if params:
+            cursor.execute(query, params)
+        else:
+            cursor.execute(query)
+
+        while True:
+            rows = cursor.fetchmany(arraysize)
+            if not rows:
+                break
+            yield rows
+    finally:
+        conn.close()
+
+
 def get_question_data(mode, topic_name=None):
     """SQL에서 문제 관련 데이터 가져오기 - 통합 함수
 
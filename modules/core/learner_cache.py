@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+학습자 요구사항 캐시
+vw_personal_item_enriched의 학습자별 행을 디코딩된 상태로 보관하고,
+뷰의 데이터 버전(watermark)이 바뀌면 전체 캐시를 무효화
+"""
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from .database import get_sql_connection
+
+# learnerID → 디코딩된 요구사항 행 리스트 (LRU 순서)
+LEARNER_REQUIREMENTS_CACHE = OrderedDict()
+
+# 마지막으로 확인한 뷰 watermark와 확인 시각
+_WATERMARK_STATE = {'value': None, 'checked_at': 0.0}
+
+_CACHE_LOCK = threading.RLock()
+
+# 요구사항 조회 컬럼 (두 서비스가 공통으로 사용하는 원본 행 형태)
+REQUIREMENT_COLUMNS = """
+    learnerID,
+    assessmentItemID,
+    knowledgeTag,
+    grade,
+    term,
+    concept_name,
+    chapter_name,
+    difficulty_band,
+    recommended_level,
+    is_correct
+"""
+
+# 뷰 데이터 버전 확인 쿼리 (LEARNER_VIEW_WATERMARK_SQL 환경변수로 교체 가능)
+# 캐시하는 모든 컬럼을 체크섬에 포함해야 개념명/난이도/정답 여부 등의 변경도 감지
+DEFAULT_WATERMARK_SQL = f"""
+    SELECT COUNT_BIG(*), CHECKSUM_AGG(BINARY_CHECKSUM({REQUIREMENT_COLUMNS}))
+    FROM gold.vw_personal_item_enriched
+"""
+
+
+def safe_decode(value):
+    """안전한 문자열 디코딩"""
+    if value is None:
+        return None
+    if isinstance(value, bytes):
+        try:
+            return value.decode('utf-8')
+        except UnicodeDecodeError:
+            try:
+                return value.decode('cp949')
+            except UnicodeDecodeError:
+                return value.decode('utf-8', errors='ignore')
+    return str(value)
+
+
+def decode_requirement_row(row):
+    """DB 행을 디코딩된 요구사항 딕셔너리로 변환 (캐시 저장 형태)"""
+    return {
+        'learner_id': row[0],
+        'assessment_item_id': row[1],
+        'knowledge_tag': safe_decode(row[2]),
+        'grade': row[3],
+        'term': row[4],
+        'concept_name': safe_decode(row[5]),
+        'chapter_name': safe_decode(row[6]),
+        'difficulty_band': safe_decode(row[7]),
+        'recommended_level': row[8],
+        'is_correct': row[9]
+    }
+
+
+def _get_watermark_interval():
+    """watermark 재확인 주기 (초)"""
+    try:
+        return float(os.environ.get("LEARNER_CACHE_WATERMARK_INTERVAL", "60"))
+    except ValueError:
+        return 60.0
+
+
+def _get_max_entries():
+    """캐시 최대 학습자 수"""
+    try:
+        return int(os.environ.get("LEARNER_CACHE_MAX_ENTRIES", "5000"))
+    except ValueError:
+        return 5000
+
+
+def _fetch_watermark(cursor):
+    """뷰의 현재 데이터 버전 조회"""
+    cursor.execute(os.environ.get("LEARNER_VIEW_WATERMARK_SQL") or DEFAULT_WATERMARK_SQL)
+    row = cursor.fetchone()
+    return tuple(row) if row else None
+
+
+def _apply_watermark(watermark):
+    """새 watermark 반영 (값이 바뀌었으면 캐시 전체 무효화)"""
+    with _CACHE_LOCK:
+        if _WATERMARK_STATE['value'] is not None and watermark != _WATERMARK_STATE['value']:
+            logging.info(f"학습자 캐시 무효화: 뷰 데이터 변경 감지 ({_WATERMARK_STATE['value']} → {watermark})")
+            LEARNER_REQUIREMENTS_CACHE.clear()
+        _WATERMARK_STATE['value'] = watermark
+        _WATERMARK_STATE['checked_at'] = time.monotonic()
+
+
+def refresh_watermark_if_due(force=False):
+    """주기가 지났으면 watermark를 확인하고 변경 시 캐시 무효화 (확인 실패 시 False)"""
+    with _CACHE_LOCK:
+        elapsed = time.monotonic() - _WATERMARK_STATE['checked_at']
+        if not force and _WATERMARK_STATE['value'] is not None and elapsed < _get_watermark_interval():
+            return True
+
+    try:
+        conn = get_sql_connection()
+        if not conn:
+            return False
+
+        cursor = conn.cursor()
+        watermark = _fetch_watermark(cursor)
+        conn.close()
+
+        _apply_watermark(watermark)
+        return True
+
+    except Exception as e:
+        logging.error(f"학습자 캐시 watermark 확인 실패: {str(e)}")
+        return False
+
+
+def _store_entries(rows_by_learner):
+    """조회 결과를 캐시에 저장 (최대 크기 초과 시 오래된 항목부터 제거)"""
+    max_entries = _get_max_entries()
+    with _CACHE_LOCK:
+        for learner_id, rows in rows_by_learner.items():
+            LEARNER_REQUIREMENTS_CACHE[str(learner_id)] = rows
+            LEARNER_REQUIREMENTS_CACHE.move_to_end(str(learner_id))
+        while len(LEARNER_REQUIREMENTS_CACHE) > max_entries:
+            LEARNER_REQUIREMENTS_CACHE.popitem(last=False)
+
+
+def get_cached_learner_requirements(learner_id):
+    """
+    learnerID의 디코딩된 요구사항 행 조회 (캐시 우선, DB 오류 시 None)
+
+    watermark를 한 번도 확인하지 못했으면 캐시의 최신 여부를 알 수 없으므로 캐시를 거치지 않고 DB에서 직접 조회
+    """
+    cacheable = refresh_watermark_if_due() or _WATERMARK_STATE['value'] is not None
+
+    key = str(learner_id)
+    if cacheable:
+        with _CACHE_LOCK:
+            if key in LEARNER_REQUIREMENTS_CACHE:
+                LEARNER_REQUIREMENTS_CACHE.move_to_end(key)
+                return LEARNER_REQUIREMENTS_CACHE[key]
+
+    try:
+        conn = get_sql_connection()
+        if not conn:
+            return None
+
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT {REQUIREMENT_COLUMNS}
+            FROM gold.vw_personal_item_enriched
+            WHERE learnerID = ?
+            ORDER BY assessmentItemID
+        """, (learner_id,))
+
+        rows = [decode_requirement_row(row) for row in cursor.fetchall()]
+        conn.close()
+
+        if cacheable:
+            _store_entries({key: rows})
+        return rows
+
+    except Exception as e:
+        logging.error(f"학습자 요구사항 조회 실패: {str(e)}")
+        return None
+
+
+def warm_learner_requirements(learner_ids):
+    """여러 learnerID의 요구사항을 한 번의 조회로 캐시에 적재 ({learnerID: 행 리스트}, 실패 시 None)"""
+    learner_ids = list(dict.fromkeys(str(learner_id) for learner_id in learner_ids if learner_id is not None))
+    if not learner_ids:
+        return {}
+
+    try:
+        conn = get_sql_connection()
+        if not conn:
+            return None
+
+        cursor = conn.cursor()
+
+        # 적재와 같은 연결에서 watermark를 기록하여 이후 변경을 감지
+        watermark = _fetch_watermark(cursor)
+
+        # 뷰의 learnerID 타입 그대로 임시 테이블 생성 후 ID 일괄 적재
+        cursor.execute("""
+            SELECT TOP 0 learnerID INTO #learner_ids
+            FROM gold.vw_personal_item_enriched
+        """)
+        cursor.fast_executemany = True
+        cursor.executemany("INSERT INTO #learner_ids (learnerID) VALUES (?)", [(learner_id,) for learner_id in learner_ids])
+
+        cursor.execute(f"""
+            SELECT {REQUIREMENT_COLUMNS}
+            FROM gold.vw_personal_item_enriched
+            WHERE learnerID IN (SELECT learnerID FROM #learner_ids)
+            ORDER BY learnerID, assessmentItemID
+        """)
+
+        rows_by_learner = {learner_id: [] for learner_id in learner_ids}
+        for row in cursor.fetchall():
+            requirement = decode_requirement_row(row)
+            rows_by_learner.setdefault(str(requirement['learner_id']), []).append(requirement)
+
+        conn.close()
+
+        _apply_watermark(watermark)
+        _store_entries(rows_by_learner)
+
+        logging.info(f"학습자 캐시 워밍업: {len(learner_ids)}명, {sum(len(rows) for rows in rows_by_learner.values())}개 요구사항")
+        return rows_by_learner
+
+    except Exception as e:
+        logging.error(f"학습자 캐시 워밍업 실패: {str(e)}")
+        return None
+
+
+def invalidate_learner_cache(learner_id=None):
+    """특정 learnerID 또는 전체 캐시 무효화"""
+    with _CACHE_LOCK:
+        if learner_id is None:
+            LEARNER_REQUIREMENTS_CACHE.clear()
+        else:
+            LEARNER_REQUIREMENTS_CACHE.pop(str(learner_id), None)
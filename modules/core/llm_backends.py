@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+Azure OpenAI 백엔드 풀
+여러 (endpoint, key, deployment) 조합에 요청을 분산해 리전/배포별 할당량을 합산
+- 가중치 기준 최소 진행 중 요청 수 라우팅
+- 429/5xx가 연속되면 일정 시간 제외(ejection) 후 자동 복귀
+- 백엔드별 요청/실패/스로틀/지연/토큰 통계
+"""
+import os
+import json
+import time
+import logging
+import threading
+from openai import AzureOpenAI
+from .metrics import increment, set_gauge
+from .utils import env_int, env_float
+
+# 2024-10-21 이상이어야 usage.prompt_tokens_details(캐시 적중 토큰)를 반환
+AOAI_API_VERSION = os.environ.get("AOAI_API_VERSION", "2024-10-21")
+
+
+def load_backend_configs():
+    """
+    백엔드 설정 목록
+
+    AOAI_BACKENDS(JSON 배열)가 있으면 그 값을, 없으면 AOAI_ENDPOINT/AOAI_KEY/AOAI_DEPLOYMENT 1개를 사용
+    예: [{"name": "koreacentral", "endpoint": "https://...", "key": "...", "deployment": "gpt-4o", "weight": 2, "rpm": 300, "tpm": 50000}]
+    """
+    raw = os.environ.get("AOAI_BACKENDS", "").strip()
+    if raw:
+        configs = json.loads(raw)
+        if not isinstance(configs, list) or not configs:
+            raise ValueError("AOAI_BACKENDS는 백엔드 설정의 JSON 배열이어야 합니다.")
+        return configs
+
+    return [{
+        "name": "default",
+        "endpoint": os.environ["AOAI_ENDPOINT"],
+        "key": os.environ["AOAI_KEY"],
+        "deployment": os.environ.get("AOAI_DEPLOYMENT")
+    }]
+
+
+class LLMBackend:
+    """백엔드 1개 (클라이언트, 진행 중 요청 수, 제외 상태, 통계)"""
+
+    def __init__(self, config, index=0):
+        self.name = config.get('name') or f"backend{index + 1}"
+        self.endpoint = config['endpoint']
+        self.key = config['key']
+        # 배포 이름은 호출 전에 확정 (없으면 AOAI_DEPLOYMENT, 둘 다 없으면 설정 오류)
+        self.deployment = config.get('deployment') or os.environ.get("AOAI_DEPLOYMENT")
+        if not self.deployment:
+            raise ValueError(f"LLM 백엔드 '{self.name}'에 deployment가 없고 AOAI_DEPLOYMENT도 설정되지 않았습니다.")
+        self.weight = max(float(config.get('weight', 1) or 1), 0.01)
+        self.rpm = int(config.get('rpm', 0) or 0)
+        self.tpm = int(config.get('tpm', 0) or 0)
+        self.outstanding = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.stats = {'requests': 0, 'successes': 0, 'failures': 0, 'throttled': 0,
+                      'ejections': 0, 'latency_total': 0.0, 'tokens': 0}
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        """AzureOpenAI 클라이언트 (최초 사용 시 생성, 재시도는 LLM 게이트웨이에서 일괄 처리)"""
+        with self._client_lock:
+            if self._client is None:
+                self._client = AzureOpenAI(
+                    api_key=self.key,
+                    api_version=AOAI_API_VERSION,
+                    azure_endpoint=self.endpoint,
+                    max_retries=0
+                )
+            return self._client
+
+    def is_available(self, now):
+        return now >= self.ejected_until
+
+    def snapshot(self):
+        """통계 사본 (평균 지연 포함)"""
+        stats = dict(self.stats)
+        stats['avg_latency'] = round(stats['latency_total'] / stats['successes'], 3) if stats['successes'] else None
+        stats['latency_total'] = round(stats['latency_total'], 3)
+        stats.update({
+            'endpoint': self.endpoint,
+            'deployment': self.deployment,
+            'weight': self.weight,
+            'outstanding': self.outstanding,
+            'ejected': self.ejected_until > time.monotonic()
+        })
+        return stats
+
+
+class BackendPool:
+    """가중치 기준 최소 진행 중 요청 수로 백엔드를 고르는 풀 (스레드 안전)"""
+
+    def __init__(self, configs=None, eject_threshold=None, eject_seconds=None):
+        configs = configs if configs is not None else load_backend_configs()
+        self.backends = [LLMBackend(config, index) for index, config in enumerate(configs)]
+        self.eject_threshold = max(1, eject_threshold if eject_threshold is not None else env_int("AOAI_EJECT_THRESHOLD", 3))
+        self.eject_seconds = eject_seconds if eject_seconds is not None else env_float("AOAI_EJECT_SECONDS", 30.0)
+        self._lock = threading.Lock()
+
+    def _candidates(self, deployment):
+        """deployment가 일치하는 백엔드 (일치하는 백엔드가 없으면 전체 백엔드에 deployment 이름만 적용)"""
+        if deployment:
+            matched = [backend for backend in self.backends if backend.deployment == deployment]
+            if matched:
+                return matched
+        return self.backends
+
+    def acquire(self, deployment=None, exclude=None):
+        """
+        요청을 보낼 백엔드 선택 후 진행 중 요청 수 증가
+
+        Args:
+            deployment: 원하는 배포 이름 (같은 배포를 가진 백엔드 우선)
+            exclude: 직전에 실패한 백엔드 (다른 후보가 있으면 제외)
+
+        Returns:
+            LLMBackend (모든 후보가 제외 중이면 가장 먼저 복귀하는 백엔드)
+        """
+        with self._lock:
+            now = time.monotonic()
+            candidates = self._candidates(deployment)
+            available = [backend for backend in candidates if backend.is_available(now)]
+            if exclude is not None and len(available) > 1:
+                available = [backend for backend in available if backend is not exclude] or available
+
+            if available:
+                backend = min(available, key=lambda item: ((item.outstanding + 1) / item.weight, -item.weight))
+            else:
+                backend = min(candidates, key=lambda item: item.ejected_until)
+
+            backend.outstanding += 1
+            backend.stats['requests'] += 1
+            set_gauge(f"llm.backend.{backend.name}.outstanding", backend.outstanding)
+            return backend
+
+    def abandon(self, backend):
+        """acquire 후 요청을 보내지 못한 경우(취소, 대기 중 오류) 진행 중 요청 수만 되돌림"""
+        with self._lock:
+            backend.outstanding -= 1
+            backend.stats['requests'] -= 1
+            set_gauge(f"llm.backend.{backend.name}.outstanding", backend.outstanding)
+
+    def has_alternative(self, backend, deployment=None):
+        """backend 외에 지금 사용할 수 있는 후보가 있는지 여부"""
+        with self._lock:
+            now = time.monotonic()
+            return any(
+                candidate is not backend and candidate.is_available(now)
+                for candidate in self._candidates(deployment)
+            )
+
+    def release(self, backend, latency=None, tokens=0, error_status=None, overloaded=False, retry_after=None):
+        """
+        요청 종료 반영
+
+        Args:
+            backend: acquire로 받은 백엔드
+            latency: 성공 시 응답 시간(초)
+            tokens: 성공 시 사용 토큰 수
+            error_status: 실패 시 HTTP 상태 코드 (없으면 None)
+            overloaded: 429·5xx·연결 오류 여부 (연속 횟수가 기준 이상이면 제외)
+            retry_after: 서버가 알려준 대기 시간(초), 있으면 제외 시간으로 사용
+        """
+        with self._lock:
+            backend.outstanding -= 1
+            set_gauge(f"llm.backend.{backend.name}.outstanding", backend.outstanding)
+
+            if latency is not None:
+                backend.consecutive_failures = 0
+                backend.stats['successes'] += 1
+                backend.stats['latency_total'] += latency
+                backend.stats['tokens'] += tokens or 0
+                increment(f"llm.backend.{backend.name}.successes")
+                increment(f"llm.backend.{backend.name}.tokens", tokens or 0)
+                return
+
+            backend.stats['failures'] += 1
+            increment(f"llm.backend.{backend.name}.failures")
+            if error_status == 429:
+                backend.stats['throttled'] += 1
+                increment(f"llm.backend.{backend.name}.throttled")
+            if not overloaded:
+                return
+
+            backend.consecutive_failures += 1
+            if backend.consecutive_failures >= self.eject_threshold or retry_after:
+                cooldown = max(self.eject_seconds if backend.consecutive_failures >= self.eject_threshold else 0, retry_after or 0)
+                backend.ejected_until = max(backend.ejected_until, time.monotonic() + cooldown)
+                backend.consecutive_failures = 0
+                backend.stats['ejections'] += 1
+                increment(f"llm.backend.{backend.name}.ejections")
+                logging.warning(f"LLM 백엔드 일시 제외: {backend.name} ({cooldown:.1f}초)")
+
+    def get_stats(self):
+        """백엔드별 통계 {name: {...}}"""
+        with self._lock:
+            return {backend.name: backend.snapshot() for backend in self.backends}
+
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_backend_pool():
+    """프로세스 공용 백엔드 풀"""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = BackendPool()
+        return _POOL
@@ -0,0 +1,576 @@
+# -*- coding: utf-8 -*-
+"""
+LLM 호출 게이트웨이
+모든 chat.completions 호출을 한 곳에서 처리
+- 배포의 RPM/TPM에 맞춘 토큰 버킷 (로컬 계산 프롬프트 토큰 + max_tokens 기준, 전체/백엔드별)
+- 여러 Azure OpenAI 백엔드로 분산 (llm_backends.BackendPool)
+- 작업별 라우팅(llm_routes)과 출력 토큰 분포 기반 max_tokens 산정(output_budget), 잘린 응답 1회 재요청
+- 429/일시적 5xx/연결 오류 재시도 (Retry-After 준수, 지터 포함 지수 백오프)
+- 적응형(AIMD) 동시 호출 제한: 지연/오류가 정상이면 1씩 늘리고 429·지연 급증 시 절반으로 줄임
+- 선택적 요청 헤징: 최근 지연의 백분위까지 응답이 없으면 중복 요청을 보내 먼저 검증을 통과한 결과 사용
+- response_format(구조화 출력)을 지원하지 않는 백엔드·배포는 json_schema → json_object → 일반 텍스트 순으로 낮춰 재요청
+- 대기 중인 요청 수(큐 깊이), 동시 호출 한도, 재시도/스로틀/헤징 횟수 지표
+"""
+import os
+import math
+import time
+import random
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import openai
+from .metrics import increment, set_gauge, record_llm_usage
+from .concurrency import get_adaptive_max_concurrency
+from .llm_backends import get_backend_pool
+from .llm_routes import ROUTE_METRIC_PREFIX, record_route_validation
+from .output_budget import get_output_budget
+from .structured_output import get_response_format_support, is_response_format_error
+from .tokenizer import count_messages_tokens
+from .utils import env_int, env_float
+
+
+class TokenBucket:
+    """분당 한도를 초 단위로 균등하게 채우는 토큰 버킷 (한도 0이면 제한 없음)"""
+
+    def __init__(self, per_minute):
+        self.capacity = max(0, per_minute or 0)
+        self.rate = self.capacity / 60.0
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._cond = threading.Condition()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount):
+        """amount만큼 사용 가능할 때까지 대기 (한도보다 큰 요청은 한도만큼만 차감)"""
+        if not self.capacity:
+            return
+        amount = min(amount, self.capacity)
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    self._cond.wait(self.blocked_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                self._cond.wait((amount - self.tokens) / self.rate)
+
+    def refund(self, amount):
+        """실제 사용량이 추정보다 적을 때 차이만큼 반환"""
+        if not self.capacity or amount <= 0:
+            return
+        with self._cond:
+            self.tokens = min(self.capacity, self.tokens + amount)
+            self._cond.notify_all()
+
+    def pause(self, seconds):
+        """서버가 Retry-After를 보낸 경우 모든 호출을 해당 시간 동안 멈춤"""
+        with self._cond:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD 방식 동시 호출 제한기 (스레드 안전)
+
+    정상 응답마다 한도를 1/한도씩 늘려 왕복 1회당 약 1 증가시키고,
+    429·과부하 오류 또는 작업별 평균 지연의 latency_factor배를 넘는 응답이 오면 decrease_factor배로 줄임
+    (한 번 줄인 뒤 cooldown초 동안은 추가 감소 없음 → 동시에 실패한 요청들로 한도가 연쇄 급감하지 않도록)
+    """
+
+    def __init__(self, initial=None, min_limit=None, max_limit=None,
+                 latency_factor=None, decrease_factor=None, cooldown=None):
+        self.min_limit = max(1, min_limit if min_limit is not None else env_int("LLM_AIMD_MIN", 1))
+        self.max_limit = max(self.min_limit, max_limit if max_limit is not None else get_adaptive_max_concurrency())
+        initial = initial if initial is not None else env_int("LLM_AIMD_INITIAL", 4)
+        self.limit = float(min(self.max_limit, max(self.min_limit, initial)))
+        self.latency_factor = latency_factor if latency_factor is not None else env_float("LLM_AIMD_LATENCY_FACTOR", 2.0)
+        self.decrease_factor = decrease_factor if decrease_factor is not None else env_float("LLM_AIMD_DECREASE_FACTOR", 0.5)
+        self.cooldown = cooldown if cooldown is not None else env_float("LLM_AIMD_COOLDOWN", 5.0)
+        self.in_flight = 0
+        self._latency_avg = {}
+        self._latency_samples = {}
+        self._cooldown_until = 0.0
+        self._cond = threading.Condition()
+        self._publish()
+
+    def _publish(self):
+        set_gauge("llm.gateway.concurrency_limit", int(self.limit))
+        set_gauge("llm.gateway.in_flight", self.in_flight)
+
+    def acquire(self):
+        """동시 호출 수가 현재 한도 미만이 될 때까지 대기"""
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+            self._publish()
+
+    def _decrease(self, reason):
+        now = time.monotonic()
+        if now < self._cooldown_until:
+            return
+        self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+        self._cooldown_until = now + self.cooldown
+        increment(f"llm.gateway.concurrency_decrease.{reason}")
+        logging.warning(f"LLM 동시 호출 한도 감소 ({reason}): {int(self.limit)}")
+
+    def _is_latency_spike(self, task, latency):
+        """작업별 지수 이동 평균 대비 지연 급증 여부 (표본 5개 이전에는 판단하지 않음)"""
+        average = self._latency_avg.get(task)
+        samples = self._latency_samples.get(task, 0)
+        self._latency_avg[task] = latency if average is None else average * 0.8 + latency * 0.2
+        self._latency_samples[task] = samples + 1
+        return samples >= 5 and latency > average * self.latency_factor
+
+    def release(self, task="default", latency=None, overloaded=False):
+        """
+        호출 종료 반영
+
+        Args:
+            task: 지연 평균을 따로 관리할 작업 이름
+            latency: 성공한 호출의 응답 시간(초), 실패 시 None
+            overloaded: 429·5xx·연결 오류처럼 서버 과부하를 뜻하는 실패 여부
+        """
+        with self._cond:
+            self.in_flight -= 1
+            if overloaded:
+                self._decrease("throttled")
+            elif latency is not None:
+                if self._is_latency_spike(task, latency):
+                    self._decrease("latency")
+                else:
+                    self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self._publish()
+            self._cond.notify_all()
+
+
+class LatencyTracker:
+    """작업별 최근 성공 호출 응답 시간 표본 (헤징 기준 백분위 계산용, 스레드 안전)"""
+
+    def __init__(self, window=200):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def add(self, task, seconds):
+        with self._lock:
+            self._samples.setdefault(task, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, task, percent, min_samples=1):
+        """최근 표본의 percent 백분위 (표본이 min_samples 미만이면 None)"""
+        with self._lock:
+            samples = sorted(self._samples.get(task, ()))
+        if not samples or len(samples) < min_samples:
+            return None
+        index = min(len(samples) - 1, int(math.ceil(percent / 100.0 * len(samples))) - 1)
+        return samples[max(0, index)]
+
+
+class LLMCallCancelled(Exception):
+    """헤징에서 다른 요청이 먼저 성공해 더 이상 필요 없는 호출"""
+
+
+def is_truncated(response):
+    """max_tokens에 도달해 출력이 잘린 응답 여부"""
+    choices = getattr(response, 'choices', None) or []
+    return bool(choices) and getattr(choices[0], 'finish_reason', None) == "length"
+
+
+def get_total_tokens(response, default=None):
+    """응답의 total_tokens (사용량 정보가 없으면 default)"""
+    usage = getattr(response, 'usage', None)
+    return getattr(usage, 'total_tokens', None) or default
+
+
+def get_retry_after(error):
+    """오류 응답 헤더의 Retry-After(초) (없으면 None)"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000.0
+        if headers.get('retry-after'):
+            return float(headers['retry-after'])
+    except (ValueError, TypeError):
+        return None
+    return None
+
+
+def is_retryable_error(error):
+    """재시도할 오류 여부 (429, 408/409, 5xx, 연결/타임아웃)"""
+    if isinstance(error, openai.APIConnectionError):
+        return True
+    status = getattr(error, 'status_code', None)
+    return status in (408, 409, 429) or (status is not None and status >= 500)
+
+
+class LLMGateway:
+    """RPM/TPM 버킷, 백엔드 풀 라우팅, 재시도를 적용하는 chat.completions 호출기"""
+
+    def __init__(self, rpm=None, tpm=None, max_retries=None, base_delay=None, max_delay=None, backend_pool=None):
+        self.backend_pool = backend_pool or get_backend_pool()
+        self._backend_buckets = {}
+        self.request_bucket = TokenBucket(rpm if rpm is not None else env_int("AOAI_RPM", 0))
+        self.token_bucket = TokenBucket(tpm if tpm is not None else env_int("AOAI_TPM", 0))
+        self.max_retries = max_retries if max_retries is not None else env_int("LLM_MAX_RETRIES", 6)
+        self.base_delay = base_delay if base_delay is not None else env_float("LLM_RETRY_BASE_DELAY", 1.0)
+        self.max_delay = max_delay if max_delay is not None else env_float("LLM_RETRY_MAX_DELAY", 60.0)
+        self.concurrency = (
+            AdaptiveConcurrencyLimiter()
+            if os.environ.get("LLM_AIMD_ENABLED", "true").lower() != "false" else None
+        )
+        self.latencies = LatencyTracker()
+        self.response_formats = get_response_format_support()
+        self.hedge_enabled = os.environ.get("LLM_HEDGE_ENABLED", "false").lower() == "true"
+        self.hedge_percentile = env_float("LLM_HEDGE_PERCENTILE", 95.0)
+        self.hedge_min_samples = env_int("LLM_HEDGE_MIN_SAMPLES", 20)
+        self.hedge_budget_ratio = env_float("LLM_HEDGE_BUDGET_RATIO", 0.1)
+        self._hedge_tokens = 0
+        self._hedged_primary_tokens = 0
+        self._waiting = 0
+        self._lock = threading.Lock()
+
+    def _get_backend_buckets(self, backend):
+        """백엔드별 RPM/TPM 버킷 (설정의 rpm/tpm, 0이면 제한 없음)"""
+        with self._lock:
+            buckets = self._backend_buckets.get(backend.name)
+            if buckets is None:
+                buckets = (TokenBucket(backend.rpm), TokenBucket(backend.tpm))
+                self._backend_buckets[backend.name] = buckets
+            return buckets
+
+    def _set_waiting(self, delta):
+        with self._lock:
+            self._waiting += delta
+            set_gauge("llm.gateway.queue_depth", self._waiting)
+
+    def _backoff_delay(self, attempt, error):
+        """Retry-After가 있으면 그 값, 없으면 지터 포함 지수 백오프"""
+        retry_after = get_retry_after(error)
+        if retry_after is not None:
+            return min(retry_after, self.max_delay), True
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt))), False
+
+    def chat_completion(self, client, messages, max_tokens=None, model=None, task="default", route=None, cancel_event=None, sent_event=None, **kwargs):
+        """
+        chat.completions.create 호출 (한도 대기 + 재시도)
+
+        Args:
+            client: 하위 호환용 (사용하지 않음, 백엔드 풀의 클라이언트로 호출)
+            messages: 메시지 목록
+            max_tokens: 최대 출력 토큰 (TPM 예약량에 포함, None이면 라우트의 출력 토큰 분포로 산정)
+            model: 배포 이름 (해당 배포를 가진 백엔드로 라우팅, 기본값: 라우트 배포 또는 백엔드별 deployment)
+            task: 지표 구분용 작업 이름
+            route: resolve_route 결과 (배포/max_tokens/생성 파라미터 기본값, 라우트별 지연·토큰 기록)
+            cancel_event: 설정되면 대기/재시도 중인 호출을 중단 (LLMCallCancelled 발생)
+            sent_event: 한도·슬롯 대기를 마치고 HTTP 요청을 보내기 직전에 설정 (헤징 지연 기준 시점)
+            **kwargs: temperature, response_format 등 추가 생성 파라미터
+
+        Returns:
+            응답 객체 (재시도 한도를 넘으면 마지막 예외를 발생)
+        """
+        if not route:
+            return self._call_with_retries(messages, max_tokens, model, task, route, cancel_event, sent_event, kwargs)
+
+        model = model or route['deployment']
+        kwargs = {**route['params'], **kwargs}
+
+        # max_tokens를 지정하지 않으면 라우트별 출력 토큰 분포의 백분위 + 여유분 사용 (라우트 값이 상한)
+        budget = get_output_budget()
+        adaptive = max_tokens is None and route.get('adaptive_max_tokens', True)
+        if max_tokens is None:
+            max_tokens = budget.get_max_tokens(route['budget_key'], route['max_tokens']) if adaptive else route['max_tokens']
+
+        response = self._call_with_retries(messages, max_tokens, model, task, route, cancel_event, sent_event, kwargs)
+
+        # 출력이 max_tokens에서 잘리면 더 큰 한도로 1회 재요청
+        if max_tokens and is_truncated(response) and route.get('adaptive_max_tokens', True):
+            retry_tokens = max(route['max_tokens'] or 0, max_tokens * 2)
+            increment(f"{ROUTE_METRIC_PREFIX}.{route['name']}.truncated")
+            logging.warning(f"LLM 응답 잘림 ({route['name']}, max_tokens {max_tokens}) → {retry_tokens}로 재요청")
+            max_tokens = retry_tokens
+            response = self._call_with_retries(messages, max_tokens, model, task, route, cancel_event, sent_event, kwargs)
+
+        if adaptive and not is_truncated(response):
+            usage = getattr(response, 'usage', None)
+            budget.record(route['budget_key'], getattr(usage, 'completion_tokens', None) if usage is not None else None)
+        return response
+
+    def _call_with_retries(self, messages, max_tokens, model, task, route, cancel_event, sent_event, kwargs):
+        """백엔드 선택, 한도 대기, 재시도를 적용한 호출 1건"""
+        prompt_tokens = count_messages_tokens(messages)
+        reserved_tokens = prompt_tokens + (max_tokens or 0)
+        pool = self.backend_pool
+
+        def raise_if_cancelled():
+            if cancel_event is not None and cancel_event.is_set():
+                raise LLMCallCancelled()
+
+        attempt = 0
+        failed_backend = None
+        while True:
+            raise_if_cancelled()
+
+            self._set_waiting(1)
+            try:
+                self.request_bucket.acquire(1)
+                self.token_bucket.acquire(reserved_tokens)
+            finally:
+                self._set_waiting(-1)
+
+            # 동시 호출 슬롯과 백엔드를 잡은 뒤 요청 전에 실패하거나 취소되면 반드시 반납 (누수 시 한도 교착)
+            # 헤징에서 진 요청은 대기가 끝날 때마다 취소 여부를 다시 확인해 요청을 보내지 않음
+            concurrency_held = False
+            backend = None
+            token_bucket = None
+            try:
+                raise_if_cancelled()
+                if self.concurrency:
+                    self._set_waiting(1)
+                    try:
+                        self.concurrency.acquire()
+                        concurrency_held = True
+                    finally:
+                        self._set_waiting(-1)
+                    raise_if_cancelled()
+
+                backend = pool.acquire(model, exclude=failed_backend)
+                request_bucket, backend_token_bucket = self._get_backend_buckets(backend)
+                self._set_waiting(1)
+                try:
+                    request_bucket.acquire(1)
+                    backend_token_bucket.acquire(reserved_tokens)
+                    token_bucket = backend_token_bucket
+                finally:
+                    self._set_waiting(-1)
+                raise_if_cancelled()
+
+                # 이 백엔드·배포가 지원하지 않는 response_format은 한 단계 낮춰 요청
+                deployment = model or backend.deployment
+                support_key = f"{backend.name}:{deployment}"
+                request_kwargs, format_type = self.response_formats.apply(kwargs, support_key)
+            except BaseException:
+                # 보내지 않은 요청의 예약 토큰 반환
+                self.token_bucket.refund(reserved_tokens)
+                if token_bucket is not None:
+                    token_bucket.refund(reserved_tokens)
+                if backend is not None:
+                    pool.abandon(backend)
+                if concurrency_held:
+                    self.concurrency.release(task)
+                raise
+
+            if sent_event is not None:
+                sent_event.set()
+            started_at = time.monotonic()
+            try:
+                response = backend.client.chat.completions.create(
+                    model=deployment,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    **request_kwargs
+                )
+            except Exception as e:
+                retryable = is_retryable_error(e)
+                status = getattr(e, 'status_code', None)
+                pool.release(backend, error_status=status, overloaded=retryable, retry_after=get_retry_after(e))
+                if self.concurrency:
+                    self.concurrency.release(task, overloaded=retryable)
+                # 실패한 요청은 출력 토큰을 쓰지 않았으므로 예약량을 반환 (재시도는 다시 예약)
+                self.token_bucket.refund(reserved_tokens)
+                token_bucket.refund(reserved_tokens)
+                if format_type and is_response_format_error(e):
+                    # 재시도 횟수에 포함하지 않고 다음 종류(또는 일반 텍스트)로 바로 재요청
+                    self.response_formats.mark_unsupported(support_key, format_type)
+                    increment(f"llm.{task}.response_format.unsupported")
+                    logging.warning(f"response_format 미지원 ({backend.name}, {deployment}, {format_type}) → 낮은 단계로 재요청")
+                    continue
+                if not retryable or attempt >= self.max_retries:
+                    increment(f"llm.{task}.failures")
+                    raise
+
+                # 다른 백엔드를 바로 쓸 수 있으면 대기 없이 재시도, 아니면 백오프
+                failed_backend = backend
+                if pool.has_alternative(backend, model):
+                    delay, from_server = 0.0, False
+                else:
+                    delay, from_server = self._backoff_delay(attempt, e)
+                if status == 429:
+                    increment("llm.gateway.throttled")
+                    if from_server:
+                        request_bucket.pause(delay)
+                        token_bucket.pause(delay)
+                        if len(pool.backends) == 1:
+                            self.request_bucket.pause(delay)
+                            self.token_bucket.pause(delay)
+                increment("llm.gateway.retries")
+                logging.warning(f"LLM 호출 재시도 {attempt + 1}/{self.max_retries} ({task}, {backend.name}, {delay:.1f}초 후): {str(e)}")
+                if cancel_event is not None:
+                    cancel_event.wait(delay)
+                else:
+                    time.sleep(delay)
+                attempt += 1
+                continue
+
+            latency = time.monotonic() - started_at
+            used_tokens = get_total_tokens(response)
+            pool.release(backend, latency=latency, tokens=used_tokens)
+            self.latencies.add(task, latency)
+            if self.concurrency:
+                self.concurrency.release(task, latency=latency)
+
+            # 실제 사용량이 예약량보다 적으면 TPM 버킷에 반환
+            if used_tokens:
+                self.token_bucket.refund(reserved_tokens - used_tokens)
+                token_bucket.refund(reserved_tokens - used_tokens)
+            # 로컬 계산 프롬프트 토큰 (실제 usage와 비교해 예산/예약량 보정에 사용)
+            increment(f"llm.{task}.prompt_tokens_local", prompt_tokens)
+            if 'response_format' in kwargs:
+                increment(f"llm.{task}.response_format.{format_type or 'text'}")
+            record_llm_usage(response, f"llm.{task}")
+            if route:
+                record_llm_usage(response, f"{ROUTE_METRIC_PREFIX}.{route['name']}")
+                increment(f"{ROUTE_METRIC_PREFIX}.{route['name']}.latency_total", latency)
+            return response
+
+    def _reserve_hedge(self, task, estimated_tokens):
+        """추가 토큰 예산 안이면 헤징 허용 (헤징 누적 토큰 ≤ 헤징 대상 호출 토큰 × LLM_HEDGE_BUDGET_RATIO)"""
+        with self._lock:
+            if self._hedge_tokens + estimated_tokens > self._hedged_primary_tokens * self.hedge_budget_ratio:
+                increment(f"llm.{task}.hedge.budget_skipped")
+                return False
+            self._hedge_tokens += estimated_tokens
+            return True
+
+    def _settle_hedge_tokens(self, task, hedge, estimated_tokens, used_tokens):
+        """헤징 요청은 예약한 추정치를 실제 사용량으로 정산, 첫 요청은 예산 기준 토큰에 합산"""
+        with self._lock:
+            if hedge:
+                self._hedge_tokens += used_tokens - estimated_tokens
+            else:
+                self._hedged_primary_tokens += used_tokens
+        if hedge and used_tokens:
+            increment(f"llm.{task}.hedge.tokens", used_tokens)
+
+    def hedged_chat_completion(self, client, messages, max_tokens, validator, model=None, task="default", route=None, **kwargs):
+        """
+        헤징 적용 chat.completions 호출 (LLM_HEDGE_ENABLED=false이면 일반 호출 1회)
+
+        첫 요청이 작업별 최근 지연의 LLM_HEDGE_PERCENTILE 백분위 안에 끝나지 않으면 같은 요청을 1번 더 보내고,
+        validator를 먼저 통과한 결과를 반환한 뒤 남은 요청은 취소 (이미 전송된 HTTP 요청은 응답을 버림)
+
+        Args:
+            client: 하위 호환용 (사용하지 않음)
+            messages: 메시지 목록
+            max_tokens: 최대 출력 토큰
+            validator: 응답 객체 → 검증된 결과 (실패 시 None)
+            model: 배포 이름 (기본값: 라우트 배포 또는 백엔드별 deployment)
+            task: 지표/지연 통계 구분용 작업 이름
+            route: resolve_route 결과 (검증 통과 여부도 라우트별로 기록)
+            **kwargs: temperature 등 추가 생성 파라미터
+
+        Returns:
+            validator 결과 (모든 요청이 검증에 실패하면 None, 모두 예외면 마지막 예외를 발생)
+        """
+        def validate(response):
+            result = validator(response)
+            if route:
+                record_route_validation(route, result is not None)
+            return result
+
+        delay = self.latencies.percentile(task, self.hedge_percentile, self.hedge_min_samples) if self.hedge_enabled else None
+        if delay is None:
+            response = self.chat_completion(client, messages, max_tokens, model=model, task=task, route=route, **kwargs)
+            if self.hedge_enabled:
+                self._settle_hedge_tokens(task, False, 0, get_total_tokens(response, 0))
+            return validate(response)
+
+        estimated_tokens = count_messages_tokens(messages) + (max_tokens or (route or {}).get('max_tokens') or 0)
+        cancel_event = threading.Event()
+
+        # 지연 통계는 HTTP 요청 시간이므로 헤징 대기도 첫 요청이 실제로 전송된 시점부터 잼 (한도·슬롯 대기 제외)
+        primary_sent = threading.Event()
+
+        def run(hedge, sent_event=None):
+            try:
+                response = self.chat_completion(
+                    client, messages, max_tokens, model=model, task=task, route=route,
+                    cancel_event=cancel_event, sent_event=sent_event, **kwargs
+                )
+            except LLMCallCancelled:
+                # 전송 전에 취소된 헤징 요청은 예약한 예산 반환
+                if hedge:
+                    self._settle_hedge_tokens(task, True, estimated_tokens, 0)
+                raise
+            finally:
+                # 전송 전에 실패해도 대기 중인 헤징 판단이 끝나도록 설정
+                if sent_event is not None:
+                    sent_event.set()
+            self._settle_hedge_tokens(task, hedge, estimated_tokens, get_total_tokens(response, estimated_tokens))
+            return validate(response)
+
+        executor = ThreadPoolExecutor(max_workers=2)
+        try:
+            futures = {executor.submit(run, False, primary_sent): False}
+            primary_sent.wait()
+            done, _ = wait(futures, timeout=delay)
+            if not done and self._reserve_hedge(task, estimated_tokens):
+                increment(f"llm.{task}.hedge.fired")
+                futures[executor.submit(run, True)] = True
+
+            last_error = None
+            validation_failed = False
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        result = future.result()
+                    except LLMCallCancelled:
+                        continue
+                    except Exception as e:
+                        last_error = e
+                        continue
+                    if result is not None:
+                        if futures[future]:
+                            increment(f"llm.{task}.hedge.won")
+                        return result
+                    validation_failed = True
+
+            if last_error is not None and not validation_failed:
+                raise last_error
+            return None
+        finally:
+            cancel_event.set()
+            executor.shutdown(wait=False)
+
+
+_GATEWAY = None
+_GATEWAY_LOCK = threading.Lock()
+
+
+def get_llm_gateway():
+    """프로세스 공용 게이트웨이 (버킷과 동시 호출 제한기를 모든 호출이 공유)"""
+    global _GATEWAY
+    with _GATEWAY_LOCK:
+        if _GATEWAY is None:
+            _GATEWAY = LLMGateway()
+        return _GATEWAY
+
+
+def chat_completion(client, messages, max_tokens=None, model=None, task="default", route=None, **kwargs):
+    """공용 게이트웨이를 통한 chat.completions 호출"""
+    return get_llm_gateway().chat_completion(client, messages, max_tokens, model=model, task=task, route=route, **kwargs)
+
+
+def hedged_chat_completion(client, messages, max_tokens, validator, model=None, task="default", route=None, **kwargs):
+    """공용 게이트웨이를 통한 헤징 적용 호출 (validator 결과 반환)"""
+    return get_llm_gateway().hedged_chat_completion(client, messages, max_tokens, validator, model=model, task=task, route=route, **kwargs)
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+작업별 LLM 라우팅 테이블
+작업 종류(task), 난이도, SVG 필요 여부에 따라 배포와 생성 파라미터를 선택하고
+라우트별 지연/토큰/검증 통과율을 기록해 테이블 조정에 사용
+"""
+import os
+import json
+import logging
+import threading
+from .metrics import increment, get_metrics_snapshot
+
+ROUTE_METRIC_PREFIX = "llm.route"
+
+_ROUTE_TABLE = None
+_ROUTE_LOCK = threading.Lock()
+
+
+def get_default_routes():
+    """
+    기본 라우팅 테이블 (위에서부터 처음 일치하는 라우트 사용)
+
+    단순 작업(연결 테스트, 개념 매핑, SVG 없는 '하' 난이도 문제)은 AOAI_LIGHT_DEPLOYMENT로 보내고
+    나머지는 기본 배포 사용 (AOAI_LIGHT_DEPLOYMENT가 없으면 모두 기본 배포)
+    """
+    light = os.environ.get("AOAI_LIGHT_DEPLOYMENT") or None
+    return [
+        {"name": "connection_test", "task": "connection_test", "deployment": light, "max_tokens": 10,
+         "adaptive_max_tokens": False},
+        {"name": "mapping", "task": "mapping", "deployment": light, "max_tokens": 100,
+         "params": {"temperature": 0.3}},
+        {"name": "question_easy", "task": "question", "difficulty": ["하"], "requires_svg": False,
+         "deployment": light, "max_tokens": 1500, "params": {"temperature": 0.7}},
+        {"name": "question_svg", "task": "question", "requires_svg": True, "max_tokens": 1500,
+         "params": {"temperature": 0.7}},
+        {"name": "question", "task": "question", "max_tokens": 1500, "params": {"temperature": 0.7}},
+        {"name": "rag_svg", "task": "rag", "requires_svg": True, "max_tokens": 4000, "params": {"temperature": 0.7}},
+        {"name": "rag", "task": "rag", "max_tokens": 4000, "params": {"temperature": 0.7}},
+        {"name": "default"}
+    ]
+
+
+def load_route_table():
+    """LLM_ROUTES(JSON 배열)의 라우트를 기본 테이블 앞에 추가 (같은 조건이면 LLM_ROUTES가 우선)"""
+    routes = get_default_routes()
+    raw = os.environ.get("LLM_ROUTES", "").strip()
+    if not raw:
+        return routes
+
+    try:
+        custom_routes = json.loads(raw)
+        if not isinstance(custom_routes, list):
+            raise ValueError("LLM_ROUTES는 JSON 배열이어야 합니다.")
+    except ValueError as e:
+        logging.error(f"LLM_ROUTES 파싱 실패, 기본 라우팅 사용: {str(e)}")
+        return routes
+
+    for index, route in enumerate(custom_routes):
+        route.setdefault("name", f"custom{index + 1}")
+    return custom_routes + routes
+
+
+def get_route_table():
+    """프로세스 공용 라우팅 테이블 (최초 1회 로드)"""
+    global _ROUTE_TABLE
+    with _ROUTE_LOCK:
+        if _ROUTE_TABLE is None:
+            _ROUTE_TABLE = load_route_table()
+        return _ROUTE_TABLE
+
+
+def _matches(route, task, difficulty, requires_svg):
+    if route.get("task") not in (None, task):
+        return False
+
+    difficulties = route.get("difficulty")
+    if difficulties is not None:
+        if isinstance(difficulties, str):
+            difficulties = [difficulties]
+        if str(difficulty or '').strip() not in difficulties:
+            return False
+
+    return route.get("requires_svg") in (None, bool(requires_svg))
+
+
+def get_batch_bucket(item_count):
+    """한 호출에 담긴 항목 수 구간 (1, 2, 4, 8, ... 중 item_count 이상인 최솟값)"""
+    bucket = 1
+    while bucket < item_count:
+        bucket *= 2
+    return bucket
+
+
+def resolve_route(task, difficulty=None, requires_svg=False, item_count=None):
+    """
+    작업 조건에 맞는 라우트
+
+    Args:
+        task: 작업 이름 (question, rag, mapping, connection_test 등)
+        difficulty: 난이도 ('상'/'중'/'하')
+        requires_svg: SVG 필요 여부
+        item_count: 한 호출에서 생성할 항목 수 (출력 길이가 항목 수에 비례하는 작업은 지정,
+                    출력 토큰 분포를 항목 수 구간별로 따로 관리해 작은 배치의 분포로 큰 배치가 잘리지 않도록)
+
+    Returns:
+        dict: {'name', 'deployment', 'max_tokens', 'params', 'budget_key', 'adaptive_max_tokens'}
+              (deployment/max_tokens는 None일 수 있음, budget_key는 출력 토큰 분포 키)
+    """
+    route = next((route for route in get_route_table() if _matches(route, task, difficulty, requires_svg)), {"name": "default"})
+    budget_key = f"{route['name']}:{str(difficulty or '-').strip()}:{'svg' if requires_svg else 'text'}"
+    if item_count:
+        budget_key += f":n{get_batch_bucket(item_count)}"
+    return {
+        "name": route["name"],
+        "deployment": route.get("deployment") or None,
+        "max_tokens": route.get("max_tokens"),
+        "params": dict(route.get("params") or {}),
+        "budget_key": budget_key,
+        "adaptive_max_tokens": route.get("adaptive_max_tokens", True)
+    }
+
+
+def record_route_validation(route, passed):
+    """라우트 응답의 검증 통과 여부 기록"""
+    name = route["name"] if isinstance(route, dict) else route
+    increment(f"{ROUTE_METRIC_PREFIX}.{name}.validation_{'passed' if passed else 'failed'}")
+
+
+def get_route_stats():
+    """라우트별 호출 수, 평균 지연, 평균 토큰, 프롬프트 캐시 적중 비율, 검증 통과율 {name: {...}}"""
+    stats = {}
+    prefix = f"{ROUTE_METRIC_PREFIX}."
+    for metric, value in get_metrics_snapshot(prefix).items():
+        name, field = metric[len(prefix):].rsplit(".", 1)
+        stats.setdefault(name, {})[field] = value
+
+    for values in stats.values():
+        calls = values.get("calls", 0)
+        checked = values.get("validation_passed", 0) + values.get("validation_failed", 0)
+        values["avg_latency"] = round(values.get("latency_total", 0) / calls, 3) if calls else None
+        values["latency_total"] = round(values.get("latency_total", 0), 3)
+        values["avg_completion_tokens"] = round(values.get("completion_tokens", 0) / calls, 1) if calls else None
+        prompt_tokens = values.get("prompt_tokens", 0)
+        values["cached_token_ratio"] = round(values.get("cached_tokens", 0) / prompt_tokens, 3) if prompt_tokens else None
+        values["validation_pass_rate"] = round(values.get("validation_passed", 0) / checked, 3) if checked else None
+    return stats
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+실행 지표 수집
+LLM 호출 수, 토큰 사용량 등을 프로세스 단위로 집계 (스레드 안전)
+"""
+import threading
+from collections import defaultdict
+
+_METRICS_LOCK = threading.Lock()
+_COUNTERS = defaultdict(float)
+
+
+def increment(name, value=1):
+    """카운터 증가"""
+    with _METRICS_LOCK:
+        _COUNTERS[name] += value
+
+
+def set_gauge(name, value):
+    """현재 값 지표 설정 (큐 깊이 등)"""
+    with _METRICS_LOCK:
+        _COUNTERS[name] = value
+
+
+def record_llm_usage(response, prefix="llm"):
+    """chat.completions 응답의 호출 수와 토큰 사용량(캐시 적중 프롬프트 토큰 포함) 기록"""
+    usage = getattr(response, 'usage', None)
+    with _METRICS_LOCK:
+        _COUNTERS[f"{prefix}.calls"] += 1
+        if usage is not None:
+            _COUNTERS[f"{prefix}.prompt_tokens"] += getattr(usage, 'prompt_tokens', 0) or 0
+            _COUNTERS[f"{prefix}.completion_tokens"] += getattr(usage, 'completion_tokens', 0) or 0
+            _COUNTERS[f"{prefix}.total_tokens"] += getattr(usage, 'total_tokens', 0) or 0
+            # 프롬프트 캐시 적중 토큰 (prompt_tokens_details를 주지 않는 API 버전은 0)
+            details = getattr(usage, 'prompt_tokens_details', None)
+            _COUNTERS[f"{prefix}.cached_tokens"] += getattr(details, 'cached_tokens', 0) or 0
+
+
+def get_metrics_snapshot(prefix=None):
+    """현재 카운터 복사본 (prefix 지정 시 해당 이름만)"""
+    with _METRICS_LOCK:
+        return {
+            name: int(value) if float(value).is_integer() else value
+            for name, value in _COUNTERS.items()
+            if prefix is None or name.startswith(prefix)
+        }
+
+
+def reset_metrics():
+    """카운터 초기화"""
+    with _METRICS_LOCK:
+        _COUNTERS.clear()
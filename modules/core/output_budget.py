@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+출력 토큰 기반 max_tokens 자동 산정
+(라우트, 난이도, SVG 필요 여부)별 최근 completion_tokens 분포를 유지하고
+max_tokens를 높은 백분위 + 여유분으로 설정 (Azure는 TPM을 max_tokens 기준으로 예약하므로 고정 상한보다 처리량 증가)
+"""
+import math
+import threading
+from collections import deque
+from .state_store import load_state, save_state
+from .utils import env_int, env_float
+
+# 분포 저장 위치 (재시작 후에도 바로 적용)
+OUTPUT_BUDGET_NAMESPACE = "llm_output_budget"
+OUTPUT_BUDGET_KEY = "completion_tokens"
+
+
+class OutputTokenBudget:
+    """키별 최근 출력 토큰 수 표본과 백분위 기반 max_tokens (스레드 안전)"""
+
+    def __init__(self, window=None, percentile=None, margin=None, min_samples=None, floor=None, save_every=None):
+        self.window = window or env_int("LLM_MAX_TOKENS_WINDOW", 500)
+        self.percentile = percentile if percentile is not None else env_float("LLM_MAX_TOKENS_PERCENTILE", 99.0)
+        self.margin = margin if margin is not None else env_float("LLM_MAX_TOKENS_MARGIN", 0.2)
+        self.min_samples = min_samples if min_samples is not None else env_int("LLM_MAX_TOKENS_MIN_SAMPLES", 30)
+        self.floor = floor if floor is not None else env_int("LLM_MAX_TOKENS_FLOOR", 64)
+        self.save_every = save_every if save_every is not None else env_int("LLM_MAX_TOKENS_SAVE_EVERY", 50)
+        self._samples = {}
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        saved = load_state(OUTPUT_BUDGET_NAMESPACE, OUTPUT_BUDGET_KEY) or {}
+        for key, values in saved.get('samples', {}).items():
+            self._samples[key] = deque((int(value) for value in values), maxlen=self.window)
+
+    def _save_locked(self):
+        save_state(OUTPUT_BUDGET_NAMESPACE, OUTPUT_BUDGET_KEY, {
+            'samples': {key: list(values) for key, values in self._samples.items()}
+        })
+        self._unsaved = 0
+
+    def record(self, key, completion_tokens):
+        """잘리지 않은 응답의 출력 토큰 수 기록"""
+        if not completion_tokens:
+            return
+        with self._lock:
+            self._samples.setdefault(key, deque(maxlen=self.window)).append(int(completion_tokens))
+            self._unsaved += 1
+            if self.save_every and self._unsaved >= self.save_every:
+                self._save_locked()
+
+    def get_max_tokens(self, key, ceiling):
+        """
+        키의 max_tokens
+
+        Args:
+            key: 분포 키 (라우트:난이도:svg[:항목 수 구간])
+            ceiling: 라우트에 설정된 고정 max_tokens (상한, 표본이 부족하면 그대로 사용)
+
+        Returns:
+            int 또는 ceiling (ceiling이 None이면 None)
+        """
+        if not ceiling:
+            return ceiling
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < self.min_samples:
+            return ceiling
+
+        index = min(len(samples) - 1, max(0, int(math.ceil(self.percentile / 100.0 * len(samples))) - 1))
+        budget = int(math.ceil(samples[index] * (1 + self.margin)))
+        return max(self.floor, min(ceiling, budget))
+
+    def get_stats(self):
+        """키별 표본 수와 현재 백분위 값 {key: {'samples', 'percentile_tokens'}}"""
+        with self._lock:
+            snapshot = {key: sorted(values) for key, values in self._samples.items()}
+        stats = {}
+        for key, samples in snapshot.items():
+            index = min(len(samples) - 1, max(0, int(math.ceil(self.percentile / 100.0 * len(samples))) - 1))
+            stats[key] = {'samples': len(samples), 'percentile_tokens': samples[index] if samples else None}
+        return stats
+
+    def flush(self):
+        """기록되지 않은 표본 저장"""
+        with self._lock:
+            if self._unsaved:
+                self._save_locked()
+
+
+_BUDGET = None
+_BUDGET_LOCK = threading.Lock()
+
+
+def get_output_budget():
+    """프로세스 공용 출력 토큰 분포"""
+    global _BUDGET
+    with _BUDGET_LOCK:
+        if _BUDGET is None:
+            _BUDGET = OutputTokenBudget()
+        return _BUDGET
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+페이지 커서 유틸리티
+다음 페이지 위치를 클라이언트가 그대로 돌려보내는 불투명(opaque) 문자열로 인코딩
+"""
+import json
+import base64
+import logging
+
+
+def encode_cursor(position):
+    """커서 위치(dict)를 URL 안전 문자열로 인코딩"""
+    raw = json.dumps(position, ensure_ascii=False, separators=(',', ':'), default=str)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """커서 문자열을 위치(dict)로 디코딩 (형식 오류 시 None)"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+        return position if isinstance(position, dict) else None
+    except Exception as e:
+        logging.warning(f"잘못된 커서: {str(e)}")
+        return None
+
+
+def parse_page_size(value, default, max_size):
+    """페이지 크기 파라미터 변환 (1 ~ max_size 범위로 제한, 형식 오류 시 None)"""
+    if value in (None, ''):
+        return default
+    try:
+        return max(1, min(int(value), max_size))
+    except (ValueError, TypeError):
+        return None
+
+
+def get_cursor_offset(position):
+    """커서의 offset (0 이상의 정수가 아니면 None, 클라이언트가 보낸 값이므로 반드시 검증)"""
+    offset = position.get('offset', 0)
+    if isinstance(offset, bool) or not isinstance(offset, int) or offset < 0:
+        return None
+    return offset
+
+
+def get_cursor_after_id(position):
+    """커서의 after_id (정수가 아니면 None, 키셋 조건에 그대로 바인딩되므로 반드시 검증)"""
+    after_id = position.get('after_id')
+    if isinstance(after_id, bool) or not isinstance(after_id, int):
+        return None
+    return after_id
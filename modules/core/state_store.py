@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+로컬 상태 저장소
+요청 간에 유지해야 하는 작은 상태(학습자별 생성 결과, 커서 등)를 JSON 파일로 보관
+"""
+import os
+import json
+import logging
+import tempfile
+import threading
+from hashlib import sha256
+
+_STORE_LOCK = threading.Lock()
+
+
+def get_state_store_dir():
+    """상태 저장 디렉터리 경로 (STATE_STORE_DIR 환경변수, 기본값: 임시 디렉터리)"""
+    return os.environ.get("STATE_STORE_DIR") or os.path.join(tempfile.gettempdir(), "question_state")
+
+
+def _get_state_path(namespace, key):
+    """namespace/key 조합의 파일 경로 (key는 해시하여 파일명으로 사용)"""
+    safe_key = sha256(str(key).encode('utf-8')).hexdigest()[:32]
+    return os.path.join(get_state_store_dir(), namespace, f"{safe_key}.json")
+
+
+def load_state(namespace, key):
+    """저장된 상태 조회 (없거나 읽기 실패 시 None)"""
+    path = _get_state_path(namespace, key)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logging.error(f"상태 로드 실패 ({namespace}/{key}): {str(e)}")
+        return None
+
+
+def save_state(namespace, key, data):
+    """상태 저장 (임시 파일 작성 후 교체하여 원자적으로 기록)"""
+    path = _get_state_path(namespace, key)
+    try:
+        with _STORE_LOCK:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, default=str)
+            os.replace(tmp_path, path)
+        return True
+    except Exception as e:
+        logging.error(f"상태 저장 실패 ({namespace}/{key}): {str(e)}")
+        return False
+
+
+def delete_state(namespace, key):
+    """저장된 상태 삭제"""
+    path = _get_state_path(namespace, key)
+    try:
+        with _STORE_LOCK:
+            os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+    except Exception as e:
+        logging.error(f"상태 삭제 실패 ({namespace}/{key}): {str(e)}")
+        return False
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+구조화 출력 (response_format)
+문제 JSON 스키마로 json_schema/json_object 응답을 요청해 JSON 보정 파싱을 건너뛰고,
+배포나 API 버전이 지원하지 않으면 백엔드별로 한 단계씩 낮춰(json_schema → json_object → 일반 텍스트) 기존 파서로 처리
+"""
+import os
+import re
+import json
+import threading
+from .metrics import increment
+
+# response_format 종류 (앞쪽이 우선)
+RESPONSE_FORMAT_TYPES = ("json_schema", "json_object")
+
+# 문제 생성 응답 (1문항)
+QUESTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "question_text": {"type": "string"},
+        "question_type": {"type": "string"},
+        "choices": {"type": ["array", "null"], "items": {"type": "string"}},
+        "correct_answer": {"type": "string"},
+        "answer_explanation": {"type": "string"},
+        "svg_code": {"type": ["string", "null"]}
+    },
+    "required": ["question_text", "question_type", "choices", "correct_answer", "answer_explanation", "svg_code"],
+    "additionalProperties": False
+}
+
+# RAG 문제 생성 응답 (불변 목록 행별 1문항, 최상위는 객체여야 하므로 questions 배열로 감쌈)
+RAG_QUESTIONS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "questions": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "assessmentItemID": {"type": "string"},
+                    "concept_name": {"type": "string"},
+                    "question_text": {"type": "string"},
+                    "choices": {"type": "array", "items": {"type": "string"}},
+                    "answer": {"type": "string"},
+                    "explanation": {"type": "string"},
+                    "svg_content": {"type": ["string", "null"]},
+                    "skip": {"type": "boolean"}
+                },
+                "required": ["assessmentItemID", "concept_name", "question_text", "choices", "answer",
+                             "explanation", "svg_content", "skip"],
+                "additionalProperties": False
+            }
+        }
+    },
+    "required": ["questions"],
+    "additionalProperties": False
+}
+
+# JSON 이스케이프로 해석된 LaTeX 명령 복원 (\frac → 폼피드+"rac", \times → 탭+"imes" 등)
+_LATEX_ESCAPE_PATTERNS = [
+    (re.compile(r'\x0c(?=[a-zA-Z])'), r'\\f'),
+    (re.compile(r'\x08(?=[a-zA-Z])'), r'\\b'),
+    (re.compile(r'\t(?=[a-zA-Z])'), r'\\t'),
+    (re.compile(r'\r(?=[a-zA-Z])'), r'\\r'),
+    (re.compile(r'\n(?=(?:eq|e|u|ot|abla|eg)(?![a-zA-Z]))'), r'\\n')
+]
+
+
+def get_structured_output_mode():
+    """LLM_STRUCTURED_OUTPUT (json_schema, json_object, off), 잘못된 값이면 json_schema"""
+    mode = os.environ.get("LLM_STRUCTURED_OUTPUT", "json_schema").strip().lower()
+    if mode in ("off", "false", "none", ""):
+        return None
+    return mode if mode in RESPONSE_FORMAT_TYPES else "json_schema"
+
+
+def build_response_format(name, schema):
+    """
+    chat.completions의 response_format 값
+
+    Args:
+        name: 스키마 이름
+        schema: JSON 스키마 (strict 모드 규칙: 모든 속성 required, additionalProperties false)
+
+    Returns:
+        dict 또는 None (LLM_STRUCTURED_OUTPUT=off)
+    """
+    mode = get_structured_output_mode()
+    if mode == "json_schema":
+        return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
+    if mode == "json_object":
+        return {"type": "json_object"}
+    return None
+
+
+def is_response_format_error(error):
+    """response_format을 지원하지 않는 배포/API 버전의 400 오류 여부"""
+    if getattr(error, 'status_code', None) != 400:
+        return False
+    message = str(error).lower()
+    return any(keyword in message for keyword in ("response_format", "json_schema", "json_object"))
+
+
+class ResponseFormatSupport:
+    """백엔드·배포별로 지원하지 않는 response_format 종류 기록 (스레드 안전)"""
+
+    def __init__(self):
+        self._unsupported = {}
+        self._lock = threading.Lock()
+
+    def apply(self, kwargs, key):
+        """
+        지원하지 않는 종류를 한 단계 낮춘 생성 파라미터 사본
+
+        Returns:
+            (kwargs, 실제 요청 종류) - 종류는 json_schema, json_object 또는 None (일반 텍스트)
+        """
+        response_format = kwargs.get('response_format')
+        if not response_format:
+            return kwargs, None
+
+        with self._lock:
+            unsupported = set(self._unsupported.get(key, ()))
+
+        format_type = response_format.get('type')
+        if format_type not in unsupported:
+            return kwargs, format_type
+
+        kwargs = dict(kwargs)
+        fallback = next(
+            (candidate for candidate in RESPONSE_FORMAT_TYPES[RESPONSE_FORMAT_TYPES.index(format_type) + 1:]
+             if candidate not in unsupported),
+            None
+        ) if format_type in RESPONSE_FORMAT_TYPES else None
+        if fallback:
+            kwargs['response_format'] = {"type": fallback}
+        else:
+            kwargs.pop('response_format')
+        return kwargs, fallback
+
+    def mark_unsupported(self, key, format_type):
+        with self._lock:
+            self._unsupported.setdefault(key, set()).add(format_type)
+
+    def get_stats(self):
+        """키별 지원하지 않는 종류 {key: [...]}"""
+        with self._lock:
+            return {key: sorted(values) for key, values in self._unsupported.items()}
+
+
+_SUPPORT = ResponseFormatSupport()
+
+
+def get_response_format_support():
+    """프로세스 공용 response_format 지원 기록"""
+    return _SUPPORT
+
+
+def load_structured_json(content):
+    """응답 본문을 그대로 JSON으로 읽기 (구조화 출력 응답, 보정이 필요하면 None)"""
+    try:
+        return json.loads((content or '').strip())
+    except ValueError:
+        return None
+
+
+def restore_latex_escapes(value):
+    """문자열(중첩 dict/list 포함) 안의 JSON 이스케이프로 해석된 LaTeX 명령 복원"""
+    if isinstance(value, str):
+        for pattern, replacement in _LATEX_ESCAPE_PATTERNS:
+            value = pattern.sub(replacement, value)
+        return value
+    if isinstance(value, list):
+        return [restore_latex_escapes(item) for item in value]
+    if isinstance(value, dict):
+        return {key: restore_latex_escapes(item) for key, item in value.items()}
+    return value
+
+
+def record_parse_path(task, path):
+    """응답 파싱 경로 기록 (direct: 그대로 JSON, repaired: 기존 보정 파서, failed: 실패)"""
+    increment(f"llm.{task}.parse.{path}")
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+로컬 토큰 계산
+tiktoken이 설치되어 있으면 모델 인코딩으로 정확히 계산하고, 없으면 문자 수 기반으로 추정
+"""
+import os
+import math
+import logging
+import threading
+from .utils import env_float
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# 문자 수 → 토큰 수 추정 비율 (tiktoken이 없을 때, 한글 위주 프롬프트 기준, 형식 오류나 0 이하이면 기본값)
+CHARS_PER_TOKEN = env_float("LLM_CHARS_PER_TOKEN", 2.0)
+if not CHARS_PER_TOKEN > 0:
+    CHARS_PER_TOKEN = 2.0
+
+# gpt-4o 계열 인코딩
+TOKENIZER_ENCODING = os.environ.get("LLM_TOKENIZER_ENCODING", "o200k_base")
+
+_ENCODING = None
+_ENCODING_LOADED = False
+_ENCODING_LOCK = threading.Lock()
+
+
+def get_encoding():
+    """tiktoken 인코딩 (설치되지 않았거나 로드 실패 시 None)"""
+    global _ENCODING, _ENCODING_LOADED
+    with _ENCODING_LOCK:
+        if not _ENCODING_LOADED:
+            _ENCODING_LOADED = True
+            if tiktoken is not None:
+                try:
+                    _ENCODING = tiktoken.get_encoding(TOKENIZER_ENCODING)
+                except Exception as e:
+                    logging.warning(f"tiktoken 인코딩 로드 실패, 문자 수 기반 추정 사용: {str(e)}")
+        return _ENCODING
+
+
+def count_tokens(text):
+    """문자열의 토큰 수"""
+    text = text or ''
+    encoding = get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return int(math.ceil(len(text) / CHARS_PER_TOKEN))
+
+
+def count_messages_tokens(messages):
+    """메시지 목록의 프롬프트 토큰 수 (메시지당 구조 토큰 포함)"""
+    return sum(count_tokens(message.get('content')) + 4 for message in messages) + 3
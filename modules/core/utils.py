@@ -1,3 +1,4 @@
+import os
 import uuid
 from datetime import datetime
 
@@ -52,4 +53,20 @@ def generate_question_id():
     """고유한 문제 ID 생성"""
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     unique_suffix = str(uuid.uuid4())[:8]
-    return f"Q_{timestamp}_{unique_suffix}"
\ No newline at end of file
+    return f"Q_{timestamp}_{unique_suffix}"
+
+
+def env_int(name, default):
+    """정수 환경변수 (없거나 형식이 잘못되면 default, import 시 설정 오류로 앱 전체가 중단되지 않도록)"""
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def env_float(name, default):
+    """실수 환경변수 (없거나 형식이 잘못되면 default)"""
+    try:
+        return float(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+"""
+여러 learnerID 일괄 개인화 문제 생성 API 핸들러
+"""
+import azure.functions as func
+import json
+import logging
+from ..services.personalized_service import handle_personalized_batch_generation
+
+
+def handle_create_personalized_batch(req: func.HttpRequest) -> func.HttpResponse:
+    """여러 learnerID 일괄 개인화 문제 생성 API 핸들러"""
+    logging.info('create_personalized_batch API 호출됨')
+
+    try:
+        # GET(learnerIDs=a,b,c)과 POST(JSON 배열) 모두 지원
+        return handle_personalized_batch_generation(req)
+
+    except Exception as e:
+        logging.error(f"create_personalized_batch API 오류: {str(e)}")
+
+        return func.HttpResponse(
+            json.dumps({"error": f"내부 서버 오류: {str(e)}"}, ensure_ascii=False),
+            status_code=500,
+            headers={"Content-Type": "application/json; charset=utf-8"}
+        )
\ No newline at end of file
@@ -1,58 +1,191 @@
 # -*- coding: utf-8 -*-
 import logging
 import json
+from collections import Counter
 import azure.functions as func
 from ..core.database import get_question_data, get_sql_connection, get_knowledge_tag_by_concept, get_mapped_concept_name
 from ..core.ai_service import get_openai_client, generate_question_with_ai
 from ..core.validation import validate_question_format, prepare_question_record, prepare_answer_record
-from ..core.utils import generate_question_id
+from ..core.utils import generate_question_id, get_grade_international, env_int
 from ..core.responses import create_success_response, create_error_response
 from ..core.debug import print_question_result
+from ..core.concurrency import run_concurrently
+from ..core.pagination import encode_cursor, decode_cursor, parse_page_size, get_cursor_after_id
 
+# 세트 수 / 세트당 문제 수 (파라미터 기본값/상한)
+DEFAULT_BULK_SETS = env_int("BULK_DEFAULT_SETS", 4)
+MAX_BULK_SETS = env_int("BULK_MAX_SETS", 100)
+DEFAULT_BULK_PER_SET = env_int("BULK_DEFAULT_PER_SET", 5)
+MAX_BULK_PER_SET = env_int("BULK_MAX_PER_SET", 50)
 
-def get_multiple_question_params(limit=4):
-    """여러 개의 문제 파라미터 가져오기"""
+# 호출 1회당 최대 생성 문제 수 (sets × per_set 상한)
+MAX_BULK_QUESTIONS = env_int("BULK_MAX_QUESTIONS", 1000)
+
+# 세트를 나누어 병렬 생성하는 단위 (단위 안에서는 중복 방지를 위해 순차 생성)
+BULK_CHUNK_SIZE = env_int("BULK_CHUNK_SIZE", 5)
+
+
+def get_multiple_question_params(limit=4, after_id=None):
+    """여러 개의 문제 파라미터 가져오기 (after_id 이후 id 순 키셋 페이지, 조회 실패 시 None, 마지막 페이지 이후는 빈 목록)"""
     try:
         conn = get_sql_connection()
         if not conn:
             return None
 
         cursor = conn.cursor()
-        cursor.execute(f"""
-            SELECT TOP {limit} id, question_grade, question_term, question_topic_name, question_type1, question_difficulty
-            FROM questions_dim
-            ORDER BY id
-        """)
+        if after_id is None:
+            cursor.execute("""
+                SELECT TOP (?) id, question_grade, question_term, question_topic_name, question_type1, question_difficulty
+                FROM questions_dim
+                ORDER BY id
+            """, limit)
+        else:
+            cursor.execute("""
+                SELECT TOP (?) id, question_grade, question_term, question_topic_name, question_type1, question_difficulty
+                FROM questions_dim
+                WHERE id > ?
+                ORDER BY id
+            """, limit, after_id)
         results = cursor.fetchall()
         conn.close()
 
-        if results:
-            return [
-                {
-                    'id': result[0],
-                    'grade': result[1],
-                    'term': result[2],
-                    'topic_name': result[3],
-                    'question_type': result[4],
-                    'difficulty': result[5]
-                }
-                for result in results
-            ]
-        return None
+        return [
+            {
+                'id': result[0],
+                'grade': result[1],
+                'term': result[2],
+                'topic_name': result[3],
+                'question_type': result[4],
+                'difficulty': result[5]
+            }
+            for result in results
+        ]
 
     except Exception as e:
         logging.error(f"Error getting multiple question params: {str(e)}")
         return None
 
 
+def generate_set_chunk(client, task):
+    """세트의 일부(count개)를 순차 생성 → 검증 통과한 문제 목록"""
+    params = task['params']
+    generated_problems = []
+    questions = []
+
+    for _ in range(task['count']):
+        question_data = generate_question_with_ai(
+            client, params['grade'], params['term'], params['topic_name'],
+            params['question_type'], params['difficulty'], task['existing_questions'], generated_problems
+        )
+
+        if not (question_data and validate_question_format(question_data, params['question_type'])):
+            logging.warning(f"Question validation failed for set {task['set_number']}")
+            continue
+
+        question_id = generate_question_id()
+
+        # DB 저장 준비 (현재 비활성화)
+        question_record = prepare_question_record(
+            question_id, params['grade'], params['term'], params['topic_name'],
+            params['question_type'], params['difficulty'], question_data
+        )
+        answer_record = prepare_answer_record(question_id, question_data)
+
+        questions.append({
+            "id": question_id,
+            "source_id": params['id'],  # 원본 ID 추가
+            **question_data,
+            "metadata": {
+                "grade": params['grade'],
+                "term": params['term'],
+                "topic_name": params['topic_name'],
+                "difficulty": params['difficulty'],
+                "set_number": task['set_number'],
+                "mapped_concept_name": task['recommended_concept'],
+                "knowledge_tag": task['knowledge_tag']
+            }
+        })
+
+        # 생성된 문제를 추적 리스트에 추가
+        generated_problems.append(question_data['question_text'][:100])
+
+    return questions
+
+
+def load_topic_references(topic_name):
+    """주제의 기존 문제, 미리 매핑된 concept_name, knowledgeTag 조회 → (existing_questions, recommended_concept, knowledge_tag)"""
+    existing_questions = get_question_data("questions", topic_name)
+    recommended_concept = get_mapped_concept_name(topic_name)
+    knowledge_tag = get_knowledge_tag_by_concept(recommended_concept) if recommended_concept else None
+    return existing_questions, recommended_concept, knowledge_tag
+
+
+def build_generation_tasks(param_sets, per_set):
+    """주제별 참고 데이터를 1회만(주제끼리는 병렬로) 조회하고 per_set을 BULK_CHUNK_SIZE 단위 작업으로 분할"""
+    # 세트마다 순차로 DB를 왕복하지 않도록 중복 없는 주제 목록을 병렬 조회
+    topic_names = list(dict.fromkeys(params['topic_name'] for params in param_sets))
+    references = dict(zip(topic_names, run_concurrently(load_topic_references, topic_names)))
+
+    tasks = []
+    for set_idx, params in enumerate(param_sets, 1):
+        existing_questions, recommended_concept, knowledge_tag = references[params['topic_name']] or (None, None, None)
+
+        for chunk_start in range(0, per_set, BULK_CHUNK_SIZE):
+            tasks.append({
+                'set_number': set_idx,
+                'params': params,
+                'count': min(BULK_CHUNK_SIZE, per_set - chunk_start),
+                'existing_questions': existing_questions,
+                'recommended_concept': recommended_concept,
+                'knowledge_tag': knowledge_tag
+            })
+    return tasks
+
+
+def remove_duplicate_questions(questions):
+    """같은 세트 안에서 문제 내용이 같은 항목 제거 (병렬 생성 단위 간 중복)"""
+    seen = set()
+    unique_questions = []
+    for question in questions:
+        key = (question['metadata']['set_number'], ' '.join(str(question.get('question_text', '')).split()))
+        if key in seen:
+            continue
+        seen.add(key)
+        unique_questions.append(question)
+    return unique_questions
+
+
 def handle_bulk_generation(req):
-    """대량 문제 생성 처리 (20개 = 4개 ID × 5개씩)"""
+    """대량 문제 생성 처리 (sets개 파라미터 세트 × 세트당 per_set개, 기본 4 × 5)"""
     logging.info('Bulk question generation API called')
 
     try:
-        # 4개의 서로 다른 파라미터 세트 가져오기
-        param_sets = get_multiple_question_params(4)
-        if not param_sets:
+        # sets: 파라미터 세트 수, per_set: 세트당 문제 수, cursor: 이전 응답의 next_cursor
+        set_count = parse_page_size(req.params.get('sets'), DEFAULT_BULK_SETS, MAX_BULK_SETS)
+        per_set = parse_page_size(req.params.get('per_set'), DEFAULT_BULK_PER_SET, MAX_BULK_PER_SET)
+        cursor_param = req.params.get('cursor')
+        after = decode_cursor(cursor_param) if cursor_param else None
+        after_id = get_cursor_after_id(after) if after else None
+
+        if set_count is None or per_set is None or (cursor_param and after_id is None):
+            response_data = create_error_response(
+                "Invalid sets, per_set or cursor parameter",
+                status_code=400,
+                message="sets and per_set must be integers and cursor must come from a previous response"
+            )
+            return func.HttpResponse(
+                json.dumps(response_data, ensure_ascii=False),
+                status_code=400,
+                headers={"Content-Type": "application/json; charset=utf-8"}
+            )
+
+        # 호출 1회당 총 문제 수 상한
+        if set_count * per_set > MAX_BULK_QUESTIONS:
+            set_count = max(1, MAX_BULK_QUESTIONS // per_set)
+
+        # 키셋 기준 다음 파라미터 세트 가져오기 (빈 목록은 첫 페이지일 때만 오류, 이후에는 마지막 페이지까지 처리 완료)
+        param_sets = get_multiple_question_params(set_count, after_id)
+        if param_sets is None or (not param_sets and after_id is None):
             response_data = create_error_response(
                 "Failed to get question parameters from SQL",
                 status_code=500
@@ -63,97 +196,65 @@ def handle_bulk_generation(req):
                 headers={"Content-Type": "application/json; charset=utf-8"}
             )
 
-        print("[대량 생성] 문제 생성 시작 (총 20개)")
+        if not param_sets:
+            print("[대량 생성] questions_dim의 마지막 페이지까지 처리 완료")
+            response_data = create_success_response({
+                "success": True,
+                "generated_questions": [],
+                "summary": {"total_generated": 0, "target_count": 0, "sets_processed": 0, "per_set": per_set, "questions_per_set": []},
+                "next_cursor": None,
+                "completed": True
+            })
+            return func.HttpResponse(
+                json.dumps(response_data, ensure_ascii=False),
+                status_code=200,
+                headers={"Content-Type": "application/json; charset=utf-8"}
+            )
+
+        target_count = len(param_sets) * per_set
+        next_cursor = encode_cursor({'after_id': param_sets[-1]['id']}) if len(param_sets) == set_count else None
+
+        print(f"[대량 생성] 문제 생성 시작 (총 {target_count}개 = {len(param_sets)}세트 × {per_set}개)")
         print("=" * 80)
+        for set_idx, params in enumerate(param_sets, 1):
+            print(f"[세트 {set_idx}/{len(param_sets)}] ID:{params['id']} - {get_grade_international(params['grade'])} {params['term']}학기 - {params['topic_name']} ({params['question_type']}, 난이도{params['difficulty']})")
 
+        # 세트 × 분할 단위 작업을 병렬 생성 (OpenAI 클라이언트 공유)
         client = get_openai_client()
-        all_generated_questions = []
+        tasks = build_generation_tasks(param_sets, per_set)
+        chunk_results = run_concurrently(lambda task: generate_set_chunk(client, task), tasks)
 
-        for set_idx, params in enumerate(param_sets, 1):
-            from ..core.utils import get_grade_international
-            print(f"\n[세트 {set_idx}/4] ID:{params['id']}에서 가져온 파라미터")
-            print(f"   {get_grade_international(params['grade'])} {params['term']}학기 - {params['topic_name']} ({params['question_type']}, 난이도{params['difficulty']})")
-
-            # 해당 주제의 기존 문제들 가져오기
-            existing_questions = get_question_data("questions", params['topic_name'])
-
-            set_questions = []
-            generated_problems = []  # 이미 생성된 문제들 추적
-
-            # 각 세트당 5개 문제 생성
-            for i in range(5):
-                question_data = generate_question_with_ai(
-                    client, params['grade'], params['term'], params['topic_name'],
-                    params['question_type'], params['difficulty'], existing_questions, generated_problems
-                )
-
-                if question_data and validate_question_format(question_data, params['question_type']):
-                    question_id = generate_question_id()
-
-                    # DB에서 미리 매핑된 concept_name 조회
-                    recommended_concept = get_mapped_concept_name(params['topic_name'])
-                    knowledge_tag = get_knowledge_tag_by_concept(recommended_concept) if recommended_concept else None
-
-                    # DB 저장 준비 (현재 비활성화)
-                    question_record = prepare_question_record(
-                        question_id, params['grade'], params['term'], params['topic_name'],
-                        params['question_type'], params['difficulty'], question_data
-                    )
-                    answer_record = prepare_answer_record(question_id, question_data)
-
-                    # 결과 추가
-                    question_result = {
-                        "id": question_id,
-                        "source_id": params['id'],  # 원본 ID 추가
-                        **question_data,
-                        "metadata": {
-                            "grade": params['grade'],
-                            "term": params['term'],
-                            "topic_name": params['topic_name'],
-                            "difficulty": params['difficulty'],
-                            "set_number": set_idx,
-                            "mapped_concept_name": recommended_concept,
-                            "knowledge_tag": knowledge_tag
-                        }
-                    }
-
-                    set_questions.append(question_result)
-                    all_generated_questions.append(question_result)
-
-                    # 생성된 문제를 추적 리스트에 추가
-                    generated_problems.append(question_data['question_text'][:100])
-
-                    # 상세한 디버그 출력
-                    total_count = (set_idx - 1) * 5 + len(set_questions)
-                    print(f"   [성공] {total_count:2d}/20 - {question_data['question_text'][:50]}...")
-                    print(f"          기존 topic_name: {params['topic_name']}")
-                    print(f"          매핑된 concept_name: {recommended_concept or '매핑없음'}")
-                    print(f"          매핑된 knowledgeTag: {knowledge_tag}")
-                    print()
-                else:
-                    logging.warning(f"Question validation failed for set {set_idx}, question {i+1}")
-
-            print(f"   [세트 완료] 세트 {set_idx}: {len(set_questions)}/5개 문제 생성")
+        all_generated_questions = remove_duplicate_questions([
+            question
+            for questions in chunk_results if questions
+            for question in questions
+        ])
+        all_generated_questions.sort(key=lambda question: question['metadata']['set_number'])
+
+        # 세트별 생성 수 (1회 집계)
+        set_counts = Counter(question['metadata']['set_number'] for question in all_generated_questions)
+        for set_idx in range(1, len(param_sets) + 1):
+            print(f"   [세트 완료] 세트 {set_idx}: {set_counts[set_idx]}/{per_set}개 문제 생성")
 
         print("\n" + "=" * 80)
-        print(f"[대량 생성 완료] 총 {len(all_generated_questions)}/20개 문제")
+        print(f"[대량 생성 완료] 총 {len(all_generated_questions)}/{target_count}개 문제")
         print("=" * 80)
 
         # 요약 정보 생성
         summary = {
             "total_generated": len(all_generated_questions),
-            "target_count": 20,
+            "target_count": target_count,
             "sets_processed": len(param_sets),
-            "questions_per_set": [
-                len([q for q in all_generated_questions if q['metadata']['set_number'] == i])
-                for i in range(1, len(param_sets) + 1)
-            ]
+            "per_set": per_set,
+            "questions_per_set": [set_counts[i] for i in range(1, len(param_sets) + 1)]
         }
 
         response_data = create_success_response({
             "success": True,
             "generated_questions": all_generated_questions,
             "summary": summary,
+            "next_cursor": next_cursor,
+            "completed": next_cursor is None,
             "validation": {
                 "format_check": "passed",
                 "db_storage": "disabled_for_testing"
@@ -172,4 +273,4 @@ def handle_bulk_generation(req):
             json.dumps(response_data, ensure_ascii=False),
             status_code=500,
             headers={"Content-Type": "application/json; charset=utf-8"}
-        )
\ No newline at end of file
+        )
@@ -4,6 +4,8 @@ import json
 import azure.functions as func
 from ..core.database import get_sql_connection
 from ..core.ai_service import test_ai_connection
+from ..core.llm_backends import get_backend_pool
+from ..core.llm_routes import get_route_stats
 from ..core.responses import create_success_response
 from ..core.debug import print_connection_test_header, print_connection_test_summary
 
@@ -17,11 +19,15 @@ def handle_test_connections(req):
     # OpenAI 연결 테스트
     print("\n📡 Testing Azure OpenAI connection...")
     try:
-        print(f"   - Endpoint: {os.environ.get('AOAI_ENDPOINT', 'Not set')}")
-        print(f"   - Deployment: {os.environ.get('AOAI_DEPLOYMENT', 'Not set')}")
-        print(f"   - API Key: {'[설정됨]' if os.environ.get('AOAI_KEY') else '[설정안됨]'}")
+        for backend in get_backend_pool().backends:
+            print(f"   - Backend: {backend.name} (weight {backend.weight:g})")
+            print(f"     Endpoint: {backend.endpoint}")
+            print(f"     Deployment: {backend.deployment or 'Not set'}")
+            print(f"     API Key: {'[설정됨]' if backend.key else '[설정안됨]'}")
 
         ai_success, ai_message = test_ai_connection()
+        results["openai_backends"] = get_backend_pool().get_stats()
+        results["llm_routes"] = get_route_stats()
         if ai_success:
             results["openai_status"] = "[성공] SUCCESS"
             print("   [성공] Azure OpenAI connection: SUCCESS")
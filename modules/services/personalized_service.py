@@ -5,67 +5,161 @@ learnerID 기반 개인화 문제 생성 서비스
 """
 import logging
 import json
+from datetime import datetime
+from hashlib import sha256
 import azure.functions as func
-from ..core.database import get_sql_connection, get_question_data, get_mapped_concept_name, get_knowledge_tag_by_concept
+from ..core.database import get_question_data, get_mapped_concept_name, get_knowledge_tag_by_concept
 from ..core.ai_service import get_openai_client, generate_question_with_ai
 from ..core.validation import validate_question_format, prepare_question_record, prepare_answer_record
-from ..core.utils import generate_question_id, get_grade_international
+from ..core.utils import generate_question_id, get_grade_international, env_int
 from ..core.responses import create_success_response, create_error_response
+from ..core.state_store import load_state, save_state
+from ..core.learner_cache import get_cached_learner_requirements, warm_learner_requirements
+from ..core.concurrency import run_concurrently
+from ..core.pagination import encode_cursor, decode_cursor, parse_page_size, get_cursor_offset
+from .requirement_selector import select_requirements
+
+# 학습자별 마지막 생성 결과 저장 namespace
+PERSONALIZED_STATE_NAMESPACE = "personalized_generation"
+
+# 배치 요청 1회당 최대 학습자 수
+MAX_BATCH_LEARNERS = env_int("PERSONALIZED_BATCH_MAX_LEARNERS", 50)
+
+# 요청 1회당 생성할 요구사항 수 (limit 파라미터 기본값/상한)
+DEFAULT_QUESTION_LIMIT = env_int("PERSONALIZED_DEFAULT_LIMIT", 10)
+MAX_QUESTION_LIMIT = env_int("PERSONALIZED_MAX_LIMIT", 50)
+
+# 프롬프트/응답 형식이 바뀌면 값을 올려 기존 저장 결과를 무효화
+PERSONALIZED_FINGERPRINT_VERSION = "1"
+
+# fingerprint 계산에 사용하는 요구사항 필드 (learner_id 제외 → 학습자 간 동일 요구사항은 같은 값)
+FINGERPRINT_FIELDS = (
+    'assessment_item_id', 'knowledge_tag', 'grade', 'term', 'concept_name',
+    'chapter_name', 'difficulty_band', 'topic_name', 'unit_name'
+)
+
+
+def to_personalized_requirement(row):
+    """캐시 행을 개인화 생성용 요구사항 형태로 변환"""
+    return {
+        'learner_id': row['learner_id'],
+        'assessment_item_id': row['assessment_item_id'],
+        'knowledge_tag': row['knowledge_tag'],
+        'grade': row['grade'],
+        'term': row['term'],
+        'concept_name': row['concept_name'],
+        'chapter_name': row['chapter_name'],
+        'difficulty_band': row['difficulty_band'],
+        'topic_name': row['recommended_level'],
+        'unit_name': row['concept_name'],
+        'is_correct': row.get('is_correct')
+    }
 
 
 def get_learner_requirements(learner_id):
-    """특정 learnerID의 모든 요구사항 가져오기"""
-    try:
-        conn = get_sql_connection()
-        if not conn:
-            return None
-
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT
-                learnerID,
-                assessmentItemID,
-                knowledgeTag,
-                grade,
-                term,
-                concept_name,
-                chapter_name,
-                difficulty_band,
-                recommended_level as topic_name,
-                concept_name as unit_name
-            FROM gold.vw_personal_item_enriched
-            WHERE learnerID = ?
-            ORDER BY learnerID, assessmentItemID
-        """, (learner_id,))
-
-        results = cursor.fetchall()
-        conn.close()
-
-        if results:
-            return [
-                {
-                    'learner_id': result[0],
-                    'assessment_item_id': result[1],
-                    'knowledge_tag': result[2],
-                    'grade': result[3],
-                    'term': result[4],
-                    'concept_name': result[5],
-                    'chapter_name': result[6],
-                    'difficulty_band': result[7],
-                    'topic_name': result[8],
-                    'unit_name': result[9]
-                }
-                for result in results
-            ]
-        return []
+    """특정 learnerID의 모든 요구사항 가져오기 (학습자 캐시 사용)"""
+    rows = get_cached_learner_requirements(learner_id)
+    if rows is None:
+        logging.error(f"Error getting learner requirements: learnerID {learner_id}")
+        return None
 
-    except Exception as e:
-        logging.error(f"Error getting learner requirements: {str(e)}")
+    return [to_personalized_requirement(row) for row in rows]
+
+
+def compute_requirement_fingerprint(requirement):
+    """요구사항 행의 fingerprint 계산 (행 내용이 바뀌면 값이 바뀜)"""
+    payload = {field: requirement.get(field) for field in FINGERPRINT_FIELDS}
+    payload['_version'] = PERSONALIZED_FINGERPRINT_VERSION
+    encoded = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+    return sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def load_previous_generation(learner_id):
+    """learnerID의 마지막 생성 결과 조회 ({assessment_item_id: {fingerprint, question}})"""
+    state = load_state(PERSONALIZED_STATE_NAMESPACE, learner_id)
+    if not state:
+        return {}
+    return state.get('items', {})
+
+
+def save_generation(learner_id, items):
+    """learnerID의 생성 결과 저장 (현재 요구사항에 해당하는 항목만 유지)"""
+    return save_state(PERSONALIZED_STATE_NAMESPACE, learner_id, {
+        'learner_id': learner_id,
+        'updated_at': datetime.now().isoformat(),
+        'items': items
+    })
+
+
+def diff_requirements(requirements, previous_items):
+    """현재 요구사항을 이전 생성 결과와 비교하여 (재사용, 생성 필요) 목록으로 분리"""
+    reusable = []
+    pending = []
+    for requirement in requirements:
+        fingerprint = compute_requirement_fingerprint(requirement)
+        previous = previous_items.get(str(requirement['assessment_item_id']))
+        if previous and previous.get('fingerprint') == fingerprint and previous.get('question'):
+            reusable.append((requirement, fingerprint, previous['question']))
+        else:
+            pending.append((requirement, fingerprint))
+    return reusable, pending
+
+
+def generate_personalized_question(client, requirement, generated_problems):
+    """요구사항 1건에 대한 개인화 문제 생성 (실패 시 None)"""
+    # 해당 주제의 기존 문제들 가져오기 (참고용)
+    existing_questions = get_question_data("questions", requirement['topic_name'])
+
+    # 문제 생성 (기존 view_service와 동일한 로직)
+    question_data = generate_question_with_ai(
+        client,
+        requirement['grade'],
+        requirement['term'],
+        requirement['concept_name'],  # topic_name 대신 concept_name 사용
+        '선택형',  # 기본값, 필요시 파라미터화 가능
+        requirement['difficulty_band'],
+        existing_questions,
+        generated_problems
+    )
+
+    if not (question_data and validate_question_format(question_data, '선택형')):
         return None
 
+    question_id = generate_question_id()
+
+    # DB에서 미리 매핑된 concept_name 조회
+    recommended_concept = get_mapped_concept_name(requirement['concept_name'])
+    knowledge_tag = get_knowledge_tag_by_concept(recommended_concept) if recommended_concept else None
+
+    # DB 저장 준비 (현재 비활성화)
+    question_record = prepare_question_record(
+        question_id, requirement['grade'], requirement['term'], requirement['concept_name'],
+        '선택형', requirement['difficulty_band'], question_data
+    )
+    answer_record = prepare_answer_record(question_id, question_data)
+
+    return {
+        "id": question_id,
+        "learner_id": requirement['learner_id'],
+        "assessment_item_id": requirement['assessment_item_id'],
+        **question_data,
+        "metadata": {
+            "grade": requirement['grade'],
+            "term": requirement['term'],
+            "concept_name": requirement['concept_name'],
+            "chapter_name": requirement['chapter_name'],
+            "topic_name": requirement['topic_name'],
+            "unit_name": requirement['unit_name'],
+            "difficulty_band": requirement['difficulty_band'],
+            "knowledge_tag": requirement['knowledge_tag'],
+            "mapped_concept_name": recommended_concept,
+            "mapped_knowledge_tag": knowledge_tag
+        }
+    }
+
 
 def handle_personalized_generation(req):
-    """learnerID 기반 개인화 문제 생성 처리"""
+    """learnerID 기반 개인화 문제 생성 처리 (변경된 요구사항만 새로 생성)"""
     logging.info('Personalized question generation API called')
 
     try:
@@ -82,6 +176,26 @@ def handle_personalized_generation(req):
                 headers={"Content-Type": "application/json; charset=utf-8"}
             )
 
+        # refresh=true 이면 이전 생성 결과를 무시하고 전체 재생성
+        force_refresh = req.params.get('refresh', '').lower() in ('1', 'true', 'yes')
+
+        # limit: 이번 요청에서 생성할 상위 N개, cursor: 이전 응답의 next_cursor
+        limit = parse_page_size(req.params.get('limit'), DEFAULT_QUESTION_LIMIT, MAX_QUESTION_LIMIT)
+        cursor_param = req.params.get('cursor')
+        position = decode_cursor(cursor_param) if cursor_param else {'learner_id': learner_id, 'offset': 0}
+        offset = get_cursor_offset(position) if position else None
+        if limit is None or offset is None or position.get('learner_id') != learner_id:
+            response_data = create_error_response(
+                "Invalid limit or cursor parameter",
+                status_code=400,
+                message="limit must be an integer and cursor must come from a previous response for the same learnerID"
+            )
+            return func.HttpResponse(
+                json.dumps(response_data, ensure_ascii=False),
+                status_code=400,
+                headers={"Content-Type": "application/json; charset=utf-8"}
+            )
+
         # 해당 learnerID의 요구사항 가져오기
         requirements = get_learner_requirements(learner_id)
         if requirements is None:
@@ -106,87 +220,79 @@ def handle_personalized_generation(req):
                 headers={"Content-Type": "application/json; charset=utf-8"}
             )
 
-        print(f"[개인화 생성] learnerID: {learner_id}에 대한 문제 생성 시작 (총 {len(requirements)}개)")
+        # 우선순위 정렬 후 이번 페이지(상위 limit개)만 선택
+        selected, next_offset = select_requirements(requirements, limit, offset)
+        next_cursor = encode_cursor({'learner_id': learner_id, 'offset': next_offset}) if next_offset is not None else None
+
+        # 이전 생성 결과와 비교하여 추가/변경된 요구사항만 생성 대상으로 선정
+        previous_items = {} if force_refresh else load_previous_generation(learner_id)
+        reusable, pending = diff_requirements(selected, previous_items)
+
+        print(f"[개인화 생성] learnerID: {learner_id}에 대한 문제 생성 시작 (전체 {len(requirements)}개 중 {offset + 1}~{offset + len(selected)}순위 {len(selected)}개)")
+        print(f"   재사용: {len(reusable)}개 / 신규·변경: {len(pending)}개{' (refresh)' if force_refresh else ''}")
         print("=" * 80)
 
-        client = get_openai_client()
-        all_generated_questions = []
+        question_by_item = {}
 
-        # concept_name별로 생성된 문제들 추적 (중복 방지용)
-        concept_generated_problems = {}
+        # 다른 페이지에서 생성한 결과는 현재 요구사항에 남아 있는 한 유지
+        current_item_keys = set(str(requirement['assessment_item_id']) for requirement in requirements)
+        saved_items = {key: value for key, value in previous_items.items() if key in current_item_keys}
 
-        for req_idx, requirement in enumerate(requirements, 1):
-            print(f"\n[요구사항 {req_idx}/{len(requirements)}] learnerID: {requirement['learner_id']}, assessmentItemID: {requirement['assessment_item_id']}")
-            print(f"   {get_grade_international(requirement['grade'])} {requirement['term']}학기 - {requirement['concept_name']} (난이도: {requirement['difficulty_band']})")
+        # 변경 없는 요구사항은 이전 생성 결과 재사용
+        for requirement, fingerprint, question_result in reusable:
+            item_key = str(requirement['assessment_item_id'])
+            question_by_item[item_key] = question_result
+            saved_items[item_key] = {'fingerprint': fingerprint, 'question': question_result}
 
-            # 해당 주제의 기존 문제들 가져오기 (참고용)
-            existing_questions = get_question_data("questions", requirement['topic_name'])
-
-            # 해당 concept_name에서 이미 생성된 문제들 가져오기
-            concept_key = requirement['concept_name']
-            if concept_key not in concept_generated_problems:
-                concept_generated_problems[concept_key] = []
-
-            # 문제 생성 (기존 view_service와 동일한 로직)
-            question_data = generate_question_with_ai(
-                client,
-                requirement['grade'],
-                requirement['term'],
-                requirement['concept_name'],  # topic_name 대신 concept_name 사용
-                '선택형',  # 기본값, 필요시 파라미터화 가능
-                requirement['difficulty_band'],
-                existing_questions,
-                concept_generated_problems[concept_key]
-            )
-
-            if question_data and validate_question_format(question_data, '선택형'):
-                question_id = generate_question_id()
-
-                # DB에서 미리 매핑된 concept_name 조회
-                recommended_concept = get_mapped_concept_name(requirement['concept_name'])
-                knowledge_tag = get_knowledge_tag_by_concept(recommended_concept) if recommended_concept else None
-
-                # DB 저장 준비 (현재 비활성화)
-                question_record = prepare_question_record(
-                    question_id, requirement['grade'], requirement['term'], requirement['concept_name'],
-                    '선택형', requirement['difficulty_band'], question_data
-                )
-                answer_record = prepare_answer_record(question_id, question_data)
-
-                # 결과 추가
-                question_result = {
-                    "id": question_id,
-                    "learner_id": requirement['learner_id'],
-                    "assessment_item_id": requirement['assessment_item_id'],
-                    **question_data,
-                    "metadata": {
-                        "grade": requirement['grade'],
-                        "term": requirement['term'],
-                        "concept_name": requirement['concept_name'],
-                        "chapter_name": requirement['chapter_name'],
-                        "topic_name": requirement['topic_name'],
-                        "unit_name": requirement['unit_name'],
-                        "difficulty_band": requirement['difficulty_band'],
-                        "knowledge_tag": requirement['knowledge_tag'],
-                        "mapped_concept_name": recommended_concept,
-                        "mapped_knowledge_tag": knowledge_tag
-                    }
-                }
+        # concept_name별로 묶어 그룹 안에서는 순서대로, 그룹끼리는 병렬 생성 (재사용 문제도 중복 방지 목록에 포함)
+        concept_groups = {}
+        for requirement, _, question_result in reusable:
+            group = concept_groups.setdefault(requirement['concept_name'], {'tasks': [], 'known_problems': []})
+            group['known_problems'].append(question_result.get('question_text', '')[:100])
+        for requirement, fingerprint in pending:
+            group = concept_groups.setdefault(requirement['concept_name'], {'tasks': [], 'known_problems': []})
+            group['tasks'].append((fingerprint, requirement))
 
-                all_generated_questions.append(question_result)
+        generated_by_fingerprint = {}
+        groups_with_tasks = [group for group in concept_groups.values() if group['tasks']]
+        if groups_with_tasks:
+            client = get_openai_client()
+            for group_results in run_concurrently(lambda group: generate_concept_group(client, group), groups_with_tasks):
+                if group_results:
+                    generated_by_fingerprint.update(group_results)
 
-                # 생성된 문제를 추적 리스트에 추가
-                concept_generated_problems[concept_key].append(question_data['question_text'][:100])
+        generated_count = 0
+        for req_idx, (requirement, fingerprint) in enumerate(pending, 1):
+            print(f"\n[요구사항 {req_idx}/{len(pending)}] learnerID: {requirement['learner_id']}, assessmentItemID: {requirement['assessment_item_id']}")
+            print(f"   {get_grade_international(requirement['grade'])} {requirement['term']}학기 - {requirement['concept_name']} (난이도: {requirement['difficulty_band']})")
 
-                print(f"   [성공] {req_idx}/{len(requirements)} - {question_data['question_text'][:50]}...")
+            question_result = generated_by_fingerprint.get(fingerprint)
+
+            if question_result:
+                item_key = str(requirement['assessment_item_id'])
+                question_by_item[item_key] = question_result
+                saved_items[item_key] = {'fingerprint': fingerprint, 'question': question_result}
+                generated_count += 1
+
+                print(f"   [성공] {req_idx}/{len(pending)} - {question_result['question_text'][:50]}...")
                 print(f"          concept_name: {requirement['concept_name']}")
                 print(f"          knowledgeTag: {requirement['knowledge_tag']}")
                 print()
             else:
-                logging.warning(f"Question validation failed for learnerID {learner_id}, requirement {req_idx}")
+                logging.warning(f"Question validation failed for learnerID {learner_id}, requirement {requirement['assessment_item_id']}")
+
+        # 우선순위 순서대로 결과 정렬
+        all_generated_questions = [
+            question_by_item[str(requirement['assessment_item_id'])]
+            for requirement in selected
+            if str(requirement['assessment_item_id']) in question_by_item
+        ]
+
+        # 이번 결과 저장 (삭제된 요구사항은 제외됨)
+        save_generation(learner_id, saved_items)
 
         print("\n" + "=" * 80)
-        print(f"[개인화 생성 완료] learnerID: {learner_id}, 총 {len(all_generated_questions)}/{len(requirements)}개 문제")
+        print(f"[개인화 생성 완료] learnerID: {learner_id}, 총 {len(all_generated_questions)}/{len(selected)}개 문제 (신규 {generated_count}개, 재사용 {len(reusable)}개, 남은 요구사항 {max(0, len(requirements) - offset - len(selected))}개)")
         print("=" * 80)
 
         # 요약 정보 생성
@@ -194,14 +300,19 @@ def handle_personalized_generation(req):
             "learner_id": learner_id,
             "total_generated": len(all_generated_questions),
             "total_requirements": len(requirements),
-            "success_rate": round(len(all_generated_questions) / len(requirements) * 100, 1) if requirements else 0,
-            "concepts_covered": len(set(req['concept_name'] for req in requirements))
+            "selected_requirements": len(selected),
+            "remaining_requirements": max(0, len(requirements) - offset - len(selected)),
+            "newly_generated": generated_count,
+            "reused": len(reusable),
+            "success_rate": round(len(all_generated_questions) / len(selected) * 100, 1) if selected else 0,
+            "concepts_covered": len(set(req['concept_name'] for req in selected))
         }
 
         response_data = create_success_response({
             "success": True,
             "generated_questions": all_generated_questions,
             "summary": summary,
+            "next_cursor": next_cursor,
             "validation": {
                 "format_check": "passed",
                 "db_storage": "disabled_for_testing"
@@ -216,6 +327,237 @@ def handle_personalized_generation(req):
     except Exception as e:
         logging.error(f"Error in personalized generation: {str(e)}")
         response_data = create_error_response(f"Failed to generate personalized questions: {str(e)}", status_code=500)
+        return func.HttpResponse(
+            json.dumps(response_data, ensure_ascii=False),
+            status_code=500,
+            headers={"Content-Type": "application/json; charset=utf-8"}
+        )
+
+
+def parse_learner_ids(req):
+    """요청에서 learnerID 목록 추출 (POST JSON의 learnerIDs 배열 또는 learnerIDs=a,b,c)"""
+    learner_ids = None
+    if req.method == "POST":
+        try:
+            req_body = req.get_json()
+            if req_body and isinstance(req_body.get('learnerIDs'), list):
+                learner_ids = req_body['learnerIDs']
+        except ValueError:
+            learner_ids = None
+
+    if learner_ids is None:
+        learner_ids = (req.params.get('learnerIDs') or '').split(',')
+
+    # 빈 값 제거 및 순서를 유지한 중복 제거
+    return list(dict.fromkeys(str(learner_id).strip() for learner_id in learner_ids if str(learner_id).strip()))
+
+
+def generate_concept_group(client, group):
+    """같은 concept_name의 고유 요구사항들을 순서대로 생성 (그룹 내 중복 방지 목록 공유)"""
+    generated_problems = list(group['known_problems'])
+    results = {}
+    for fingerprint, requirement in group['tasks']:
+        question_result = generate_personalized_question(client, requirement, generated_problems)
+        results[fingerprint] = question_result
+        if question_result:
+            generated_problems.append(question_result['question_text'][:100])
+    return results
+
+
+def handle_personalized_batch_generation(req):
+    """여러 learnerID의 개인화 문제 일괄 생성 처리 (학습자 간 동일 요구사항은 1회만 생성)"""
+    logging.info('Personalized batch question generation API called')
+
+    try:
+        learner_ids = parse_learner_ids(req)
+        if not learner_ids:
+            response_data = create_error_response(
+                "learnerIDs parameter is required",
+                status_code=400,
+                example="?learnerIDs=A1,A2,A3 또는 POST {\"learnerIDs\": [\"A1\", \"A2\"]}"
+            )
+            return func.HttpResponse(
+                json.dumps(response_data, ensure_ascii=False),
+                status_code=400,
+                headers={"Content-Type": "application/json; charset=utf-8"}
+            )
+
+        if len(learner_ids) > MAX_BATCH_LEARNERS:
+            response_data = create_error_response(
+                f"Too many learnerIDs: {len(learner_ids)} (max {MAX_BATCH_LEARNERS})",
+                status_code=400
+            )
+            return func.HttpResponse(
+                json.dumps(response_data, ensure_ascii=False),
+                status_code=400,
+                headers={"Content-Type": "application/json; charset=utf-8"}
+            )
+
+        force_refresh = req.params.get('refresh', '').lower() in ('1', 'true', 'yes')
+
+        # limit: 학습자별로 생성할 상위 N개 (단일 학습자 API와 같은 기본값/상한)
+        limit = parse_page_size(req.params.get('limit'), DEFAULT_QUESTION_LIMIT, MAX_QUESTION_LIMIT)
+        if limit is None:
+            response_data = create_error_response(
+                "Invalid limit parameter",
+                status_code=400,
+                message="limit must be an integer"
+            )
+            return func.HttpResponse(
+                json.dumps(response_data, ensure_ascii=False),
+                status_code=400,
+                headers={"Content-Type": "application/json; charset=utf-8"}
+            )
+
+        # 전체 학습자의 요구사항을 한 번의 조회로 가져오기
+        rows_by_learner = warm_learner_requirements(learner_ids)
+        if rows_by_learner is None:
+            response_data = create_error_response(
+                "Failed to get learner requirements from database",
+                status_code=500
+            )
+            return func.HttpResponse(
+                json.dumps(response_data, ensure_ascii=False),
+                status_code=500,
+                headers={"Content-Type": "application/json; charset=utf-8"}
+            )
+
+        print(f"[개인화 일괄 생성] 학습자 {len(learner_ids)}명 문제 생성 시작")
+        print("=" * 80)
+
+        # 학습자별 재사용/생성 대상 분리 후, 생성 대상은 fingerprint 기준으로 학습자 간 중복 제거
+        learner_plans = {}
+        unique_tasks = {}
+        concept_groups = {}
+        for learner_id in learner_ids:
+            requirements = [to_personalized_requirement(row) for row in rows_by_learner.get(learner_id, [])]
+            previous_items = {} if force_refresh else load_previous_generation(learner_id)
+            # 학습자별 우선순위 정렬 후 상위 limit개만 생성 대상
+            selected, _ = select_requirements(requirements, limit)
+            reusable, pending = diff_requirements(selected, previous_items)
+            learner_plans[learner_id] = (requirements, selected, previous_items, reusable, pending)
+
+            for requirement, _, question_result in reusable:
+                group = concept_groups.setdefault(requirement['concept_name'], {'tasks': [], 'known_problems': []})
+                group['known_problems'].append(question_result.get('question_text', '')[:100])
+
+            for requirement, fingerprint in pending:
+                if fingerprint in unique_tasks:
+                    continue
+                unique_tasks[fingerprint] = requirement
+                group = concept_groups.setdefault(requirement['concept_name'], {'tasks': [], 'known_problems': []})
+                group['tasks'].append((fingerprint, requirement))
+
+        total_pending = sum(len(plan[4]) for plan in learner_plans.values())
+        print(f"   생성 대상: {total_pending}개 → 중복 제거 후 {len(unique_tasks)}개 (concept {len(concept_groups)}개 그룹 병렬 처리)")
+
+        # concept 그룹 단위 병렬 생성 (클라이언트 1개 공유)
+        generated_by_fingerprint = {}
+        groups_with_tasks = [group for group in concept_groups.values() if group['tasks']]
+        if groups_with_tasks:
+            client = get_openai_client()
+            for group_results in run_concurrently(lambda group: generate_concept_group(client, group), groups_with_tasks):
+                if group_results:
+                    generated_by_fingerprint.update(group_results)
+
+        # 학습자별 결과 조립 및 저장
+        results = {}
+        for learner_id in learner_ids:
+            requirements, selected, previous_items, reusable, pending = learner_plans[learner_id]
+            if not requirements:
+                results[learner_id] = {
+                    "success": False,
+                    "error": f"No data found for learnerID: {learner_id}",
+                    "generated_questions": []
+                }
+                continue
+
+            question_by_item = {}
+            # 이번에 선택되지 않은 요구사항의 이전 결과는 현재 요구사항에 남아 있는 한 유지
+            current_item_keys = set(str(requirement['assessment_item_id']) for requirement in requirements)
+            saved_items = {key: value for key, value in previous_items.items() if key in current_item_keys}
+            for requirement, fingerprint, question_result in reusable:
+                item_key = str(requirement['assessment_item_id'])
+                question_by_item[item_key] = question_result
+                saved_items[item_key] = {'fingerprint': fingerprint, 'question': question_result}
+
+            generated_count = 0
+            for requirement, fingerprint in pending:
+                shared_result = generated_by_fingerprint.get(fingerprint)
+                if not shared_result:
+                    continue
+                # 학습자 간 공유한 생성 결과를 학습자별 레코드로 복사 (문제 ID는 학습자마다 새로 발급)
+                question_result = {
+                    **shared_result,
+                    "id": generate_question_id(),
+                    "learner_id": requirement['learner_id'],
+                    "assessment_item_id": requirement['assessment_item_id'],
+                    "metadata": dict(shared_result.get('metadata') or {})
+                }
+                item_key = str(requirement['assessment_item_id'])
+                question_by_item[item_key] = question_result
+                saved_items[item_key] = {'fingerprint': fingerprint, 'question': question_result}
+                generated_count += 1
+
+            learner_questions = [
+                question_by_item[str(requirement['assessment_item_id'])]
+                for requirement in selected
+                if str(requirement['assessment_item_id']) in question_by_item
+            ]
+
+            save_generation(learner_id, saved_items)
+
+            results[learner_id] = {
+                "success": True,
+                "generated_questions": learner_questions,
+                "summary": {
+                    "learner_id": learner_id,
+                    "total_generated": len(learner_questions),
+                    "total_requirements": len(requirements),
+                    "selected_requirements": len(selected),
+                    "remaining_requirements": len(requirements) - len(selected),
+                    "newly_generated": generated_count,
+                    "reused": len(reusable),
+                    "success_rate": round(len(learner_questions) / len(selected) * 100, 1) if selected else 0,
+                    "concepts_covered": len(set(req['concept_name'] for req in selected))
+                }
+            }
+            print(f"   [학습자] {learner_id}: {len(learner_questions)}/{len(selected)}개 (전체 요구사항 {len(requirements)}개, 신규 {generated_count}개, 재사용 {len(reusable)}개)")
+
+        unique_generated = sum(1 for question_result in generated_by_fingerprint.values() if question_result)
+
+        print("\n" + "=" * 80)
+        print(f"[개인화 일괄 생성 완료] 학습자 {len(learner_ids)}명, AI 생성 {unique_generated}/{len(unique_tasks)}개")
+        print("=" * 80)
+
+        summary = {
+            "learners_requested": len(learner_ids),
+            "learners_with_data": sum(1 for result in results.values() if result['success']),
+            "total_requirements": sum(len(plan[0]) for plan in learner_plans.values()),
+            "pending_requirements": total_pending,
+            "unique_generations": len(unique_tasks),
+            "generated": unique_generated,
+            "deduplicated": total_pending - len(unique_tasks)
+        }
+
+        response_data = create_success_response({
+            "success": True,
+            "results": results,
+            "summary": summary,
+            "validation": {
+                "format_check": "passed",
+                "db_storage": "disabled_for_testing"
+            }
+        })
+        return func.HttpResponse(
+            json.dumps(response_data, ensure_ascii=False),
+            status_code=200,
+            headers={"Content-Type": "application/json; charset=utf-8"}
+        )
+
+    except Exception as e:
+        logging.error(f"Error in personalized batch generation: {str(e)}")
+        response_data = create_error_response(f"Failed to generate personalized batch questions: {str(e)}", status_code=500)
         return func.HttpResponse(
             json.dumps(response_data, ensure_ascii=False),
             status_code=500,
@@ -31,9 +31,10 @@ def handle_create_question(req):
 
         # 문제 생성 루프
         for i in range(params['count']):
+            # 대화형 요청이므로 응답이 늦으면 헤징 (LLM_HEDGE_ENABLED)
             question_data = generate_question_with_ai(
                 client, params['grade'], params['term'], params['topic_name'],
-                params['question_type'], params['difficulty'], existing_questions
+                params['question_type'], params['difficulty'], existing_questions, hedge=True
             )
 
             if question_data and validate_question_format(question_data, params['question_type']):
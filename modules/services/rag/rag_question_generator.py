@@ -8,8 +8,108 @@ import logging
 import json
 import re
 from ...core.ai_service import get_openai_client
+from ...core.llm_gateway import hedged_chat_completion
+from ...core.llm_routes import resolve_route
+from ...core.structured_output import (
+    RAG_QUESTIONS_SCHEMA, build_response_format, load_structured_json, restore_latex_escapes, record_parse_path
+)
 from .rag_utils import RAGUtils
 
+# SVG가 필요한 경우의 지침
+RAG_SVG_INSTRUCTIONS_REQUIRED = """
+
+🔴 **SVG 필수 생성**: 이 개념들은 도형/그래프 관련이므로 SVG가 반드시 필요합니다!
+
+**문제-그림 완벽 일치 원칙**:
+1. 문제에서 언급하는 모든 점, 변, 각을 SVG에 정확히 표시
+2. 문제에서 사용하는 기호/이름을 SVG에 동일하게 라벨링
+3. 문제에서 주어진 수치나 각도를 SVG에 반드시 표시
+4. 문제 상황과 100% 일치하는 도형/그래프 그리기
+
+**구체적 지침**:
+- 점: 문제에서 "점 A, B, C"라고 하면 SVG에서 정확히 A, B, C로 라벨링
+- 각: 문제에서 "∠A, ∠B"라고 하면 SVG에서 해당 각에 각도 표시선과 라벨
+- 변: 문제에서 "변 AB"라고 하면 SVG에서 AB 변을 명확히 표시
+- 수치: 문제에서 "5cm, 60°"라고 하면 SVG에서 해당 위치에 수치 표시
+
+다음 유형에 맞는 SVG를 생성하세요:
+- 도형: 삼각형, 사각형, 원 등의 정확한 도형 그리기
+- 그래프: 좌표평면, 함수 그래프, 직선/곡선
+- 통계: 막대그래프, 원그래프, 히스토그램
+- 기하: 각도, 길이, 넓이 표시
+
+SVG 사양 (태블릿 최적화):
+- 뷰박스 사용: viewBox='0 0 400 300' width='100%' height='auto'
+- 스타일: 검은색 선(stroke='#000' stroke-width='2'), 회색 채우기(fill='#f0f0f0')
+- 텍스트: font-family='Arial' font-size='16' (태블릿용 크기)
+- 격자, 축, 수치, 라벨 명확히 표시
+
+🔴 **중요**: SVG 속성값에는 반드시 단일 인용부호(')를 사용하세요!
+
+**각도 표현 규칙**:
+- 각도를 시각적으로 그리지 마세요 (호나 부채꼴 금지)
+- 대신 각의 꼭짓점과 두 변만 그리고 알파벳으로 표시
+- 예: ∠ABC는 점 A, B, C만 표시하고 "∠ABC" 텍스트 라벨 사용
+
+**절대 금지**: svg_content를 null로 설정하지 마세요!
+**필수**: 문제 내용과 완벽히 일치하는 그림만 생성하세요!
+"""
+
+# SVG가 선택적인 경우의 지침
+RAG_SVG_INSTRUCTIONS_OPTIONAL = """
+
+SVG 생성 판단:
+- 순수 계산/대수 문제: svg_content를 null로 설정
+- 시각적 요소가 조금이라도 있으면: SVG 생성
+
+SVG 사양 (필요한 경우):
+- 뷰박스 사용: viewBox='0 0 300 200' width='100%' height='auto'
+- 스타일: 검은색 선(stroke='#000' stroke-width='2'), 회색 채우기(fill='#f0f0f0')
+- 텍스트: font-family='Arial' font-size='14'
+
+🔴 **중요**: SVG 속성값에는 반드시 단일 인용부호(')를 사용하세요!
+"""
+
+
+def _build_rag_system_prompt(svg_instructions):
+    """RAG 전용 시스템 프롬프트 (요청마다 바뀌는 값 없음 → 프롬프트 캐시 대상 접두부)"""
+    return """당신은 한국 중학교 수학 문제 생성 전문가입니다.
+주어진 불변 목록의 각 행에 대해 정확히 1문항씩 생성해야 합니다.
+
+절대 준수 규칙:
+1. 모든 문제는 반드시 객관식 4지 선택형으로 생성 (①②③④)
+2. assessmentItemID와 concept_name은 입력과 동일해야 하며, 절대 변경하지 마세요
+3. 각 개념의 범위를 벗어나는 지식은 사용하지 마세요
+4. 근거가 부족한 경우 해당 행은 "skip": true로 표시하세요
+5. 한국어로 작성하고, 필요시 LaTeX를 사용하세요
+6. 서술형, 단답형, 빈칸형 등은 절대 생성하지 마세요 - 오직 객관식만!
+
+""" + svg_instructions + """
+
+JSON 출력 형식:
+{
+  "questions": [
+    {
+      "assessmentItemID": "입력과 동일한 ID",
+      "concept_name": "입력과 동일한 개념명",
+      "question_text": "문제 내용",
+      "choices": ["① ...", "② ...", "③ ...", "④ ..."],
+      "answer": "①",
+      "explanation": "풀이 설명",
+      "svg_content": "SVG 코드 또는 null",
+      "skip": false
+    }
+  ]
+}
+"""
+
+
+# SVG 필요 여부별 시스템 프롬프트 (import 시 1회 생성, 호출 간 바이트 단위로 동일)
+RAG_SYSTEM_PROMPTS = {
+    True: _build_rag_system_prompt(RAG_SVG_INSTRUCTIONS_REQUIRED),
+    False: _build_rag_system_prompt(RAG_SVG_INSTRUCTIONS_OPTIONAL)
+}
+
 
 class RAGQuestionGenerator:
     """RAG 방식으로 AI 문제를 생성하는 클래스"""
@@ -45,141 +145,66 @@ class RAGQuestionGenerator:
             # 프롬프트 생성
             system_prompt, user_prompt = self._create_prompts(context_block, assessment_items, requires_svg)
 
-            # AI 호출
+            # AI 호출 (헤징 사용 시 먼저 파싱에 성공한 응답 사용)
             print(f"      [AI생성] GPT-4 모델 호출 중...")
-            response = client.chat.completions.create(
-                model="gpt-4o-create_question",
-                messages=[
+
+            def parse_response(response):
+                ai_response = response.choices[0].message.content.strip()
+                print(f"      [AI생성] AI 응답 수신 완료 (길이: {len(ai_response)} 문자)")
+
+                # JSON 파싱 및 문제 처리
+                return self._parse_and_process_questions(ai_response, assessment_items)
+
+            # 문제 배열 스키마로 구조화 출력 요청 (미지원 배포는 게이트웨이가 낮춰 요청)
+            response_format = build_response_format("rag_questions", RAG_QUESTIONS_SCHEMA)
+
+            return hedged_chat_completion(
+                client,
+                [
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_prompt}
                 ],
-                temperature=0.7,
-                max_tokens=4000
+                max_tokens=None,
+                validator=parse_response,
+                task="rag",
+                route=resolve_route("rag", requires_svg=requires_svg, item_count=len(assessment_items)),
+                **({"response_format": response_format} if response_format else {})
             )
 
-            ai_response = response.choices[0].message.content.strip()
-            print(f"      [AI생성] AI 응답 수신 완료 (길이: {len(ai_response)} 문자)")
-
-            # JSON 파싱 및 문제 처리
-            return self._parse_and_process_questions(ai_response, assessment_items)
-
         except Exception as e:
             self.logger.error(f"Error generating RAG questions with AI: {str(e)}")
             print(f"      [AI생성] 전체 프로세스 오류: {str(e)}")
             return None
 
     def _create_prompts(self, context_block, assessment_items, requires_svg):
-        """AI용 프롬프트 생성"""
+        """AI용 프롬프트 생성 (고정 지침은 시스템 프롬프트, 요청별 불변 목록은 사용자 프롬프트 마지막에)"""
         print(f"      [프롬프트] SVG 필요 여부: {requires_svg}")
 
-        # SVG 관련 지침
-        if requires_svg:
-            svg_instructions = self._get_svg_instructions_required()
-        else:
-            svg_instructions = self._get_svg_instructions_optional()
-
-        # RAG 전용 시스템 프롬프트
-        system_prompt = f"""당신은 한국 중학교 수학 문제 생성 전문가입니다.
-주어진 불변 목록의 각 행에 대해 정확히 1문항씩 생성해야 합니다.
-
-절대 준수 규칙:
-1. 모든 문제는 반드시 객관식 4지 선택형으로 생성 (①②③④)
-2. assessmentItemID와 concept_name은 입력과 동일해야 하며, 절대 변경하지 마세요
-3. 각 개념의 범위를 벗어나는 지식은 사용하지 마세요
-4. 근거가 부족한 경우 해당 행은 "skip": true로 표시하세요
-5. 한국어로 작성하고, 필요시 LaTeX를 사용하세요
-6. 서술형, 단답형, 빈칸형 등은 절대 생성하지 마세요 - 오직 객관식만!
-
-{svg_instructions}
-
-JSON 출력 형식:
-[
-  {{
-    "assessmentItemID": "입력과 동일한 ID",
-    "concept_name": "입력과 동일한 개념명",
-    "question_text": "문제 내용",
-    "choices": ["① ...", "② ...", "③ ...", "④ ..."],
-    "answer": "①",
-    "explanation": "풀이 설명",
-    "svg_content": "SVG 코드 또는 null",
-    "skip": false
-  }}
-]
-"""
-
-        user_prompt = f"""다음 불변 목록을 기반으로 문제를 생성해주세요:
+        # RAG 전용 시스템 프롬프트 (캐시 가능한 고정 접두부)
+        system_prompt = RAG_SYSTEM_PROMPTS[bool(requires_svg)]
 
-{context_block}
+        user_prompt = f"""각 행에 대해 정확히 1문항씩, 총 {len(assessment_items)}개의 문제를 questions 배열에 담아 JSON으로 반환해주세요.
+다음 불변 목록을 기반으로 문제를 생성해주세요:
 
-각 행에 대해 정확히 1문항씩, 총 {len(assessment_items)}개의 문제를 JSON 배열로 반환해주세요."""
+{context_block}"""
 
         print(f"      [프롬프트] 시스템 프롬프트 길이: {len(system_prompt)} 문자")
         print(f"      [프롬프트] 사용자 프롬프트 길이: {len(user_prompt)} 문자")
 
         return system_prompt, user_prompt
 
-    def _get_svg_instructions_required(self):
-        """SVG가 필요한 경우의 지침"""
-        return """
-
-🔴 **SVG 필수 생성**: 이 개념들은 도형/그래프 관련이므로 SVG가 반드시 필요합니다!
-
-**문제-그림 완벽 일치 원칙**:
-1. 문제에서 언급하는 모든 점, 변, 각을 SVG에 정확히 표시
-2. 문제에서 사용하는 기호/이름을 SVG에 동일하게 라벨링
-3. 문제에서 주어진 수치나 각도를 SVG에 반드시 표시
-4. 문제 상황과 100% 일치하는 도형/그래프 그리기
-
-**구체적 지침**:
-- 점: 문제에서 "점 A, B, C"라고 하면 SVG에서 정확히 A, B, C로 라벨링
-- 각: 문제에서 "∠A, ∠B"라고 하면 SVG에서 해당 각에 각도 표시선과 라벨
-- 변: 문제에서 "변 AB"라고 하면 SVG에서 AB 변을 명확히 표시
-- 수치: 문제에서 "5cm, 60°"라고 하면 SVG에서 해당 위치에 수치 표시
-
-다음 유형에 맞는 SVG를 생성하세요:
-- 도형: 삼각형, 사각형, 원 등의 정확한 도형 그리기
-- 그래프: 좌표평면, 함수 그래프, 직선/곡선
-- 통계: 막대그래프, 원그래프, 히스토그램
-- 기하: 각도, 길이, 넓이 표시
-
-SVG 사양 (태블릿 최적화):
-- 뷰박스 사용: viewBox='0 0 400 300' width='100%' height='auto'
-- 스타일: 검은색 선(stroke='#000' stroke-width='2'), 회색 채우기(fill='#f0f0f0')
-- 텍스트: font-family='Arial' font-size='16' (태블릿용 크기)
-- 격자, 축, 수치, 라벨 명확히 표시
-
-🔴 **중요**: SVG 속성값에는 반드시 단일 인용부호(')를 사용하세요!
-
-**각도 표현 규칙**:
-- 각도를 시각적으로 그리지 마세요 (호나 부채꼴 금지)
-- 대신 각의 꼭짓점과 두 변만 그리고 알파벳으로 표시
-- 예: ∠ABC는 점 A, B, C만 표시하고 "∠ABC" 텍스트 라벨 사용
-
-**절대 금지**: svg_content를 null로 설정하지 마세요!
-**필수**: 문제 내용과 완벽히 일치하는 그림만 생성하세요!
-"""
-
-    def _get_svg_instructions_optional(self):
-        """SVG가 선택적인 경우의 지침"""
-        return """
-
-SVG 생성 판단:
-- 순수 계산/대수 문제: svg_content를 null로 설정
-- 시각적 요소가 조금이라도 있으면: SVG 생성
-
-SVG 사양 (필요한 경우):
-- 뷰박스 사용: viewBox='0 0 300 200' width='100%' height='auto'
-- 스타일: 검은색 선(stroke='#000' stroke-width='2'), 회색 채우기(fill='#f0f0f0')
-- 텍스트: font-family='Arial' font-size='14'
-
-🔴 **중요**: SVG 속성값에는 반드시 단일 인용부호(')를 사용하세요!
-"""
-
     def _parse_and_process_questions(self, ai_response, assessment_items):
         """AI 응답 파싱 및 문제 후처리"""
         try:
             print(f"      [파싱] JSON 파싱 시작...")
 
+            # 구조화 출력 응답이면 보정 없이 바로 사용
+            structured = self._unwrap_questions(load_structured_json(ai_response))
+            if structured is not None:
+                record_parse_path("rag", "direct")
+                print(f"      [파싱] 구조화 출력 파싱 성공: {len(structured)}개 문제")
+                return self._post_process_questions(restore_latex_escapes(structured), assessment_items)
+
             # 코드 블록 제거
             if "```json" in ai_response:
                 ai_response = ai_response.split("```json")[1].split("```")[0].strip()
@@ -198,12 +223,16 @@ SVG 사양 (필요한 경우):
                 # 백업 파싱 시도
                 parsed_questions = self._backup_parse(safe_json_content, str(e))
                 if not parsed_questions:
+                    record_parse_path("rag", "failed")
                     return None
                 print(f"      [파싱] 백업 파싱 성공: {len(parsed_questions)}개 문제")
 
-            if not isinstance(parsed_questions, list):
+            parsed_questions = self._unwrap_questions(parsed_questions)
+            if parsed_questions is None:
                 print(f"      [파싱] 오류: AI 응답이 리스트 형식이 아님")
+                record_parse_path("rag", "failed")
                 return None
+            record_parse_path("rag", "repaired")
 
             # 문제 후처리
             return self._post_process_questions(parsed_questions, assessment_items)
@@ -213,6 +242,12 @@ SVG 사양 (필요한 경우):
             print(f"      [파싱] 파싱 중 오류: {str(e)}")
             return None
 
+    def _unwrap_questions(self, parsed):
+        """문제 리스트 추출 ({"questions": [...]} 또는 리스트, 그 외는 None)"""
+        if isinstance(parsed, dict):
+            parsed = parsed.get('questions')
+        return parsed if isinstance(parsed, list) else None
+
     def _fix_json_content(self, content):
         """JSON 내용 안전 처리 (LaTeX, SVG 등)"""
         print(f"      [수정] JSON 안전 처리 시작...")
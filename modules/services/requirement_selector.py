@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+개인화 요구사항 우선순위 선정
+학습자의 개념별 정답률, difficulty_band, recommended_level, 개념 커버리지를 기준으로
+요구사항을 정렬하고 상위 N개만 생성 대상으로 선택
+"""
+from collections import defaultdict
+
+# 난이도 순서 (하 → 중 → 상)
+DIFFICULTY_ORDER = {'하': 0, '중': 1, '상': 2}
+
+# 정답률을 모를 때 사용하는 기본값
+DEFAULT_ACCURACY = 0.5
+
+
+def _to_band(value):
+    """난이도 값(하/중/상 또는 1/2/3)을 하/중/상으로 변환 (알 수 없으면 None)"""
+    if value is None:
+        return None
+    text = str(value).strip()
+    if text in DIFFICULTY_ORDER:
+        return text
+    numeric_map = {'1': '하', '2': '중', '3': '상'}
+    return numeric_map.get(text)
+
+
+def calculate_concept_accuracy(requirements):
+    """concept_name별 학습자 정답률 계산 (is_correct 값이 없는 행은 제외)"""
+    totals = defaultdict(lambda: [0.0, 0])
+    for requirement in requirements:
+        is_correct = requirement.get('is_correct')
+        if is_correct is None:
+            continue
+        try:
+            totals[requirement['concept_name']][0] += float(is_correct)
+            totals[requirement['concept_name']][1] += 1
+        except (ValueError, TypeError):
+            continue
+    return {concept: correct / count for concept, (correct, count) in totals.items() if count}
+
+
+def target_band_for_accuracy(accuracy):
+    """정답률에 맞는 목표 난이도 (낮을수록 쉬운 문제부터)"""
+    if accuracy < 0.4:
+        return '하'
+    if accuracy < 0.7:
+        return '중'
+    return '상'
+
+
+def score_requirement(requirement, concept_accuracy):
+    """요구사항 우선순위 점수 (높을수록 먼저 생성)"""
+    accuracy = concept_accuracy.get(requirement['concept_name'], DEFAULT_ACCURACY)
+
+    # 1. 취약도: 정답률이 낮은 개념일수록 우선
+    weakness = 1.0 - accuracy
+
+    # 2. 난이도 적합도: recommended_level이 있으면 그 수준, 없으면 정답률 기반 목표 난이도와 비교
+    target_band = _to_band(requirement.get('recommended_level')) or target_band_for_accuracy(accuracy)
+    band = _to_band(requirement.get('difficulty_band'))
+    if band is None:
+        difficulty_fit = 0.5
+    else:
+        difficulty_fit = 1.0 - abs(DIFFICULTY_ORDER[band] - DIFFICULTY_ORDER[target_band]) / 2.0
+
+    return weakness * 2.0 + difficulty_fit
+
+
+def rank_requirements(requirements):
+    """
+    요구사항 우선순위 정렬
+
+    개념 커버리지를 위해 개념별 1순위 항목들이 먼저 오고(라운드 로빈),
+    같은 순번 안에서는 점수가 높은 순, 동점이면 assessmentItemID 순으로 정렬
+    """
+    concept_accuracy = calculate_concept_accuracy(requirements)
+
+    scored = sorted(
+        requirements,
+        key=lambda requirement: (-score_requirement(requirement, concept_accuracy), str(requirement['assessment_item_id']))
+    )
+
+    # 개념 내 순번 부여 (같은 개념의 두 번째 항목은 모든 개념의 첫 항목 뒤로)
+    concept_rank = defaultdict(int)
+    ranked = []
+    for order, requirement in enumerate(scored):
+        ranked.append((concept_rank[requirement['concept_name']], order, requirement))
+        concept_rank[requirement['concept_name']] += 1
+
+    ranked.sort(key=lambda entry: (entry[0], entry[1]))
+    return [requirement for _, _, requirement in ranked]
+
+
+def select_requirements(requirements, limit, offset=0):
+    """정렬된 요구사항 중 offset부터 limit개 선택 (선택 목록, 다음 offset 또는 None)"""
+    ranked = rank_requirements(requirements)
+    selected = ranked[offset:offset + limit]
+    next_offset = offset + limit if offset + limit < len(ranked) else None
+    return selected, next_offset
@@ -4,142 +4,105 @@
 """
 import logging
 import json
+from datetime import datetime
 import azure.functions as func
 from ..core.database import get_sql_connection, get_question_data, get_mapped_concept_name, get_knowledge_tag_by_concept
 from ..core.ai_service import get_openai_client, generate_question_with_ai
 from ..core.validation import validate_question_format, prepare_question_record, prepare_answer_record
-from ..core.utils import generate_question_id
+from ..core.utils import generate_question_id, env_int
 from ..core.responses import create_success_response, create_error_response
+from ..core.learner_cache import get_cached_learner_requirements, decode_requirement_row, REQUIREMENT_COLUMNS
+from ..core.pagination import encode_cursor, decode_cursor, parse_page_size
+from ..core.state_store import load_state, save_state, delete_state
+from ..core.concurrency import run_concurrently
 
+# 페이지 크기 (page_size 파라미터 기본값/상한)
+DEFAULT_VIEW_PAGE_SIZE = env_int("VIEW_DEFAULT_PAGE_SIZE", 5)
+MAX_VIEW_PAGE_SIZE = env_int("VIEW_MAX_PAGE_SIZE", 50)
 
-def get_sample_learner_requirements(limit=5):
-    """vw_personal_item_enriched에서 샘플 학습자 요구사항 가져오기 (bulk_generate 스타일)"""
+# resume 모드 커서 저장 위치
+VIEW_CURSOR_NAMESPACE = "view_cursor"
+VIEW_CURSOR_KEY = "create_by_view"
+
+
+def get_sample_learner_requirements(limit=5, after=None):
+    """
+    vw_personal_item_enriched에서 학습자 요구사항 페이지 가져오기 (bulk_generate 스타일)
+
+    after가 주어지면 (learnerID, assessmentItemID) 키셋 이후의 행부터 조회 (OFFSET 스캔 없음)
+    반환: 요구사항 리스트 (더 이상 행이 없으면 빈 리스트), 오류 시 None
+    """
     try:
         conn = get_sql_connection()
         if not conn:
             return None
 
         cursor = conn.cursor()
-        cursor.execute(f"""
-            SELECT TOP {limit}
-                learnerID,
-                assessmentItemID,
-                knowledgeTag,
-                grade,
-                term,
-                concept_name,
-                chapter_name,
-                difficulty_band,
-                recommended_level
-            FROM gold.vw_personal_item_enriched
-            ORDER BY learnerID, assessmentItemID
-        """)
+        if after:
+            cursor.execute(f"""
+                SELECT TOP (?) {REQUIREMENT_COLUMNS}
+                FROM gold.vw_personal_item_enriched
+                WHERE learnerID > ?
+                   OR (learnerID = ? AND assessmentItemID > ?)
+                ORDER BY learnerID, assessmentItemID
+            """, (limit, after['learner_id'], after['learner_id'], after['assessment_item_id']))
+        else:
+            cursor.execute(f"""
+                SELECT TOP (?) {REQUIREMENT_COLUMNS}
+                FROM gold.vw_personal_item_enriched
+                ORDER BY learnerID, assessmentItemID
+            """, (limit,))
         results = cursor.fetchall()
         conn.close()
 
-        if results:
-            def safe_decode(value):
-                """안전한 문자열 디코딩"""
-                if value is None:
-                    return None
-                if isinstance(value, bytes):
-                    try:
-                        return value.decode('utf-8')
-                    except UnicodeDecodeError:
-                        try:
-                            return value.decode('cp949')
-                        except UnicodeDecodeError:
-                            return value.decode('utf-8', errors='ignore')
-                return str(value)
-
-            return [
-                {
-                    'learner_id': result[0],
-                    'assessment_item_id': result[1],
-                    'knowledge_tag': safe_decode(result[2]),
-                    'grade': result[3],
-                    'term': result[4],
-                    'concept_name': safe_decode(result[5]),
-                    'chapter_name': safe_decode(result[6]),
-                    'difficulty_band': safe_decode(result[7]),
-                    'recommended_level': result[8]
-                }
-                for result in results
-            ]
-        return None
+        return [decode_requirement_row(result) for result in results]
 
     except Exception as e:
         logging.error(f"Error getting sample learner requirements: {str(e)}")
         return None
 
 
-def get_learner_requirements(learner_id):
-    """vw_personal_item_enriched에서 학습자별 문제 요구사항 조회"""
-    try:
-        conn = get_sql_connection()
-        if not conn:
-            logging.error("DB 연결 실패")
-            return []
+def is_valid_position(after):
+    """키셋 위치에 learner_id와 assessment_item_id가 모두 있는지 여부 (클라이언트 커서/저장 상태 검증)"""
+    return (
+        isinstance(after, dict)
+        and after.get('learner_id') is not None
+        and after.get('assessment_item_id') is not None
+    )
 
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT
-                learnerID,
-                assessmentItemID,
-                knowledgeTag,
-                grade,
-                term,
-                concept_name,
-                chapter_name,
-                difficulty_band,
-                recommended_level
-            FROM gold.vw_personal_item_enriched
-            WHERE learnerID = ?
-            ORDER BY assessmentItemID
-        """, learner_id)
 
-        results = cursor.fetchall()
-        conn.close()
+def load_resume_position():
+    """resume 모드에서 저장된 다음 페이지 시작 위치 조회"""
+    state = load_state(VIEW_CURSOR_NAMESPACE, VIEW_CURSOR_KEY)
+    return state.get('after') if state else None
 
-        if results:
-            def safe_decode(value):
-                """안전한 문자열 디코딩"""
-                if value is None:
-                    return None
-                if isinstance(value, bytes):
-                    try:
-                        return value.decode('utf-8')
-                    except UnicodeDecodeError:
-                        try:
-                            return value.decode('cp949')
-                        except UnicodeDecodeError:
-                            return value.decode('utf-8', errors='ignore')
-                return str(value)
-
-            requirements = []
-            for row in results:
-                requirements.append({
-                    'learner_id': row[0],
-                    'assessment_item_id': row[1],
-                    'knowledge_tag': safe_decode(row[2]),
-                    'grade': row[3],
-                    'term': row[4],
-                    'concept_name': safe_decode(row[5]),
-                    'chapter_name': safe_decode(row[6]),
-                    'difficulty_band': safe_decode(row[7]),
-                    'recommended_level': row[8]
-                })
-
-            logging.info(f"learnerID {learner_id}: {len(requirements)}개 요구사항 조회")
-            return requirements
-        else:
-            logging.warning(f"learnerID {learner_id}에 대한 데이터 없음")
-            return []
 
-    except Exception as e:
-        logging.error(f"학습자 요구사항 조회 실패: {str(e)}")
+def save_resume_position(after):
+    """resume 모드의 다음 페이지 시작 위치 저장 (None이면 처음부터 다시 시작)"""
+    if after is None:
+        delete_state(VIEW_CURSOR_NAMESPACE, VIEW_CURSOR_KEY)
+        return
+    save_state(VIEW_CURSOR_NAMESPACE, VIEW_CURSOR_KEY, {
+        'after': after,
+        'updated_at': datetime.now().isoformat()
+    })
+
+
+def get_learner_requirements(learner_id):
+    """vw_personal_item_enriched에서 학습자별 문제 요구사항 조회 (학습자 캐시 사용)"""
+    rows = get_cached_learner_requirements(learner_id)
+    if rows is None:
+        logging.error(f"학습자 요구사항 조회 실패: learnerID {learner_id}")
+        return []
+
+    if not rows:
+        logging.warning(f"learnerID {learner_id}에 대한 데이터 없음")
         return []
 
+    requirements = [dict(row) for row in rows]
+    logging.info(f"learnerID {learner_id}: {len(requirements)}개 요구사항 조회")
+    return requirements
+
 
 def generate_question_from_requirement(requirement, client):
     """요구사항 기반 문제 생성"""
@@ -182,14 +145,107 @@ def generate_question_from_requirement(requirement, client):
         return None
 
 
+def generate_view_concept_group(client, group, total):
+    """같은 concept_name의 요구사항들을 순서대로 생성 → {요구사항 번호: 결과} (그룹 내 중복 방지 목록 공유)"""
+    from ..core.utils import get_grade_international
+
+    concept_name = group[0][1]['concept_name']
+    generated_problems_for_concept = []
+    results = {}
+
+    # 해당 주제의 기존 문제들 가져오기 (참고용, 그룹당 1회)
+    existing_questions = get_question_data("questions", concept_name)
+
+    for req_idx, requirement in group:
+        print(f"\n[요구사항 {req_idx}/{total}] learnerID: {requirement['learner_id']}, assessmentItemID: {requirement['assessment_item_id']}")
+        print(f"   {get_grade_international(requirement['grade'])} {requirement['term']}학기 - {concept_name} (난이도: {requirement['difficulty_band']})")
+        print(f"   📝 {concept_name}: 이미 생성된 문제 {len(generated_problems_for_concept)}개")
+
+        question_data = generate_question_with_ai(
+            client, requirement['grade'], requirement['term'], concept_name,
+            "선택형", requirement['difficulty_band'], existing_questions, generated_problems_for_concept
+        )
+
+        if not (question_data and validate_question_format(question_data, "선택형")):
+            print(f"   [실패] {req_idx}/{total} - Question validation failed")
+            continue
+
+        # DB에서 미리 매핑된 concept_name 조회
+        recommended_concept = get_mapped_concept_name(concept_name)
+        knowledge_tag = get_knowledge_tag_by_concept(recommended_concept) if recommended_concept else requirement['knowledge_tag']
+
+        # DB 저장 준비 (현재 비활성화)
+        question_record = prepare_question_record(
+            requirement['assessment_item_id'], requirement['grade'], requirement['term'], concept_name,
+            "선택형", requirement['difficulty_band'], question_data
+        )
+        answer_record = prepare_answer_record(requirement['assessment_item_id'], question_data)
+
+        results[req_idx] = {
+            "assessmentItemID": requirement['assessment_item_id'],  # assessmentItemID 사용
+            **question_data,
+            "metadata": {
+                "assessment_item_id": requirement['assessment_item_id'],
+                "knowledge_tag": requirement['knowledge_tag'],
+                "grade": requirement['grade'],
+                "term": requirement['term'],
+                "concept_name": concept_name,
+                "chapter_name": requirement['chapter_name'],
+                "difficulty_band": requirement['difficulty_band'],
+                "recommended_level": requirement['recommended_level'],
+                "source": "vw_personal_item_enriched",
+                "learner_id": requirement['learner_id'],
+                "question_number": req_idx,
+                "mapped_concept_name": recommended_concept,
+                "mapped_knowledge_tag": knowledge_tag
+            }
+        }
+
+        # 생성된 문제를 중복 방지 리스트에 추가
+        generated_problems_for_concept.append(question_data['question_text'][:100])
+
+        print(f"   [성공] {req_idx}/{total} - {question_data['question_text'][:50]}...")
+        print(f"          원본 concept_name: {concept_name}")
+        print(f"          매핑된 concept_name: {recommended_concept or '매핑없음'}")
+        print(f"          knowledgeTag: {requirement['knowledge_tag']}")
+        print(f"   🔄 {concept_name}: 누적 생성 문제 {len(generated_problems_for_concept)}개")
+        print()
+
+    return results
+
+
 def handle_view_generation(req):
     """뷰 기반 개인화 문제 생성 처리 (bulk_generate와 완전 동일)"""
     logging.info('View-based personalized question generation API called')
 
     try:
-        # 샘플 학습자 요구사항 가져오기 (bulk_generate처럼 자동으로)
-        requirements = get_sample_learner_requirements(5)
-        if not requirements:
+        # page_size: 페이지당 행 수, cursor: 이전 응답의 next_cursor, resume=true: 서버에 저장된 위치부터 이어서 처리
+        page_size = parse_page_size(req.params.get('page_size'), DEFAULT_VIEW_PAGE_SIZE, MAX_VIEW_PAGE_SIZE)
+        cursor_param = req.params.get('cursor')
+        resume = req.params.get('resume', '').lower() in ('1', 'true', 'yes')
+
+        after = decode_cursor(cursor_param) if cursor_param else None
+        if page_size is None or (cursor_param and not is_valid_position(after)):
+            response_data = create_error_response(
+                "Invalid page_size or cursor parameter",
+                status_code=400,
+                message="page_size must be an integer and cursor must come from a previous response"
+            )
+            return func.HttpResponse(
+                json.dumps(response_data, ensure_ascii=False),
+                status_code=400,
+                headers={"Content-Type": "application/json; charset=utf-8"}
+            )
+
+        if resume and not cursor_param:
+            after = load_resume_position()
+            if after is not None and not is_valid_position(after):
+                logging.warning(f"저장된 resume 위치 형식 오류, 처음부터 조회: {after}")
+                after = None
+
+        # 키셋 기준 다음 페이지의 학습자 요구사항 가져오기
+        requirements = get_sample_learner_requirements(page_size, after)
+        if requirements is None or (not requirements and not after):
             response_data = create_error_response(
                 "Failed to get learner requirements from vw_personal_item_enriched",
                 status_code=500
@@ -200,87 +256,64 @@ def handle_view_generation(req):
                 headers={"Content-Type": "application/json; charset=utf-8"}
             )
 
+        # 마지막 행 위치를 다음 페이지 커서로 사용 (페이지가 가득 차지 않았으면 뷰 끝)
+        if len(requirements) == page_size:
+            next_after = {
+                'learner_id': requirements[-1]['learner_id'],
+                'assessment_item_id': requirements[-1]['assessment_item_id']
+            }
+        else:
+            next_after = None
+        next_cursor = encode_cursor(next_after) if next_after else None
+
+        if not requirements:
+            if resume:
+                save_resume_position(None)
+            print("[개인화 생성] 뷰의 마지막 페이지까지 처리 완료")
+            response_data = create_success_response({
+                "success": True,
+                "generated_questions": [],
+                "summary": {"total_generated": 0, "target_count": 0, "requirements_processed": 0},
+                "next_cursor": None,
+                "completed": True
+            })
+            return func.HttpResponse(
+                json.dumps(response_data, ensure_ascii=False),
+                status_code=200,
+                headers={"Content-Type": "application/json; charset=utf-8"}
+            )
+
         print(f"[개인화 생성] 문제 생성 시작 (총 {len(requirements)}개)")
         print("=" * 80)
 
         client = get_openai_client()
-        all_generated_questions = []
-
-        # concept_name별로 생성된 문제들 추적 (중복 방지용)
-        concept_generated_problems = {}
 
+        # concept_name별로 묶어 그룹 안에서는 순서대로(중복 방지 목록 공유), 그룹끼리는 병렬 생성
+        concept_groups = {}
         for req_idx, requirement in enumerate(requirements, 1):
-            from ..core.utils import get_grade_international
-            print(f"\n[요구사항 {req_idx}/{len(requirements)}] learnerID: {requirement['learner_id']}, assessmentItemID: {requirement['assessment_item_id']}")
-            print(f"   {get_grade_international(requirement['grade'])} {requirement['term']}학기 - {requirement['concept_name']} (난이도: {requirement['difficulty_band']})")
+            concept_groups.setdefault(requirement['concept_name'], []).append((req_idx, requirement))
 
-            # 해당 주제의 기존 문제들 가져오기 (참고용)
-            existing_questions = get_question_data("questions", requirement['concept_name'])
+        print(f"   concept {len(concept_groups)}개 그룹 병렬 처리")
 
-            # 같은 concept_name에서 이미 생성된 문제들 가져오기 (중복 방지)
-            concept_name = requirement['concept_name']
-            generated_problems_for_concept = concept_generated_problems.get(concept_name, [])
+        question_by_index = {}
+        for group_results in run_concurrently(
+            lambda group: generate_view_concept_group(client, group, len(requirements)),
+            list(concept_groups.values())
+        ):
+            if group_results:
+                question_by_index.update(group_results)
 
-            print(f"   📝 {concept_name}: 이미 생성된 문제 {len(generated_problems_for_concept)}개")
-
-            question_data = generate_question_with_ai(
-                client, requirement['grade'], requirement['term'], requirement['concept_name'],
-                "선택형", requirement['difficulty_band'], existing_questions, generated_problems_for_concept
-            )
-
-            if question_data and validate_question_format(question_data, "선택형"):
-                # DB에서 미리 매핑된 concept_name 조회
-                recommended_concept = get_mapped_concept_name(requirement['concept_name'])
-                knowledge_tag = get_knowledge_tag_by_concept(recommended_concept) if recommended_concept else requirement['knowledge_tag']
-
-                # DB 저장 준비 (현재 비활성화)
-                question_record = prepare_question_record(
-                    requirement['assessment_item_id'], requirement['grade'], requirement['term'], requirement['concept_name'],
-                    "선택형", requirement['difficulty_band'], question_data
-                )
-                answer_record = prepare_answer_record(requirement['assessment_item_id'], question_data)
-
-                # 결과 추가
-                question_result = {
-                    "assessmentItemID": requirement['assessment_item_id'],  # assessmentItemID 사용
-                    **question_data,
-                    "metadata": {
-                        "assessment_item_id": requirement['assessment_item_id'],
-                        "knowledge_tag": requirement['knowledge_tag'],
-                        "grade": requirement['grade'],
-                        "term": requirement['term'],
-                        "concept_name": requirement['concept_name'],
-                        "chapter_name": requirement['chapter_name'],
-                        "difficulty_band": requirement['difficulty_band'],
-                        "recommended_level": requirement['recommended_level'],
-                        "source": "vw_personal_item_enriched",
-                        "learner_id": requirement['learner_id'],
-                        "question_number": req_idx,
-                        "mapped_concept_name": recommended_concept,
-                        "mapped_knowledge_tag": knowledge_tag
-                    }
-                }
-
-                all_generated_questions.append(question_result)
-
-                # 생성된 문제를 중복 방지 리스트에 추가
-                if concept_name not in concept_generated_problems:
-                    concept_generated_problems[concept_name] = []
-                concept_generated_problems[concept_name].append(question_data['question_text'][:100])
-
-                print(f"   [성공] {req_idx}/{len(requirements)} - {question_data['question_text'][:50]}...")
-                print(f"          원본 concept_name: {requirement['concept_name']}")
-                print(f"          매핑된 concept_name: {recommended_concept or '매핑없음'}")
-                print(f"          knowledgeTag: {requirement['knowledge_tag']}")
-                print(f"   🔄 {concept_name}: 누적 생성 문제 {len(concept_generated_problems[concept_name])}개")
-                print()
-            else:
-                print(f"   [실패] {req_idx}/{len(requirements)} - Question validation failed")
+        # 요구사항 순서대로 결과 정렬
+        all_generated_questions = [question_by_index[req_idx] for req_idx in sorted(question_by_index)]
 
         print("\n" + "=" * 80)
         print(f"[개인화 생성 완료] 총 {len(all_generated_questions)}/{len(requirements)}개 문제")
         print("=" * 80)
 
+        # resume 모드: 페이지 처리가 끝난 뒤 다음 시작 위치 저장 (마지막 페이지면 처음으로 초기화)
+        if resume:
+            save_resume_position(next_after)
+
         # 요약 정보 생성
         summary = {
             "total_generated": len(all_generated_questions),
@@ -292,6 +325,8 @@ def handle_view_generation(req):
             "success": True,
             "generated_questions": all_generated_questions,
             "summary": summary,
+            "next_cursor": next_cursor,
+            "completed": next_cursor is None,
             "validation": {
                 "format_check": "passed",
                 "db_storage": "disabled_for_testing"
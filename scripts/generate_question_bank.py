@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+"""
+오프라인 문제 은행 대량 생성 스크립트
+Functions 호스트 없이 스펙(파라미터 그리드 또는 DB 조회)에 따라 문제를 병렬 생성하고
+검증된 문제를 크기 기준으로 분할된 JSONL 파일에 저장 (중단 시 체크포인트부터 재개, 목표 수에 못 미친 작업은 부족분만 다시 생성)
+
+사용법:
+    python -m scripts.generate_question_bank --spec spec.json --out output/bank --workers 8
+
+스펙 예시:
+    {"source": "grid", "count": 5,
+     "grid": {"grade": ["중1"], "term": [1, 2], "topic_name": ["일차방정식"],
+              "question_type": ["선택형"], "difficulty": ["중"]}}
+    {"source": "questions_dim", "limit": 200, "count": 5, "topic_name": "일차방정식"}
+    {"source": "view", "limit": 200, "count": 3}
+"""
+import os
+import sys
+import json
+import glob
+import argparse
+import itertools
+from hashlib import sha256
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from modules.core.ai_service import get_openai_client, generate_question_with_ai
+from modules.core.validation import validate_question_format
+from modules.core.database import get_question_data, iter_query_chunks
+from modules.core.concurrency import ProgressTracker, get_max_workers
+from modules.core.metrics import get_metrics_snapshot
+from modules.core.output_budget import get_output_budget
+from modules.core.utils import generate_question_id
+
+# 그리드 스펙에 필요한 파라미터
+PARAM_FIELDS = ('grade', 'term', 'topic_name', 'question_type', 'difficulty')
+
+CHECKPOINT_FILE = "_checkpoint.json"
+SHARD_PATTERN = "questions-{:05d}.jsonl"
+
+
+def load_local_settings():
+    """local.settings.json에서 환경변수 로드 (이미 설정된 값은 유지)"""
+    try:
+        with open('local.settings.json', 'r', encoding='utf-8') as f:
+            for key, value in json.load(f).get('Values', {}).items():
+                os.environ.setdefault(key, value)
+        print("✅ local.settings.json 환경변수 로드 완료")
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"❌ local.settings.json 로드 실패: {str(e)}")
+
+
+def compute_job_key(params):
+    """파라미터 세트의 고유 키 (체크포인트 기준)"""
+    raw = json.dumps({field: params.get(field) for field in PARAM_FIELDS}, ensure_ascii=False, sort_keys=True, default=str)
+    return sha256(raw.encode('utf-8')).hexdigest()[:16]
+
+
+def expand_grid(grid):
+    """파라미터 그리드의 모든 조합"""
+    missing = [field for field in PARAM_FIELDS if field not in grid]
+    if missing:
+        raise ValueError(f"그리드에 필요한 항목 없음: {', '.join(missing)}")
+
+    values = [grid[field] if isinstance(grid[field], list) else [grid[field]] for field in PARAM_FIELDS]
+    return [dict(zip(PARAM_FIELDS, combination)) for combination in itertools.product(*values)]
+
+
+def query_question_params(limit, topic_name=None):
+    """questions_dim에서 파라미터 세트 조회 (주제/유형/난이도 조합별 1개)"""
+    query = """
+        SELECT TOP (?) question_grade, question_term, question_topic_name, question_type1, question_difficulty
+        FROM questions_dim
+        WHERE question_topic_name IS NOT NULL {topic_filter}
+        GROUP BY question_grade, question_term, question_topic_name, question_type1, question_difficulty
+        ORDER BY question_grade, question_term, question_topic_name, question_type1, question_difficulty
+    """.format(topic_filter="AND question_topic_name = ?" if topic_name else "")
+    params = [limit] + ([topic_name] if topic_name else [])
+
+    return [
+        dict(zip(PARAM_FIELDS, row))
+        for rows in iter_query_chunks(query, params)
+        for row in rows
+    ]
+
+
+def query_view_params(limit):
+    """vw_personal_item_enriched에서 파라미터 세트 조회 (개념/난이도 조합별 1개, 개인화 생성과 같은 선택형)"""
+    query = """
+        SELECT TOP (?) grade, term, concept_name, difficulty_band
+        FROM gold.vw_personal_item_enriched
+        WHERE concept_name IS NOT NULL
+        GROUP BY grade, term, concept_name, difficulty_band
+        ORDER BY grade, term, concept_name, difficulty_band
+    """
+    return [
+        {'grade': row[0], 'term': row[1], 'topic_name': row[2], 'question_type': '선택형', 'difficulty': row[3]}
+        for rows in iter_query_chunks(query, [limit])
+        for row in rows
+    ]
+
+
+def resolve_jobs(spec):
+    """스펙을 생성 작업 목록으로 변환 → [{'key', 'params', 'count'}]"""
+    source = spec.get('source', 'grid')
+    count = int(spec.get('count', 5))
+    limit = int(spec.get('limit', 100))
+
+    if source == 'grid':
+        param_sets = expand_grid(spec.get('grid', {}))
+    elif source == 'questions_dim':
+        param_sets = query_question_params(limit, spec.get('topic_name'))
+    elif source == 'view':
+        param_sets = query_view_params(limit)
+    else:
+        raise ValueError(f"지원하지 않는 source: {source}")
+
+    jobs = {}
+    for params in param_sets:
+        key = compute_job_key(params)
+        jobs.setdefault(key, {'key': key, 'params': params, 'count': count})
+    return list(jobs.values())
+
+
+class ShardWriter:
+    """크기 기준으로 파일을 바꿔가며 JSONL 기록 (재개 시 다음 번호 파일부터 기록)"""
+
+    def __init__(self, out_dir, max_bytes):
+        self.out_dir = out_dir
+        self.max_bytes = max_bytes
+        existing = sorted(glob.glob(os.path.join(out_dir, SHARD_PATTERN.replace('{:05d}', '*'))))
+        self.shard_index = len(existing)
+        self._file = None
+        self._size = 0
+        self.records = 0
+
+    def _rotate(self):
+        if self._file:
+            self._file.close()
+        self.shard_index += 1
+        path = os.path.join(self.out_dir, SHARD_PATTERN.format(self.shard_index))
+        self._file = open(path, 'w', encoding='utf-8')
+        self._size = 0
+        print(f"📁 새 파일: {path}")
+
+    def write(self, record):
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode('utf-8')
+        if self._file is None or (self._size and self._size + len(line) > self.max_bytes):
+            self._rotate()
+        self._file.write(line.decode('utf-8'))
+        self._size += len(line)
+        self.records += 1
+
+    def flush(self):
+        if self._file:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+def load_checkpoint(out_dir, spec_hash):
+    """작업 키별 저장된 문제 수 {key: 개수} (스펙이 바뀌었으면 빈 dict)"""
+    try:
+        with open(os.path.join(out_dir, CHECKPOINT_FILE), 'r', encoding='utf-8') as f:
+            checkpoint = json.load(f)
+        if checkpoint.get('spec_hash') != spec_hash:
+            print("⚠️ 스펙이 바뀌어 체크포인트를 사용하지 않습니다.")
+            return {}
+        return {key: int(count) for key, count in checkpoint.get('produced', {}).items()}
+    except FileNotFoundError:
+        return {}
+
+
+def save_checkpoint(out_dir, spec_hash, produced):
+    """작업 키별 저장된 문제 수 기록 (임시 파일 작성 후 교체)"""
+    path = os.path.join(out_dir, CHECKPOINT_FILE)
+    with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+        json.dump({
+            'spec_hash': spec_hash,
+            'produced': dict(sorted(produced.items())),
+            'updated_at': datetime.now().isoformat(timespec='seconds')
+        }, f, ensure_ascii=False)
+    os.replace(f"{path}.tmp", path)
+
+
+def clear_output(out_dir):
+    """이전 실행의 JSONL 파일과 체크포인트 삭제 (--restart, 그 밖의 파일은 유지) → 삭제한 파일 수"""
+    paths = glob.glob(os.path.join(out_dir, SHARD_PATTERN.replace('{:05d}', '*')))
+    paths.append(os.path.join(out_dir, CHECKPOINT_FILE))
+    removed = 0
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+            removed += 1
+    return removed
+
+
+def run_job(client, job):
+    """파라미터 세트 1개에 대해 count개 생성 → 검증 통과한 레코드 목록 (세트 안에서는 중복 방지를 위해 순차 생성)"""
+    params = job['params']
+    existing_questions = get_question_data("questions", params['topic_name'])
+    generated_problems = []
+    records = []
+
+    for _ in range(job['count']):
+        question_data = generate_question_with_ai(
+            client, params['grade'], params['term'], params['topic_name'],
+            params['question_type'], params['difficulty'], existing_questions, generated_problems
+        )
+        if not (question_data and validate_question_format(question_data, params['question_type'])):
+            continue
+
+        generated_problems.append(question_data['question_text'][:100])
+        records.append({
+            "id": generate_question_id(),
+            "job_key": job['key'],
+            **question_data,
+            "metadata": {
+                **params,
+                "generated_at": datetime.now().isoformat(timespec='seconds')
+            }
+        })
+    return records
+
+
+def format_token_usage():
+    """문제 생성 호출 수와 토큰 사용량 문자열"""
+    metrics = get_metrics_snapshot("llm.question")
+    return (f"호출 {metrics.get('llm.question.calls', 0)}회, "
+            f"토큰 {metrics.get('llm.question.total_tokens', 0)} "
+            f"(입력 {metrics.get('llm.question.prompt_tokens', 0)} / 출력 {metrics.get('llm.question.completion_tokens', 0)})")
+
+
+def parse_args(argv=None):
+    """명령행 인자 파싱"""
+    parser = argparse.ArgumentParser(description="오프라인 문제 은행 대량 생성")
+    parser.add_argument("--spec", required=True, help="생성 스펙 JSON 파일 경로")
+    parser.add_argument("--out", required=True, help="JSONL 출력 디렉터리")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="동시 생성 작업 수 (파라미터 세트 단위, 기본: LLM_MAX_WORKERS 또는 LLM_AIMD_MAX, 실제 동시 호출 수는 적응형 제한기가 조절)")
+    parser.add_argument("--shard-size-mb", type=float, default=64, help="JSONL 파일 1개 최대 크기 (MB)")
+    parser.add_argument("--restart", action="store_true", help="출력 디렉터리의 기존 JSONL 파일과 체크포인트를 삭제하고 처음부터 생성")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """메인 실행 함수"""
+    args = parse_args(argv)
+    load_local_settings()
+
+    with open(args.spec, 'r', encoding='utf-8') as f:
+        spec = json.load(f)
+    spec_hash = sha256(json.dumps(spec, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+    os.makedirs(args.out, exist_ok=True)
+    workers = max(1, args.workers or get_max_workers())
+
+    # 처음부터 다시 생성하면 기존 파일에 이어 쓰지 않도록 이전 결과 삭제 (레코드 중복 방지)
+    if args.restart:
+        print(f"🧹 이전 결과 삭제: {clear_output(args.out)}개 파일 ({args.out})")
+
+    # 1. 작업 목록 구성 후 목표 수를 채운 작업 제외, 나머지는 부족분만 생성 (DB 조회가 중간에 끊기면 일부 목록으로 진행하지 않음)
+    try:
+        jobs = resolve_jobs(spec)
+    except Exception as e:
+        print(f"❌ 작업 목록을 구성할 수 없습니다: {str(e)}")
+        return 1
+    produced = {} if args.restart else load_checkpoint(args.out, spec_hash)
+    pending = [
+        {**job, 'count': job['count'] - produced.get(job['key'], 0)}
+        for job in jobs if produced.get(job['key'], 0) < job['count']
+    ]
+
+    print(f"📊 작업 {len(jobs)}개 (완료 {len(jobs) - len(pending)}개, 남은 작업 {len(pending)}개, "
+          f"남은 문제 {sum(job['count'] for job in pending)}개), 동시 작업 {workers}개")
+    if not pending:
+        print("✅ 생성할 작업이 없습니다.")
+        return
+
+    # 2. 병렬 생성 → 결과는 메인 스레드에서만 기록하고 작업 단위로 체크포인트 저장
+    client = get_openai_client()
+    writer = ShardWriter(args.out, int(args.shard_size_mb * 1024 * 1024))
+    progress = ProgressTracker(sum(job['count'] for job in pending))
+    failed_jobs = 0
+    incomplete_jobs = 0
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(run_job, client, job): job for job in pending}
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    records = future.result()
+                except Exception as e:
+                    failed_jobs += 1
+                    print(f"❌ 작업 실패 ({job['params']['topic_name']}): {str(e)}")
+                    progress.update(job['count'])
+                    continue
+
+                # 저장한 개수만 체크포인트에 누적 → 목표에 못 미친 작업은 다음 실행에서 부족분만 생성
+                if records:
+                    for record in records:
+                        writer.write(record)
+                    writer.flush()
+                    produced[job['key']] = produced.get(job['key'], 0) + len(records)
+                    save_checkpoint(args.out, spec_hash, produced)
+
+                params = job['params']
+                if len(records) < job['count']:
+                    incomplete_jobs += 1
+                    print(f"⚠️ {params['topic_name']} ({params['question_type']}, 난이도 {params['difficulty']}): {len(records)}/{job['count']}개 (부족분은 다음 실행에서 생성)")
+                else:
+                    print(f"✅ {params['topic_name']} ({params['question_type']}, 난이도 {params['difficulty']}): {len(records)}/{job['count']}개")
+                print(f"📈 {progress.update(job['count'])} | {format_token_usage()}")
+    finally:
+        writer.close()
+        get_output_budget().flush()
+
+    print("=" * 60)
+    print(f"🎯 저장된 문제: {writer.records}개, 실패 작업: {failed_jobs}개, 미완료 작업: {incomplete_jobs}개")
+    print(f"🔢 {format_token_usage()}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())